@@ -1,31 +1,28 @@
 from fastapi import APIRouter, HTTPException, Depends
-from models.schemas import AnalyzeRequest, AnalysisResult
+from models.schemas import AnalyzeRequest, AnalysisJobResponse, BaselineInfo
 from services.data_storage import data_storage
 from services.fraud_detection import FraudDetector
+from services.analysis_jobs import analysis_jobs
+from services.baseline_model import load_configured_baseline
 from api.database import get_db
 from sqlmodel.ext.asyncio.session import AsyncSession
 
 router = APIRouter()
-detector = FraudDetector()
+# Loaded once: batches are scored against the fitted baseline (SUBSIGUARD_BASELINE_PATH) if set
+detector = FraudDetector(baseline=load_configured_baseline())
 
-@router.post("/analyze", response_model=AnalysisResult)
+@router.post("/analyze", response_model=AnalysisJobResponse, status_code=202)
 async def analyze_data(request: AnalyzeRequest, session: AsyncSession = Depends(get_db)):
-    df = await data_storage.get_data(session, request.file_id)
-    
-    if df is None:
+    if await data_storage.get_upload(session, request.file_id) is None:
         raise HTTPException(status_code=404, detail="File not found. Please upload first.")
-    
-    try:
-        # Check if results already exist to avoid re-calculation
-        existing_results = await data_storage.get_results(session, request.file_id)
-        if existing_results:
-             return existing_results
 
-        results = detector.detect_fraud(request.file_id, df)
-        
-        # Convert Pydantic model to dict for storage
-        await data_storage.save_results(session, request.file_id, results.model_dump())
-        
-        return results
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
+    # Runs in the background; poll /jobs/{job_id} and fetch /results/{file_id} when completed.
+    # Re-submitting a file that is already being analyzed returns the running job.
+    job = await analysis_jobs.submit(session, request.file_id, detector)
+    return analysis_jobs.to_response(job)
+
+@router.get("/baseline", response_model=BaselineInfo)
+async def get_baseline():
+    if detector.baseline is None:
+        raise HTTPException(status_code=404, detail="No baseline loaded. Set SUBSIGUARD_BASELINE_PATH to a fitted baseline.")
+    return detector.baseline.info()
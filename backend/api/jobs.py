@@ -0,0 +1,16 @@
+from fastapi import APIRouter, HTTPException, Depends
+from models.schemas import AnalysisJobResponse
+from services.analysis_jobs import analysis_jobs
+from api.database import get_db
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+router = APIRouter()
+
+@router.get("/jobs/{job_id}", response_model=AnalysisJobResponse)
+async def get_job(job_id: str, session: AsyncSession = Depends(get_db)):
+    job = await analysis_jobs.get(session, job_id)
+
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+
+    return analysis_jobs.to_response(job)
@@ -1,92 +1,121 @@
-from fastapi import APIRouter, HTTPException, Depends
-from models.schemas import AnalysisResult
-from services.data_storage import data_storage
+from fastapi import APIRouter, HTTPException, Depends, Query
+from models.schemas import AnalysisResult, FraudCasePage, ReportsSummary, ResultBreakdown
+from services.data_storage import data_storage, REASON_BITS
 from api.database import get_db
 from sqlmodel.ext.asyncio.session import AsyncSession
+from typing import Literal, Optional, Tuple
 
 router = APIRouter()
 
+# Cases per page of /results
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+def _parse_cursor(cursor: Optional[str]) -> Optional[Tuple[int, int]]:
+    # Cursors are "<risk_score>:<row_id>" of the last case on the previous page
+    if cursor is None:
+        return None
+    try:
+        risk_score, row_id = cursor.split(":")
+        return int(risk_score), int(row_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def _format_cursor(cursor: Optional[Tuple[int, int]]) -> Optional[str]:
+    return f"{cursor[0]}:{cursor[1]}" if cursor else None
+
 @router.get("/results/{file_id}", response_model=AnalysisResult)
-async def get_results(file_id: str, session: AsyncSession = Depends(get_db)):
-    results = await data_storage.get_results(session, file_id)
+async def get_results(file_id: str, limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE), session: AsyncSession = Depends(get_db)):
+    # Summary and report plus the first page of cases, highest risk first
+    results = await data_storage.get_results(session, file_id, include_cases=False)
     
     if results is None:
         raise HTTPException(status_code=404, detail="Results not found. Please analyze the file first.")
 
-@router.get("/reports/summary")
+    cases, next_cursor = await data_storage.get_cases(session, file_id, limit)
+    return {**results, "cases": cases, "next_cursor": _format_cursor(next_cursor)}
+
+@router.get("/results/{file_id}/cases", response_model=FraudCasePage)
+async def get_result_cases(
+    file_id: str,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    sort: Literal["risk", "row"] = "risk",
+    reason: Optional[str] = None,
+    state: Optional[str] = None,
+    scheme: Optional[str] = None,
+    session: AsyncSession = Depends(get_db)
+):
+    if reason is not None and reason not in REASON_BITS:
+        raise HTTPException(status_code=400, detail=f"Unknown fraud reason. Expected one of: {list(REASON_BITS)}")
+
+    if not await data_storage.has_results(session, file_id):
+        raise HTTPException(status_code=404, detail="Results not found. Please analyze the file first.")
+
+    cases, next_cursor = await data_storage.get_cases(
+        session, file_id, limit, cursor=_parse_cursor(cursor), sort=sort, reason=reason, state=state, scheme=scheme
+    )
+    return FraudCasePage(cases=cases, next_cursor=_format_cursor(next_cursor))
+
+@router.get("/results/{file_id}/breakdown", response_model=ResultBreakdown)
+async def get_result_breakdown(file_id: str, session: AsyncSession = Depends(get_db)):
+    # Over all of the file's cases, unlike the paged case list
+    if not await data_storage.has_results(session, file_id):
+        raise HTTPException(status_code=404, detail="Results not found. Please analyze the file first.")
+
+    return ResultBreakdown(
+        by_state=await data_storage.get_breakdown(session, "state", file_id=file_id),
+        by_scheme=await data_storage.get_breakdown(session, "scheme", file_id=file_id)
+    )
+
+@router.get("/reports/summary", response_model=ReportsSummary)
 async def get_reports_summary(session: AsyncSession = Depends(get_db)):
-    all_results = await data_storage.get_all_results(session)
-    
-    total_audits = 0
-    flagged_count = 0
-    resolved_cases = 0
-    total_leakage = 0.0
-    
-    # Simple aggregation
-    for res in all_results:
-        # Check if result structure matches expected format
-        if "summary" in res:
-            summary = res["summary"]
-            # Assuming 'total_records' corresponds to auditable units/beneficiaries in that file
-            file_records = summary.get("total_records", 0)
-            file_flagged = summary.get("flagged_count", 0)
-            file_leakage = summary.get("total_leakage_amount", 0.0)
-            
-            total_audits += file_records
-            flagged_count += file_flagged
-            total_leakage += file_leakage
-    
-    resolved_cases = total_audits - flagged_count
+    # Aggregated in SQL over the per-analysis rollups; no stored result is loaded
+    totals = await data_storage.get_summary_totals(session)
+
+    # 'total_records' corresponds to auditable units/beneficiaries across all files
+    total_audits = totals["total_records"]
+    flagged_count = totals["flagged_count"]
     
-    return {
-        "total_audits": total_audits,
-        "critical_issues": flagged_count,
-        "resolved_cases": resolved_cases,
-        "total_leakage": total_leakage
-    }
+    return ReportsSummary(
+        total_audits=total_audits,
+        critical_issues=flagged_count,
+        resolved_cases=total_audits - flagged_count,
+        total_leakage=totals["total_leakage"],
+        by_state=await data_storage.get_breakdown(session, "state"),
+        by_scheme=await data_storage.get_breakdown(session, "scheme")
+    )
     
 from fastapi.responses import StreamingResponse
-import pandas as pd
-import io
+from api.database import async_session_factory
+from services.report_export import csv_stream, parquet_stream
 
 @router.get("/results/{file_id}/export")
-async def export_results(file_id: str, session: AsyncSession = Depends(get_db)):
-    results = await data_storage.get_results(session, file_id)
-    
-    if results is None:
+async def export_results(
+    file_id: str,
+    format: Literal["csv", "parquet"] = "csv",
+    compression: Literal["none", "gzip"] = "none",
+    session: AsyncSession = Depends(get_db)
+):
+    if not await data_storage.has_results(session, file_id):
         raise HTTPException(status_code=404, detail="Results not found. Please analyze the file first.")
-    
-    # Flatten data for CSV
-    # Summary row
-    summary_data = {
-        "Type": "Summary",
-        "Total Leakage": results.summary.total_leakage_amount,
-        "Flagged Count": results.summary.flagged_count,
-        "Total Records": results.summary.total_records,
-        "Avg Risk Score": results.summary.average_risk_score,
-        "Top Risk State": results.summary.top_risk_state
-    }
-    
-    # Case rows
-    case_data = []
-    for case in results.cases:
-        case_data.append({
-            "Type": "Fraud Case",
-            "Beneficiary Name": case.beneficiary_name,
-            "Scheme": case.scheme,
-            "Amount": case.amount,
-            "Risk Score": case.risk_score,
-            "Fraud Reasons": ", ".join(case.fraud_reasons)
-        })
-    
-    # Combine (putting summary at top is unconventional for strict CSVs but good for reports)
-    # Better approach: Just export the fraud cases for detailed analysis
-    df = pd.DataFrame(case_data)
-    
-    stream = io.StringIO()
-    df.to_csv(stream, index=False)
-    
-    response = StreamingResponse(iter([stream.getvalue()]),
-                                 media_type="text/csv")
-    response.headers["Content-Disposition"] = f"attachment; filename=subsiguard_report_{file_id}.csv"
+
+    async def batches():
+        # The response outlives the request's session, so the stream reads with its own
+        async with async_session_factory() as stream_session:
+            async for cases in data_storage.iter_cases(stream_session, file_id):
+                yield cases
+
+    # Fraud cases are encoded batch by batch as they are read, in constant memory
+    filename = f"subsiguard_report_{file_id}"
+    if format == "parquet":
+        # Parquet compresses its column chunks itself
+        body, media_type, filename = parquet_stream(batches()), "application/vnd.apache.parquet", f"{filename}.parquet"
+    elif compression == "gzip":
+        body, media_type, filename = csv_stream(batches(), gzip=True), "application/gzip", f"{filename}.csv.gz"
+    else:
+        body, media_type, filename = csv_stream(batches()), "text/csv", f"{filename}.csv"
+
+    response = StreamingResponse(body, media_type=media_type)
+    response.headers["Content-Disposition"] = f"attachment; filename={filename}"
     return response
@@ -1,40 +1,155 @@
 from fastapi import APIRouter, UploadFile, File, HTTPException, Depends
+from starlette.concurrency import run_in_threadpool
 import pandas as pd
+import pyarrow as pa
+import hashlib
 import uuid
-import io
+from typing import Any, AsyncIterator, BinaryIO, Dict, Tuple
 from services.data_storage import data_storage
-from models.schemas import UploadResponse
+from services.incremental_analysis import apply_appended_rows
+from services.metrics import rows_processed, timed
+from services.record_schema import BadRowReport, iter_records, open_csv
+from models.schemas import BadRow, UploadResponse, AppendResponse
+from api.analyze import detector
 from api.database import get_db
 from sqlmodel.ext.asyncio.session import AsyncSession
 
 router = APIRouter()
 
-@router.post("/upload", response_model=UploadResponse)
-async def upload_file(file: UploadFile = File(...), session: AsyncSession = Depends(get_db)):
+REQUIRED_COLUMNS = ["aadhaar", "amount", "income"]
+
+# Bytes read per step when hashing what the parser left unread
+HASH_BLOCK_BYTES = 1 << 20
+
+class HashingReader:
+    """File wrapper that feeds every block read from it to a digest."""
+
+    def __init__(self, source: BinaryIO, digest):
+        self._source = source
+        self._digest = digest
+
+    def read(self, size: int = -1) -> bytes:
+        block = self._source.read(size)
+        self._digest.update(block)
+        return block
+
+    def drain(self) -> None:
+        # Anything the parser did not read still belongs to the content
+        for _ in iter(lambda: self.read(HASH_BLOCK_BYTES), b""):
+            pass
+
+    def __getattr__(self, name):
+        return getattr(self._source, name)
+
+async def read_csv_chunks(file: UploadFile, digest=None) -> Tuple[pd.DataFrame, AsyncIterator[pd.DataFrame], BadRowReport]:
+    """
+    Validates the first chunk of an uploaded CSV and returns it with an iterator
+    over all chunks, plus the report of skipped rows (complete once iterated).
+    With ``digest``, the uploaded bytes are hashed as they are parsed; the
+    digest covers the whole file once the iterator is exhausted.
+    """
     if not file.filename.endswith(".csv"):
         raise HTTPException(status_code=400, detail="Only CSV files are supported")
-    
+
+    # The multipart body is already spooled to a temporary file in fixed-size
+    # pieces, so parse it from there block by block instead of reading it whole
+    await file.seek(0)
+    source = file.file if digest is None else HashingReader(file.file, digest)
+    report = BadRowReport()
+    try:
+        reader = await run_in_threadpool(open_csv, source, report)
+    except pa.ArrowInvalid as e:
+        raise HTTPException(status_code=400, detail=f"Could not parse the uploaded CSV: {e}")
+
+    # Basic validation of the header, before anything is stored
+    if not all(col in reader.schema.names for col in REQUIRED_COLUMNS):
+        raise HTTPException(status_code=400, detail=f"Missing required columns: {REQUIRED_COLUMNS}")
+
+    records = iter_records(reader, report)
+    first_chunk = await run_in_threadpool(next, records, None)
+    if first_chunk is None:
+        raise HTTPException(status_code=400, detail="The uploaded CSV has no valid data rows")
+
+    async def chunks():
+        chunk = first_chunk
+        while chunk is not None:
+            yield chunk
+            chunk = await run_in_threadpool(next, records, None)
+        if digest is not None:
+            await run_in_threadpool(source.drain)
+
+    return first_chunk, chunks(), report
+
+def bad_row_fields(report: BadRowReport) -> Dict[str, Any]:
+    return {"bad_rows": report.count, "bad_row_samples": [BadRow(**sample) for sample in report.samples]}
+
+@router.post("/upload", response_model=UploadResponse)
+async def upload_file(file: UploadFile = File(...), session: AsyncSession = Depends(get_db)):
     try:
-        content = await file.read()
-        df = pd.read_csv(io.BytesIO(content))
-        
-        # Basic validation
-        required_columns = ["aadhaar", "amount", "income"]
-        if not all(col in df.columns for col in required_columns):
-             raise HTTPException(status_code=400, detail=f"Missing required columns: {required_columns}")
+        # Hashed while it is parsed and stored, no separate pass over the file
+        digest = hashlib.sha256()
+        with timed("upload.parse"):
+            first_chunk, chunks, report = await read_csv_chunks(file, digest)
+            preview_rows = first_chunk.head(10).fillna("").to_dict(orient="records")
 
         file_id = str(uuid.uuid4())
-        await data_storage.save_upload(session, file_id, file.filename, df)
-        
-        preview_rows = df.head(10).fillna("").to_dict(orient="records")
-        total_rows = len(df)
-        
+        # Later chunks are parsed as they are stored, so this covers both
+        with timed("upload.store"):
+            upload = await data_storage.save_upload_chunks(session, file_id, file.filename, chunks, content_hash=digest.hexdigest)
+        if upload.id != file_id:
+            # Same content: reuse the stored dataset and any cached analysis of it
+            return UploadResponse(
+                file_id=upload.id,
+                filename=file.filename,
+                total_rows=upload.total_rows,
+                preview_rows=preview_rows,
+                message="Identical file already uploaded; reusing the existing dataset"
+            )
+        rows_processed.inc(upload.total_rows, stage="upload")
+
         return UploadResponse(
             file_id=file_id,
             filename=file.filename,
-            total_rows=total_rows,
+            total_rows=upload.total_rows,
             preview_rows=preview_rows,
-            message="File uploaded successfully"
+            message="File uploaded successfully" if not report.count else f"File uploaded successfully; {report.count} unparseable rows skipped",
+            **bad_row_fields(report)
         )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/upload/{file_id}/append", response_model=AppendResponse)
+async def append_to_upload(file_id: str, file: UploadFile = File(...), session: AsyncSession = Depends(get_db)):
+    try:
+        _, chunks, report = await read_csv_chunks(file)
+        appended = await data_storage.append_upload_chunks(session, file_id, chunks)
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+    if appended is None:
+        raise HTTPException(status_code=404, detail="File not found. Please upload first.")
+    start_row, rows_added = appended
+
+    # Extend existing analysis results with just the new rows
+    try:
+        result = await apply_appended_rows(session, detector, file_id, start_row, rows_added)
+    except Exception:
+        # The rows are stored; make the next /analyze recompute instead of serving stale results
+        await session.rollback()
+        await data_storage.invalidate_results(session, file_id)
+        result = None
+
+    return AppendResponse(
+        file_id=file_id,
+        rows_added=rows_added,
+        total_rows=start_row + rows_added,
+        summary=result.summary if result else None,
+        message="Rows appended successfully" if not report.count else f"Rows appended successfully; {report.count} unparseable rows skipped",
+        **bad_row_fields(report)
+    )
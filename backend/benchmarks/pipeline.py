@@ -0,0 +1,172 @@
+import argparse
+import asyncio
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+# Run from backend/: allow importing from services. The app reads its database
+# URL and data directory at import time, so point them at a scratch directory first.
+sys.path.append(os.getcwd())
+WORKDIR = tempfile.mkdtemp(prefix="subsiguard_bench_")
+os.environ.setdefault("SUBSIGUARD_DATA_DIR", os.path.join(WORKDIR, "data"))
+os.environ.setdefault("SUBSIGUARD_DATABASE_URL", f"sqlite+aiosqlite:///{os.path.join(WORKDIR, 'bench.db')}")
+
+import httpx
+import pandas as pd
+from api.database import async_session_factory, init_db
+from main import app
+from services.data_storage import data_storage
+from services.fraud_detection import FraudDetector
+from services.record_schema import read_records
+from services.synthetic_data import write_synthetic
+
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000]
+
+# RSS is sampled this often while a stage runs
+RSS_SAMPLE_SECONDS = 0.01
+
+def current_rss() -> int:
+    """Resident set size in bytes (Linux /proc; elsewhere the process peak so far)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+class RssSampler:
+    """Peak RSS while a stage runs, from a background sampling thread."""
+
+    def __enter__(self):
+        self.start = self.peak = current_rss()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def _sample(self):
+        while not self._stop.wait(RSS_SAMPLE_SECONDS):
+            self.peak = max(self.peak, current_rss())
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, current_rss())
+
+async def measure(results: List[Dict[str, Any]], rows: int, stage: str, run: Callable[[], Any]) -> Any:
+    with RssSampler() as rss:
+        started = time.perf_counter()
+        value = run()
+        if asyncio.iscoroutine(value):
+            value = await value
+        seconds = time.perf_counter() - started
+    results.append({
+        "rows": rows,
+        "stage": stage,
+        "seconds": round(seconds, 4),
+        "rows_per_second": round(rows / seconds) if seconds > 0 else None,
+        "peak_rss_mb": round(rss.peak / 2 ** 20, 1),
+        "rss_growth_mb": round((rss.peak - rss.start) / 2 ** 20, 1)
+    })
+    print(f"{rows:>10} rows  {stage:<14} {seconds:8.3f}s  {results[-1]['rows_per_second'] or 0:>12,} rows/s  peak RSS {results[-1]['peak_rss_mb']} MB")
+    return value
+
+def read_upload(path: str) -> pd.DataFrame:
+    """Parses a CSV the way /upload does: declared column types, pyarrow reader."""
+    with open(path, "rb") as f:
+        return pd.concat(list(read_records(f)), ignore_index=True)
+
+async def bench_size(client: httpx.AsyncClient, detector: FraudDetector, rows: int, seed: int, results: List[Dict[str, Any]]) -> None:
+    csv_path = os.path.join(WORKDIR, f"claims-{rows}.csv")
+    write_synthetic(csv_path, rows, seed=seed, labels=False)
+    file_id = str(uuid.uuid4())
+
+    df = await measure(results, rows, "read_csv", lambda: read_upload(csv_path))
+    async with async_session_factory() as session:
+        await measure(results, rows, "save_upload", lambda: data_storage.save_upload(session, file_id, os.path.basename(csv_path), df))
+    del df
+
+    async with async_session_factory() as session:
+        df = await measure(results, rows, "get_data", lambda: data_storage.get_data(session, file_id))
+    result = await measure(results, rows, "detect_fraud", lambda: detector.detect_fraud(file_id, df))
+    del df
+
+    async with async_session_factory() as session:
+        await measure(results, rows, "save_results", lambda: data_storage.save_results(
+            session, file_id, result.model_dump(), flagged=result.flagged, detector_config=detector.config(), cache_key=detector.cache_key()
+        ))
+    del result
+
+    async def get(path: str) -> None:
+        response = await client.get(path)
+        response.raise_for_status()
+
+    await measure(results, rows, "/results", lambda: get(f"/results/{file_id}"))
+    await measure(results, rows, "/export", lambda: get(f"/results/{file_id}/export"))
+    os.remove(csv_path)
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(previous_path: str, report: Dict[str, Any]) -> None:
+    """Prints each stage's time relative to an earlier report (>1.00x: slower now)."""
+    with open(previous_path) as f:
+        previous_report = json.load(f)
+    previous = {(entry["rows"], entry["stage"]): entry for entry in previous_report["results"]}
+    print(f"\nCompared with {previous_path} (commit {previous_report.get('commit')}):")
+    for entry in report["results"]:
+        before = previous.get((entry["rows"], entry["stage"]))
+        if before and before["seconds"]:
+            print(f"{entry['rows']:>10} rows  {entry['stage']:<14} {entry['seconds'] / before['seconds']:6.2f}x")
+
+async def main():
+    parser = argparse.ArgumentParser(description="In-process benchmark of upload -> analyze -> results.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=f"benchmark-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    parser.add_argument("--compare", help="Earlier JSON report to compare stage times against")
+    args = parser.parse_args()
+
+    await init_db()
+    detector = FraudDetector()
+    results: List[Dict[str, Any]] = []
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://benchmark", timeout=None) as client:
+        for rows in args.sizes:
+            await bench_size(client, detector, rows, args.seed, results)
+
+    report = {
+        "commit": git_commit(),
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "seed": args.seed,
+        "detector": detector.config(),
+        "results": results
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results saved to: {os.path.abspath(args.output)}")
+
+    if args.compare:
+        compare(args.compare, report)
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    finally:
+        # Scratch database, stored uploads and generated CSVs
+        shutil.rmtree(WORKDIR, ignore_errors=True)
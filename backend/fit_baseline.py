@@ -0,0 +1,41 @@
+import argparse
+import sys
+import os
+import pandas as pd
+
+# Add current directory to path to allow importing from services
+sys.path.append(os.getcwd())
+
+from services.baseline_model import FittedBaseline
+from services.record_schema import BadRowReport, read_records
+
+def read_reference(path: str) -> pd.DataFrame:
+    """Reference claims with the same declared column types as uploads."""
+    if path.endswith(".parquet"):
+        return pd.read_parquet(path)
+    report = BadRowReport()
+    with open(path, "rb") as f:
+        df = pd.concat(list(read_records(f, report)), ignore_index=True)
+    if report.count:
+        print(f"Skipped {report.count} unparseable rows, e.g. {report.samples[0]}")
+    return df
+
+def main():
+    parser = argparse.ArgumentParser(description="Fit a detection baseline from a trusted reference dataset.")
+    parser.add_argument("reference", help="CSV or Parquet file of trusted claims")
+    parser.add_argument("--output", help="Artifact path (default: DATA_DIR/baselines/baseline-<version>.npz)")
+    args = parser.parse_args()
+
+    print(f"Reading {args.reference}...")
+    df = read_reference(args.reference)
+
+    baseline = FittedBaseline.fit(df, source=os.path.basename(args.reference))
+    path = baseline.save(args.output)
+
+    print(f"Fitted baseline {baseline.version} on {len(df)} records.")
+    print(f"Schemes: {', '.join(sorted(baseline.metadata['scheme_moments'])) or 'none'}")
+    print(f"Baseline saved to: {os.path.abspath(path)}")
+    print(f"Load it with SUBSIGUARD_BASELINE_PATH={os.path.abspath(path)}")
+
+if __name__ == "__main__":
+    main()
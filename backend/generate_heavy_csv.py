@@ -1,31 +1,34 @@
+import argparse
 import sys
 import os
-import pandas as pd
+import time
 
 # Add current directory to path to allow importing from services
 sys.path.append(os.getcwd())
 
-from services.synthetic_data import generate_synthetic_data
+from services.synthetic_data import DEFAULT_FRAUD_RATES, write_synthetic
 
 def main():
-    ROW_COUNT = 5000
-    OUTPUT_FILE = "../large_subsidy_data.csv"
-    
-    print(f"Generating {ROW_COUNT} synthetic records...")
-    data = generate_synthetic_data(ROW_COUNT)
-    
-    df = pd.DataFrame(data)
-    
-    # Calculate some stats to show the user
-    total_amount = df['amount'].sum()
-    unique_beneficiaries = df['beneficiary_id'].nunique()
-    
-    print(f"Generated {len(df)} records.")
-    print(f"Total Subsidy Amount: ₹{total_amount:,.2f}")
-    print(f"Unique Beneficiaries: {unique_beneficiaries}")
-    
-    df.to_csv(OUTPUT_FILE, index=False)
-    print(f"File saved to: {os.path.abspath(OUTPUT_FILE)}")
+    parser = argparse.ArgumentParser(description="Write a large synthetic claims file (CSV or Parquet, by extension).")
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--output", default="../large_subsidy_data.csv")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--chunk-rows", type=int, default=1_000_000)
+    parser.add_argument("--no-labels", action="store_true", help="Drop the fraud_type ground-truth column")
+    for pattern, rate in DEFAULT_FRAUD_RATES.items():
+        parser.add_argument(f"--{pattern.replace('_', '-')}-rate", type=float, default=rate)
+    args = parser.parse_args()
+
+    rates = {pattern: getattr(args, f"{pattern}_rate") for pattern in DEFAULT_FRAUD_RATES}
+
+    print(f"Generating {args.rows} synthetic records (seed {args.seed})...")
+    started = time.perf_counter()
+    label_counts = write_synthetic(args.output, args.rows, seed=args.seed, fraud_rates=rates, chunk_rows=args.chunk_rows, labels=not args.no_labels)
+
+    print(f"Generated {args.rows} records in {time.perf_counter() - started:.1f}s.")
+    for label, count in sorted(label_counts.items()):
+        print(f"  {label}: {count}")
+    print(f"File saved to: {os.path.abspath(args.output)}")
 
 if __name__ == "__main__":
     main()
@@ -1,13 +1,25 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from api import upload, analyze, results, synthetic, auth
+from fastapi.responses import PlainTextResponse
+from api import upload, analyze, jobs, results, synthetic, auth
 from contextlib import asynccontextmanager
-from api.database import init_db
+from api.database import init_db, get_db
+from services.data_storage import data_storage
+from services.executor import detection_executor
+from services.analysis_jobs import analysis_jobs
+from services.metrics import executor_jobs, registry, request_seconds
+import time
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     await init_db()
+    await analysis_jobs.recover()
+    # Uploads and analyses stored before the beneficiary index / rollup tables existed
+    async for session in get_db():
+        await data_storage.backfill_aadhaar_indexes(session)
+        await data_storage.backfill_rollups(session)
     yield
+    detection_executor.shutdown()
 
 import os
 
@@ -33,9 +45,29 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def record_request_latency(request: Request, call_next):
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # Route templates (/results/{file_id}), not raw paths, keep the label set bounded.
+        # Streamed bodies (exports) are timed until their headers are sent.
+        route = request.scope.get("route")
+        request_seconds.observe(
+            time.perf_counter() - started,
+            method=request.method,
+            route=route.path if route is not None else "unmatched",
+            status=str(status)
+        )
+
 # Include Routers
 app.include_router(upload.router, tags=["Upload"])
 app.include_router(analyze.router, tags=["Analysis"])
+app.include_router(jobs.router, tags=["Analysis"])
 app.include_router(results.router, tags=["Results"])
 app.include_router(synthetic.router, tags=["Synthetic Data"])
 app.include_router(auth.router, tags=["Authentication"])
@@ -48,6 +80,19 @@ async def root():
 async def health_check():
     return {"status": "healthy"}
 
+@app.get("/health/executor")
+async def executor_health():
+    # Running jobs and queue depth of the detection pool
+    return detection_executor.stats()
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    # Prometheus text exposition format
+    stats = detection_executor.stats()
+    executor_jobs.set(stats["running"], state="running")
+    executor_jobs.set(stats["queue_depth"], state="queued")
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
@@ -1,45 +1,202 @@
 from sqlmodel import SQLModel, Field, Relationship
-from sqlalchemy import JSON, Column
+from sqlalchemy import JSON, Column, Index, DateTime, TypeDecorator
 from typing import List, Optional, Dict, Any
-from datetime import datetime
+from datetime import datetime, timezone
 import uuid
 from pydantic import ConfigDict, BaseModel
+from pydantic.json_schema import SkipJsonSchema
+from typing_extensions import TypedDict
+
+def utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+class UTCDateTime(TypeDecorator):
+    """Timezone-aware datetimes, stored in UTC. SQLite keeps no offset: its values are read back as UTC."""
+    impl = DateTime(timezone=True)
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        if value.utcoffset() is None:
+            raise ValueError("Datetime values must be timezone-aware, e.g. utcnow()")
+        return value.astimezone(timezone.utc)
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        if value.utcoffset() is None:
+            return value.replace(tzinfo=timezone.utc)
+        return value.astimezone(timezone.utc)
 
 # --- Database Models ---
 
 class UploadedFile(SQLModel, table=True):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()), primary_key=True)
     filename: str
-    upload_date: datetime = Field(default_factory=datetime.utcnow)
-    data: Dict[str, Any] = Field(sa_column=Column(JSON)) # Stores the CSV data as JSON
+    upload_date: datetime = Field(default_factory=utcnow, sa_type=UTCDateTime)
+    total_rows: int = 0
+    content_hash: Optional[str] = Field(default=None, index=True, unique=True) # SHA-256 of the uploaded bytes, for deduplication
+    storage_path: Optional[str] = None # Arrow IPC file holding the rows (columnar backend)
+    data: Optional[Dict[str, Any]] = Field(default=None, sa_column=Column(JSON)) # Legacy: whole CSV as JSON (new uploads use UploadChunk)
     
     # Relationship to results
     analysis_results: List["AnalysisResultDB"] = Relationship(back_populates="file")
+    chunks: List["UploadChunk"] = Relationship(back_populates="file")
 
     model_config = ConfigDict(arbitrary_types_allowed=True)
 
+class UploadChunk(SQLModel, table=True):
+    id: Optional[int] = Field(default=None, primary_key=True)
+    file_id: str = Field(foreign_key="uploadedfile.id", index=True)
+    chunk_index: int
+    records: List[Dict[str, Any]] = Field(sa_column=Column(JSON)) # One parsed slice of the CSV
+
+    file: Optional[UploadedFile] = Relationship(back_populates="chunks")
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+class UploadSegment(SQLModel, table=True):
+    id: Optional[int] = Field(default=None, primary_key=True)
+    file_id: str = Field(foreign_key="uploadedfile.id", index=True)
+    segment_index: int
+    storage_path: str # Arrow IPC file holding the appended rows
+    start_row: int
+    row_count: int
+    created_at: datetime = Field(default_factory=utcnow, sa_type=UTCDateTime)
+
 class AnalysisResultDB(SQLModel, table=True):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()), primary_key=True)
     file_id: str = Field(foreign_key="uploadedfile.id")
     result: Dict[str, Any] = Field(sa_column=Column(JSON))
-    created_at: datetime = Field(default_factory=datetime.utcnow)
+    # Detector that produced the result; results of another version/config are recomputed
+    cache_key: Optional[str] = Field(default=None, index=True)
+    detector_version: Optional[str] = None
+    detector_config: Optional[Dict[str, Any]] = Field(default=None, sa_column=Column(JSON))
+    created_at: datetime = Field(default_factory=utcnow, sa_type=UTCDateTime)
     
     file: Optional[UploadedFile] = Relationship(back_populates="analysis_results")
 
     model_config = ConfigDict(arbitrary_types_allowed=True)
 
+class FraudCaseDB(SQLModel, table=True):
+    # One row per flagged case; the stored result JSON keeps only summary and report
+    __table_args__ = (
+        Index("ix_fraudcasedb_file_risk", "file_id", "risk_score", "row_id"),
+        Index("ix_fraudcasedb_file_state", "file_id", "state"),
+        Index("ix_fraudcasedb_file_scheme", "file_id", "scheme"),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    file_id: str = Field(foreign_key="uploadedfile.id")
+    row_id: int # Row of the case in the uploaded dataset (FraudCase.id)
+    beneficiary_name: str
+    scheme: str
+    state: Optional[str] = None
+    amount: float
+    risk_score: int
+    reason_codes: int # Bitmask over FRAUD_REASONS
+
+class AnalysisJob(SQLModel, table=True):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()), primary_key=True)
+    file_id: str = Field(foreign_key="uploadedfile.id", index=True)
+    status: str = Field(default="queued", index=True) # queued, running, completed, failed
+    stage: Optional[str] = None # load, rules, stats, aggregation, persist
+    progress: int = 0 # Percent complete
+    error: Optional[str] = None
+    stage_timings: Dict[str, Any] = Field(default_factory=dict, sa_column=Column(JSON)) # stage -> seconds
+    created_at: datetime = Field(default_factory=utcnow, sa_type=UTCDateTime)
+    started_at: Optional[datetime] = Field(default=None, sa_type=UTCDateTime)
+    finished_at: Optional[datetime] = Field(default=None, sa_type=UTCDateTime)
+    owner: Optional[str] = None # Worker running the job (host:pid:nonce)
+    heartbeat_at: Optional[datetime] = Field(default=None, sa_type=UTCDateTime) # Refreshed by the owner while the job is active
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+class AadhaarCount(SQLModel, table=True):
+    # Running duplicate-Aadhaar counts per dataset, used by incremental analysis
+    file_id: str = Field(foreign_key="uploadedfile.id", primary_key=True)
+    aadhaar_key: str = Field(primary_key=True)
+    claim_count: int
+    first_row: int
+
+class DetectionState(SQLModel, table=True):
+    # Running statistics that let appended rows be scored without a full re-run
+    file_id: str = Field(foreign_key="uploadedfile.id", primary_key=True)
+    total_records: int = 0
+    moments: Dict[str, Any] = Field(default_factory=dict, sa_column=Column(JSON)) # feature -> count/mean/m2
+    flagged_count: int = 0
+    total_leakage_amount: float = 0.0
+    total_risk_score: int = 0
+    flagged_state_counts: Dict[str, Any] = Field(default_factory=dict, sa_column=Column(JSON))
+    robust_baseline: Dict[str, Any] = Field(default_factory=dict, sa_column=Column(JSON)) # stratified mode only
+    model_rows: int = 0 # rows the full analysis (and its cached Isolation Forest) covered
+    group_partials: Dict[str, Any] = Field(default_factory=dict, sa_column=Column(JSON)) # group rule -> per-group aggregates
+    updated_at: datetime = Field(default_factory=utcnow, sa_type=UTCDateTime)
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+class AnalysisRollup(SQLModel, table=True):
+    # Scalar totals of one analysis, so /reports/summary is a single SQL aggregate
+    file_id: str = Field(foreign_key="uploadedfile.id", primary_key=True)
+    total_records: int = 0
+    flagged_count: int = 0
+    total_leakage_amount: float = 0.0
+    total_risk_score: int = 0
+    updated_at: datetime = Field(default_factory=utcnow, sa_type=UTCDateTime)
+
+class AnalysisBreakdown(SQLModel, table=True):
+    # Flagged cases of one analysis per state / per scheme
+    file_id: str = Field(foreign_key="uploadedfile.id", primary_key=True)
+    dimension: str = Field(primary_key=True, index=True) # "state" or "scheme"
+    value: str = Field(primary_key=True)
+    flagged_count: int = 0
+    leakage_amount: float = 0.0
+
 # --- Pydantic / API Models ---
 
+class BadRow(BaseModel):
+    row: Optional[int] = None # 1-based data row, when known
+    column: Optional[str] = None
+    value: Optional[str] = None
+    error: str
+
 class UploadResponse(BaseModel):
     file_id: str
     filename: str
     total_rows: int
     preview_rows: List[Dict[str, Any]]
     message: str
+    bad_rows: int = 0 # Rows skipped because they could not be parsed
+    bad_row_samples: List[BadRow] = []
 
 class AnalyzeRequest(BaseModel):
     file_id: str
 
+class BaselineInfo(BaseModel):
+    # Fitted reference statistics the API's detector scores against
+    version: str
+    format_version: int
+    fitted_at: str
+    source: str
+    rows: int
+    features: List[str]
+    quantiles: Dict[str, Dict[str, float]] # feature -> quantile -> value
+    schemes: List[str]
+    reference_aadhaar: int
+
+class AnalysisJobResponse(BaseModel):
+    job_id: str
+    file_id: str
+    status: str
+    stage: Optional[str] = None
+    progress: int
+    error: Optional[str] = None
+    stage_timings: Dict[str, float] = {}
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
 class FraudRecord(BaseModel):
     record_id: int
     data: Dict[str, Any]
@@ -54,6 +211,7 @@ class FraudCase(BaseModel):
     amount: float
     risk_score: int
     fraud_reasons: List[str]
+    state: Optional[str] = None
 
 class AnalysisSummary(BaseModel):
     total_leakage_amount: float
@@ -68,11 +226,50 @@ class AnalysisReportDetails(BaseModel):
     recommendations: List[str]
     conclusion: str
 
+class RuleStat(TypedDict):
+    hits: int # Rows the rule matched
+    seconds: float
+
 class AnalysisResult(BaseModel):
     file_id: str
     summary: AnalysisSummary
     cases: List[FraudCase]
     report_details: Optional[AnalysisReportDetails] = None
+    next_cursor: Optional[str] = None # Set when ``cases`` holds only the first page
+    rule_stats: Optional[Dict[str, RuleStat]] = None # Rule name -> hits, seconds
+    # Columnar cases (services.fraud_detection.FlaggedCases) of a fresh analysis; ``cases``
+    # is then empty and storage writes case rows from these columns. Never serialized.
+    flagged: SkipJsonSchema[Optional[Any]] = Field(default=None, exclude=True)
+
+class FraudCasePage(BaseModel):
+    cases: List[FraudCase]
+    next_cursor: Optional[str] = None
+
+class AppendResponse(BaseModel):
+    file_id: str
+    rows_added: int
+    total_rows: int
+    summary: Optional[AnalysisSummary] = None # Updated summary when the file was already analyzed
+    message: str
+    bad_rows: int = 0
+    bad_row_samples: List[BadRow] = []
+
+class ReportBreakdown(BaseModel):
+    value: str
+    flagged_count: int
+    leakage_amount: float
+
+class ResultBreakdown(BaseModel):
+    by_state: List[ReportBreakdown] = []
+    by_scheme: List[ReportBreakdown] = []
+
+class ReportsSummary(BaseModel):
+    total_audits: int
+    critical_issues: int
+    resolved_cases: int
+    total_leakage: float
+    by_state: List[ReportBreakdown] = []
+    by_scheme: List[ReportBreakdown] = []
 
 class SyntheticDataResponse(BaseModel):
     count: int
@@ -1,18 +1,12 @@
 from sqlmodel import select
-from sqlmodel.ext.asyncio.session import AsyncSession
-from sqlalchemy.orm import sessionmaker
-from api.database import engine, init_db
+from api.database import async_session_factory, init_db
 from models.schemas import User
 import asyncio
 
 async def seed_users():
     await init_db()
     
-    async_session = sessionmaker(
-        engine, class_=AsyncSession, expire_on_commit=False
-    )
-    
-    async with async_session() as session:
+    async with async_session_factory() as session:
         # Check if admin already exists
         statement = select(User).where(User.username == "admin")
         result = await session.exec(statement)
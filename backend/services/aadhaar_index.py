@@ -0,0 +1,283 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import os
+import re
+import threading
+import uuid
+from contextlib import contextmanager, nullcontext
+from typing import Iterable, Iterator, List, Optional, Tuple
+from services.columnar_storage import DATA_DIR
+
+try:
+    import fcntl
+except ImportError: # Windows: writes are only serialized within this process
+    fcntl = None
+
+# Aadhaar numbers are 12 digits. Digit strings up to this length are kept as
+# their numeric value (below 2**50) plus their digit count in bits 50-53, so
+# "012345678901" and "12345678901" stay apart; anything else is hashed into
+# [2**62, 2**63) so the two kinds of key never collide and every key still
+# fits a signed 64-bit integer.
+MAX_NUMERIC_DIGITS = 15
+DIGIT_COUNT_SHIFT = np.uint64(50)
+HASHED_KEY_BIT = np.uint64(1 << 62)
+_POWERS_OF_TEN = 10 ** np.arange(1, MAX_NUMERIC_DIGITS, dtype=np.uint64)
+
+# Bump when the key encoding changes: indexes are kept per encoding, and uploads
+# without an index of the current one are re-indexed at startup
+AADHAAR_KEY_VERSION = 2
+
+# Each upload adds a delta segment to the beneficiary index instead of rewriting
+# all of it; once this many deltas pile up they are compacted into a new base
+CORPUS_COMPACT_SEGMENTS = int(os.environ.get("SUBSIGUARD_CORPUS_COMPACT_SEGMENTS", 16))
+
+_CORPUS_BASE = re.compile(r"corpus\.(\d+)\.npy")
+_CORPUS_DELTA = re.compile(r"corpus\.(\d+)\.delta\.[0-9a-f]+\.npz")
+
+def _hashed_keys(values: np.ndarray) -> np.ndarray:
+    hashed = pd.util.hash_array(values.astype(str).astype(object), categorize=False)
+    return (hashed >> np.uint64(2)) | HASHED_KEY_BIT
+
+def aadhaar_uint64(aadhaar: pd.Series) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Normalizes Aadhaar values (ints, floats or strings like "1234 5678 9012") to
+    uint64 keys. Returns the keys and a mask of the rows that have a value.
+    """
+    valid = aadhaar.notna().to_numpy()
+    keys = np.zeros(len(aadhaar), dtype=np.uint64)
+    if not valid.any():
+        return keys, valid
+
+    values = aadhaar.to_numpy()[valid]
+    kind = aadhaar.dtype.kind
+    if kind in 'iu':
+        numeric = (values >= 0) & (values < 10 ** MAX_NUMERIC_DIGITS)
+        digits = np.where(numeric, values, 0).astype(np.uint64)
+        lengths = np.searchsorted(_POWERS_OF_TEN, digits, side='right') + 1
+    elif kind == 'f':
+        # Missing values turn an integer column into floats
+        numeric = (values >= 0) & (values == np.floor(values)) & (values < 10 ** MAX_NUMERIC_DIGITS)
+        digits = np.where(numeric, values, 0).astype(np.uint64)
+        lengths = np.searchsorted(_POWERS_OF_TEN, digits, side='right') + 1
+    else:
+        # Text (Aadhaar is parsed as text on upload): strip separators and parse in Arrow;
+        # the digit count includes leading zeros
+        text = pc.replace_substring_regex(pa.array(values.astype(str)), r'[\s-]', '')
+        text_lengths = pc.utf8_length(text)
+        numeric_mask = pc.and_(
+            pc.ascii_is_decimal(text),
+            pc.and_(pc.greater(text_lengths, 0), pc.less_equal(text_lengths, MAX_NUMERIC_DIGITS))
+        )
+        digits = pc.cast(pc.if_else(numeric_mask, text, '0'), pa.uint64()).to_numpy()
+        lengths = text_lengths.to_numpy(zero_copy_only=False)
+        numeric = numeric_mask.to_numpy(zero_copy_only=False)
+        values = text.to_numpy(zero_copy_only=False)
+
+    valid_keys = np.empty(len(values), dtype=np.uint64)
+    valid_keys[numeric] = digits[numeric] | (lengths[numeric].astype(np.uint64) << DIGIT_COUNT_SHIFT)
+    if not numeric.all():
+        valid_keys[~numeric] = _hashed_keys(values[~numeric])
+    keys[valid] = valid_keys
+    return keys, valid
+
+def aadhaar_keys(aadhaar: pd.Series) -> pd.Series:
+    """Normalized Aadhaar keys as strings (for the DB), so counts kept across batches line up."""
+    keys, valid = aadhaar_uint64(aadhaar)
+    return pd.Series(keys.astype(str), index=aadhaar.index, dtype=object).where(valid)
+
+def find_duplicates(keys: np.ndarray) -> np.ndarray:
+    """Sorted unique keys that occur more than once."""
+    ordered = np.sort(keys)
+    repeated = ordered[1:][ordered[1:] == ordered[:-1]]
+    return np.unique(repeated)
+
+def contains(sorted_keys: np.ndarray, keys: np.ndarray) -> np.ndarray:
+    """Membership of ``keys`` in a sorted key array, by binary search."""
+    if len(sorted_keys) == 0:
+        return np.zeros(len(keys), dtype=bool)
+    positions = np.searchsorted(sorted_keys, keys).clip(max=len(sorted_keys) - 1)
+    return sorted_keys[positions] == keys
+
+class AadhaarIndex:
+    """Sorted unique uint64 Aadhaar keys with their claim counts (12 bytes per key)."""
+
+    def __init__(self, keys: Optional[np.ndarray] = None, counts: Optional[np.ndarray] = None):
+        self.keys = np.empty(0, dtype=np.uint64) if keys is None else keys
+        self.counts = np.empty(0, dtype=np.uint32) if counts is None else counts
+
+    @classmethod
+    def from_series(cls, aadhaar: pd.Series) -> "AadhaarIndex":
+        keys, valid = aadhaar_uint64(aadhaar)
+        keys, counts = np.unique(keys[valid], return_counts=True)
+        return cls(keys, counts.astype(np.uint32))
+
+    @classmethod
+    def combine(cls, indexes: Iterable["AadhaarIndex"]) -> "AadhaarIndex":
+        indexes = [index for index in indexes if len(index)]
+        if not indexes:
+            return cls()
+        if len(indexes) == 1:
+            return indexes[0]
+        keys, inverse = np.unique(np.concatenate([index.keys for index in indexes]), return_inverse=True)
+        counts = np.bincount(inverse, weights=np.concatenate([index.counts for index in indexes]), minlength=len(keys))
+        return cls(keys, counts.astype(np.uint32))
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def counts_of(self, keys: np.ndarray) -> np.ndarray:
+        """Claim count of each key, 0 for keys not in the index."""
+        if len(self.keys) == 0:
+            return np.zeros(len(keys), dtype=np.uint32)
+        positions = np.searchsorted(self.keys, keys).clip(max=len(self.keys) - 1)
+        return np.where(self.keys[positions] == keys, self.counts[positions], 0)
+
+    def duplicates(self) -> np.ndarray:
+        """Keys claimed more than once."""
+        return self.keys[self.counts > 1]
+
+    def add(self, other: "AadhaarIndex") -> "AadhaarIndex":
+        """
+        Adds another index's claims in one linear merge: counts of known keys
+        are increased, new keys are inserted at their sorted positions.
+        """
+        if len(self.keys) == 0:
+            return AadhaarIndex(other.keys, other.counts.astype(np.uint64))
+        positions = np.searchsorted(self.keys, other.keys)
+        known = positions < len(self.keys)
+        known[known] = self.keys[positions[known]] == other.keys[known]
+
+        counts = np.array(self.counts, dtype=np.uint64)
+        counts[positions[known]] += other.counts[known].astype(np.uint64)
+        new = ~known
+        return AadhaarIndex(
+            np.insert(self.keys, positions[new], other.keys[new]),
+            np.insert(counts, positions[new], other.counts[new].astype(np.uint64))
+        )
+
+    def save(self, path: str) -> None:
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, keys=self.keys, counts=self.counts)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "AadhaarIndex":
+        with np.load(path) as data:
+            return cls(data["keys"], data["counts"])
+
+class AadhaarIndexStore:
+    """
+    One compact Aadhaar index per upload, plus the beneficiary index: claim
+    counts over every upload, maintained incrementally as uploads are stored.
+
+    The beneficiary index is a memory-mapped base plus one delta segment per
+    upload since the base was written. Writers (of any process) hold an exclusive
+    flock on a sidecar lock file, readers a shared one. Compaction writes the next
+    generation of the base; deltas of older generations are ignored, so a crash
+    half-way through never counts an upload twice.
+    """
+
+    def __init__(self, index_dir: str = os.path.join(DATA_DIR, f"aadhaar_index.v{AADHAAR_KEY_VERSION}")):
+        self.index_dir = index_dir
+        self._lock = threading.Lock()
+
+    def path_for(self, file_id: str) -> str:
+        return os.path.join(self.index_dir, f"{file_id}.npz")
+
+    def _base_path(self, generation: int) -> str:
+        # Keys in row 0, counts in row 1: one file, replaced atomically. Generation 0
+        # keeps the name of stores written before there were delta segments.
+        return os.path.join(self.index_dir, "corpus.npy" if generation == 0 else f"corpus.{generation}.npy")
+
+    @contextmanager
+    def _locked(self, exclusive: bool) -> Iterator[None]:
+        os.makedirs(self.index_dir, exist_ok=True)
+        with self._lock if exclusive else nullcontext():
+            with open(os.path.join(self.index_dir, ".lock"), "a+b") as lock_file:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+                yield # Closing the file releases the lock
+
+    def _segments(self) -> Tuple[int, List[str]]:
+        """Generation of the current base, and the paths of its delta segments."""
+        names = os.listdir(self.index_dir) if os.path.isdir(self.index_dir) else []
+        generation = max((int(match.group(1)) for match in map(_CORPUS_BASE.fullmatch, names) if match), default=0)
+        return generation, sorted(
+            os.path.join(self.index_dir, name)
+            for name, match in zip(names, map(_CORPUS_DELTA.fullmatch, names))
+            if match and int(match.group(1)) == generation
+        )
+
+    def has(self, file_id: str) -> bool:
+        return os.path.exists(self.path_for(file_id))
+
+    def load(self, file_id: str) -> AadhaarIndex:
+        path = self.path_for(file_id)
+        return AadhaarIndex.load(path) if os.path.exists(path) else AadhaarIndex()
+
+    def add(self, file_id: str, index: AadhaarIndex) -> None:
+        """Records claims of a new upload (or rows appended to one) in both indexes."""
+        with self._locked(exclusive=True):
+            # Appended rows are merged into the upload's existing index
+            AadhaarIndex.combine([self.load(file_id), index]).save(self.path_for(file_id))
+
+            generation, deltas = self._segments()
+            delta_path = os.path.join(self.index_dir, f"corpus.{generation}.delta.{uuid.uuid4().hex}.npz")
+            index.save(delta_path)
+            if len(deltas) + 1 >= CORPUS_COMPACT_SEGMENTS:
+                self._compact(generation, deltas + [delta_path])
+
+    def _compact(self, generation: int, deltas: List[str]) -> None:
+        # Caller holds the exclusive lock
+        added = AadhaarIndex.combine(AadhaarIndex.load(path) for path in deltas)
+        corpus = self._load_base(generation).add(added)
+        path = self._base_path(generation + 1)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.save(f, np.stack([corpus.keys, corpus.counts.astype(np.uint64)]))
+        os.replace(tmp_path, path)
+
+        # The new base is in place: everything of earlier generations is stale
+        for name in os.listdir(self.index_dir):
+            match = _CORPUS_BASE.fullmatch(name) or _CORPUS_DELTA.fullmatch(name)
+            if name == "corpus.npy" or (match and int(match.group(1)) <= generation):
+                os.remove(os.path.join(self.index_dir, name))
+
+    def _load_base(self, generation: int) -> AadhaarIndex:
+        # Memory-mapped: a lookup only touches the pages its binary search visits
+        path = self._base_path(generation)
+        if not os.path.exists(path):
+            return AadhaarIndex()
+        corpus = np.load(path, mmap_mode="r")
+        return AadhaarIndex(corpus[0], corpus[1])
+
+    def load_corpus(self) -> AadhaarIndex:
+        """The whole beneficiary index, base and deltas merged."""
+        with self._locked(exclusive=False):
+            generation, deltas = self._segments()
+            base = self._load_base(generation)
+            if not deltas:
+                return base
+            return base.add(AadhaarIndex.combine(AadhaarIndex.load(path) for path in deltas))
+
+    def _corpus_counts(self, keys: np.ndarray) -> np.ndarray:
+        # Claim count of each key over every upload, without merging the segments
+        generation, deltas = self._segments()
+        counts = self._load_base(generation).counts_of(keys).astype(np.uint64)
+        for path in deltas:
+            counts += AadhaarIndex.load(path).counts_of(keys).astype(np.uint64)
+        return counts
+
+    def claimed_elsewhere(self, file_id: str) -> np.ndarray:
+        """Sorted Aadhaar keys of an upload that also claim in any other upload."""
+        # The upload's own index and the corpus are read as of the same write
+        with self._locked(exclusive=False):
+            own = self.load(file_id)
+            if len(own) == 0:
+                return own.keys
+            return own.keys[self._corpus_counts(own.keys) > own.counts]
+
+aadhaar_index_store = AadhaarIndexStore()
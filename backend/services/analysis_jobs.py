@@ -0,0 +1,248 @@
+from sqlmodel import select, or_
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy import update
+from starlette.concurrency import run_in_threadpool
+from api.database import async_session_factory
+from models.schemas import AnalysisJob, AnalysisJobResponse, AnalysisResult
+from services.aadhaar_index import aadhaar_index_store
+from services.data_storage import data_storage
+from services.executor import detection_executor
+from services.fraud_detection import FraudDetector
+from services.metrics import flagged_cases, rows_processed, timed
+from services.sharded_detection import should_shard, detect_fraud_sharded
+from services.streaming_detection import OutOfCoreDetector, should_stream
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+import asyncio
+import os
+import socket
+import time
+import uuid
+
+ACTIVE_STATUSES = ("queued", "running")
+
+# This worker process. The nonce tells apart restarts that reuse a pid (pid 1 in containers).
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+# Owners refresh the heartbeat of their active jobs this often. A job whose heartbeat
+# is older than JOB_STALE_SECONDS lost its worker and is failed by whichever worker
+# notices first; jobs of other, live workers are left alone.
+JOB_HEARTBEAT_SECONDS = float(os.environ.get("SUBSIGUARD_JOB_HEARTBEAT_SECONDS", 15))
+JOB_STALE_SECONDS = float(os.environ.get("SUBSIGUARD_JOB_STALE_SECONDS", 120))
+
+class AnalysisJobService:
+    """Runs /analyze requests as background jobs and tracks their progress."""
+
+    def __init__(self):
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._submit_lock: Optional[asyncio.Lock] = None
+
+    async def submit(self, session: AsyncSession, file_id: str, detector: FraudDetector) -> AnalysisJob:
+        if self._submit_lock is None:
+            self._submit_lock = asyncio.Lock()
+
+        async with self._submit_lock:
+            await self._reclaim_stale(session, file_id)
+            # Attach to a job already running for this file instead of starting a duplicate
+            statement = select(AnalysisJob).where(
+                AnalysisJob.file_id == file_id,
+                AnalysisJob.status.in_(ACTIVE_STATUSES)
+            )
+            active_job = (await session.exec(statement)).first()
+            if active_job:
+                return active_job
+
+            job = AnalysisJob(file_id=file_id, owner=WORKER_ID, heartbeat_at=datetime.now(timezone.utc))
+            if await data_storage.has_results(session, file_id, detector.cache_key()):
+                # Results of this detector version/config already exist: nothing to re-calculate
+                job.status = "completed"
+                job.progress = 100
+                job.started_at = job.finished_at = job.created_at
+            session.add(job)
+            await session.commit()
+
+            if job.status == "queued":
+                self._tasks[job.id] = asyncio.create_task(self._run(job.id, file_id, detector))
+            return job
+
+    async def get(self, session: AsyncSession, job_id: str) -> Optional[AnalysisJob]:
+        job = await session.get(AnalysisJob, job_id)
+        if job is not None and job.status in ACTIVE_STATUSES and self._is_stale(job):
+            # Pollers of a job whose worker died see it fail instead of waiting forever
+            await self._reclaim_stale(session, job.file_id)
+            await session.refresh(job)
+        return job
+
+    def to_response(self, job: AnalysisJob) -> AnalysisJobResponse:
+        stage, progress, stage_timings = job.stage, job.progress, job.stage_timings or {}
+
+        # Stages running in the detection pool only report to memory until the job ends
+        live = detection_executor.progress.get(job.id)
+        if job.status == "running" and live:
+            stage, progress = live["stage"], live["progress"]
+            stage_timings = self._stage_timings(live["stage_starts"], time.time())
+
+        return AnalysisJobResponse(
+            job_id=job.id,
+            file_id=job.file_id,
+            status=job.status,
+            stage=stage,
+            progress=progress,
+            error=job.error,
+            stage_timings=stage_timings,
+            created_at=job.created_at,
+            started_at=job.started_at,
+            finished_at=job.finished_at
+        )
+
+    async def _run(self, job_id: str, file_id: str, detector: FraudDetector) -> None:
+        reporter = detection_executor.reporter(job_id)
+        heartbeat = asyncio.create_task(self._heartbeat(job_id))
+        async with async_session_factory() as session:
+            job = await session.get(AnalysisJob, job_id)
+            try:
+                job.status = "running"
+                job.started_at = job.heartbeat_at = datetime.now(timezone.utc)
+                await self._set_stage(session, job, "load", 0)
+
+                upload = await data_storage.get_upload(session, file_id)
+                if upload is None:
+                    raise ValueError("File not found. Please upload first.")
+
+                # Aadhaar numbers also claiming in other uploads, from the beneficiary index
+                with timed("analyze.cross_file"):
+                    cross_file_aadhaar = await run_in_threadpool(aadhaar_index_store.claimed_elsewhere, file_id)
+
+                paths = await data_storage.get_columnar_paths(session, file_id) if should_stream(upload.total_rows) else None
+                if paths:
+                    # Too large to load: read the segments chunk by chunk, store cases as they come
+                    await self._set_stage(session, job, "detect", 10)
+                    with timed("analyze.out_of_core"):
+                        summary = await self._detect_out_of_core(session, file_id, paths, detector, cross_file_aadhaar)
+                    rows_processed.inc(summary["total_records"], stage="analyze")
+                    flagged_cases.inc(summary["flagged_count"])
+                    job.status = "completed"
+                    job.progress = 100
+                    return
+
+                with timed("analyze.load"):
+                    df = await data_storage.get_data(session, file_id)
+                if df is None:
+                    raise ValueError("File not found. Please upload first.")
+
+                # CPU-bound: run in the detection pool so the event loop keeps serving requests
+                with timed("analyze.detect"):
+                    if should_shard(df, detection_executor):
+                        results = await detect_fraud_sharded(detector, detection_executor, file_id, df, progress=reporter, cross_file_aadhaar=cross_file_aadhaar)
+                    else:
+                        results = await detection_executor.run(detector.detect_fraud, file_id, df, progress=reporter, cross_file_aadhaar=cross_file_aadhaar)
+                rows_processed.inc(len(df), stage="analyze")
+                flagged_cases.inc(results.summary.flagged_count)
+                del df
+
+                await self._set_stage(session, job, "persist", 90)
+                with timed("analyze.persist"):
+                    await data_storage.save_results(
+                        session, file_id, results.model_dump(), flagged=results.flagged,
+                        detector_config=detector.config(), cache_key=detector.cache_key()
+                    )
+
+                job.status = "completed"
+                job.progress = 100
+            except Exception as e:
+                await session.rollback()
+                job = await session.get(AnalysisJob, job_id)
+                job.status = "failed"
+                job.error = f"Analysis failed: {str(e)}"
+            finally:
+                job.finished_at = datetime.now(timezone.utc)
+                live = detection_executor.pop_progress(job_id)
+                if live:
+                    job.stage_timings = self._stage_timings(live["stage_starts"], time.time())
+                heartbeat.cancel()
+                session.add(job)
+                await session.commit()
+                self._tasks.pop(job_id, None)
+
+    async def _detect_out_of_core(self, session: AsyncSession, file_id: str, paths: List[str], detector: FraudDetector, cross_file_aadhaar: Any) -> Dict[str, Any]:
+        streaming = OutOfCoreDetector(detector)
+        batches = detection_executor.iterate(streaming.detect_batches(paths, cross_file_aadhaar))
+
+        def results() -> Dict[str, Any]:
+            return AnalysisResult(
+                file_id=file_id, summary=streaming.summary, cases=[],
+                report_details=streaming.report_details, rule_stats=streaming.rule_stats
+            ).model_dump()
+
+        try:
+            await data_storage.save_streamed_results(
+                session, file_id, batches, results, detector_config=detector.config(), cache_key=detector.cache_key()
+            )
+        finally:
+            # Free the pool slot even if storing a batch failed mid-stream
+            await batches.aclose()
+        return streaming.summary.model_dump()
+
+    async def _heartbeat(self, job_id: str) -> None:
+        # Separate session: the job's own session may be busy in a long await
+        while True:
+            await asyncio.sleep(JOB_HEARTBEAT_SECONDS)
+            async with async_session_factory() as session:
+                await session.execute(
+                    update(AnalysisJob)
+                    .where(AnalysisJob.id == job_id, AnalysisJob.owner == WORKER_ID, AnalysisJob.status.in_(ACTIVE_STATUSES))
+                    .values(heartbeat_at=datetime.now(timezone.utc))
+                )
+                await session.commit()
+
+    async def _set_stage(self, session: AsyncSession, job: AnalysisJob, stage: str, percent: int) -> None:
+        detection_executor.record_progress(job.id, stage, percent)
+        job.stage = stage
+        job.progress = percent
+        session.add(job)
+        await session.commit()
+
+    @staticmethod
+    def _stage_timings(stage_starts: Dict[str, float], now: float) -> Dict[str, float]:
+        # Each stage lasts until the next one starts; the last one until now
+        ordered = sorted(stage_starts.items(), key=lambda item: item[1])
+        timings = {}
+        for i, (stage, started) in enumerate(ordered):
+            ended = ordered[i + 1][1] if i + 1 < len(ordered) else now
+            timings[stage] = round(ended - started, 3)
+        return timings
+
+    def _is_stale(self, job: AnalysisJob) -> bool:
+        if job.owner == WORKER_ID and job.id in self._tasks:
+            return False # Ours and still running, however busy the event loop was
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=JOB_STALE_SECONDS)
+        return job.heartbeat_at is None or job.heartbeat_at < cutoff
+
+    async def _reclaim_stale(self, session: AsyncSession, file_id: Optional[str] = None) -> int:
+        """Fails active jobs whose owner stopped sending heartbeats. Returns how many."""
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=JOB_STALE_SECONDS)
+        statement = select(AnalysisJob).where(
+            AnalysisJob.status.in_(ACTIVE_STATUSES),
+            or_(AnalysisJob.heartbeat_at.is_(None), AnalysisJob.heartbeat_at < cutoff)
+        )
+        if file_id is not None:
+            statement = statement.where(AnalysisJob.file_id == file_id)
+        reclaimed = 0
+        for job in (await session.exec(statement)).all():
+            if not self._is_stale(job):
+                continue
+            job.status = "failed"
+            job.error = "Interrupted: the worker running this job stopped responding"
+            job.finished_at = datetime.now(timezone.utc)
+            session.add(job)
+            reclaimed += 1
+        await session.commit()
+        return reclaimed
+
+    async def recover(self) -> None:
+        # Jobs of workers that died (e.g. before a restart) will never finish; jobs
+        # of other live workers keep their fresh heartbeat and are not touched
+        async with async_session_factory() as session:
+            await self._reclaim_stale(session)
+
+analysis_jobs = AnalysisJobService()
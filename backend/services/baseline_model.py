@@ -0,0 +1,171 @@
+import numpy as np
+import pandas as pd
+import hashlib
+import json
+import os
+import threading
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional, Tuple, Union
+from services.aadhaar_index import AadhaarIndex
+from services.columnar_storage import DATA_DIR
+from services.fraud_detection import STAT_FEATURES, block_moments, combine_moments, moments_std
+from services.robust_stats import MIN_STRATUM_ROWS, RobustBaseline, feature_matrix
+
+# Bump when the artifact layout changes; artifacts of another format are rejected
+BASELINE_FORMAT_VERSION = 1
+
+# Artifact loaded into the API's detector at startup. Unset: every batch is
+# scored against its own statistics.
+BASELINE_PATH = os.environ.get("SUBSIGUARD_BASELINE_PATH")
+BASELINE_DIR = os.path.join(DATA_DIR, "baselines")
+
+# Quantiles of the reference kept per feature (and per scheme)
+BASELINE_QUANTILES = [0.01, 0.05, 0.25, 0.5, 0.75, 0.95, 0.99]
+
+SCHEME_COLUMN = 'subsidy_type'
+
+FeatureStats = Dict[str, Tuple[Union[float, np.ndarray], Union[float, np.ndarray]]]
+
+# Artifacts already loaded in this process, by path (see FittedBaseline.__setstate__)
+_loaded: Dict[str, "FittedBaseline"] = {}
+_loaded_lock = threading.Lock()
+
+class FittedBaseline:
+    """
+    Statistics of a trusted reference dataset, fitted once and scored against
+    instead of each batch's own: moments and quantiles per feature and per
+    scheme, robust per-stratum medians/MADs, and the reference Aadhaar index.
+    """
+
+    def __init__(self, metadata: Dict[str, Any], aadhaar: AadhaarIndex, path: Optional[str] = None):
+        self.metadata = metadata
+        self.aadhaar = aadhaar
+        self.path = path
+        self.version: str = metadata["version"]
+        self.robust = RobustBaseline.from_dict(metadata["robust"])
+        self.duplicate_aadhaar = aadhaar.duplicates()
+
+        # Per-scheme mean/std arrays with the overall values last, so rows of an
+        # unknown (or too small) scheme pick the overall entry at position -1
+        self.feature_stats: Dict[str, Tuple[float, float]] = {
+            feature: (moments["mean"], moments_std(moments)) for feature, moments in metadata["moments"].items()
+        }
+        schemes = {
+            scheme: features for scheme, features in metadata["scheme_moments"].items()
+            if min((moments["count"] for moments in features.values()), default=0) >= MIN_STRATUM_ROWS
+        }
+        self._schemes = pd.Index(list(schemes), dtype=object)
+        self._scheme_stats = {
+            feature: (
+                np.array([schemes[scheme][feature]["mean"] for scheme in schemes] + [mean]),
+                np.array([moments_std(schemes[scheme][feature]) for scheme in schemes] + [std])
+            )
+            for feature, (mean, std) in self.feature_stats.items()
+        }
+
+    @classmethod
+    def fit(cls, df: pd.DataFrame, source: str = "") -> "FittedBaseline":
+        features = [feature for feature in STAT_FEATURES if feature in df.columns]
+        values = feature_matrix(df, features)
+
+        metadata: Dict[str, Any] = {
+            "format_version": BASELINE_FORMAT_VERSION,
+            "fitted_at": datetime.now(timezone.utc).isoformat(),
+            "source": source,
+            "rows": len(df),
+            "features": features,
+            "moments": {feature: combine_moments(block_moments(values[:, i])) for i, feature in enumerate(features)},
+            "quantiles": cls._quantiles(values, features),
+            "scheme_moments": {},
+            "scheme_quantiles": {},
+            "robust": RobustBaseline.from_frame(df, features).to_dict()
+        }
+
+        if SCHEME_COLUMN in df.columns and len(df):
+            # One stable sort by scheme, then contiguous slices instead of a mask per scheme
+            codes, schemes = pd.factorize(df[SCHEME_COLUMN])
+            order = np.argsort(codes, kind='stable')
+            bounds = np.searchsorted(codes[order], np.arange(len(schemes) + 1))
+            for code, scheme in enumerate(schemes):
+                rows = values[order[bounds[code]:bounds[code + 1]]]
+                metadata["scheme_moments"][str(scheme)] = {
+                    feature: combine_moments(block_moments(rows[:, i])) for i, feature in enumerate(features)
+                }
+                metadata["scheme_quantiles"][str(scheme)] = cls._quantiles(rows, features)
+
+        aadhaar = AadhaarIndex.from_series(df['aadhaar']) if 'aadhaar' in df.columns else AadhaarIndex()
+        digest = hashlib.sha256(json.dumps(metadata, sort_keys=True).encode())
+        digest.update(aadhaar.keys.tobytes())
+        digest.update(aadhaar.counts.tobytes())
+        metadata["version"] = digest.hexdigest()[:16]
+        return cls(metadata, aadhaar)
+
+    @staticmethod
+    def _quantiles(values: np.ndarray, features) -> Dict[str, Dict[str, float]]:
+        if len(values) == 0:
+            return {}
+        quantiles = np.quantile(values, BASELINE_QUANTILES, axis=0)
+        return {
+            feature: {str(q): float(quantiles[j, i]) for j, q in enumerate(BASELINE_QUANTILES)}
+            for i, feature in enumerate(features)
+        }
+
+    def feature_stats_for(self, df: pd.DataFrame) -> FeatureStats:
+        """Mean/std of every feature for each row: its scheme's, else the overall reference values."""
+        if len(self._schemes) == 0 or SCHEME_COLUMN not in df.columns:
+            return self.feature_stats
+        positions = self._schemes.get_indexer(df[SCHEME_COLUMN].astype(object))
+        return {feature: (means[positions], stds[positions]) for feature, (means, stds) in self._scheme_stats.items()}
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            key: self.metadata[key]
+            for key in ("version", "format_version", "fitted_at", "source", "rows", "features", "quantiles")
+        } | {"schemes": sorted(self.metadata["scheme_moments"]), "reference_aadhaar": len(self.aadhaar)}
+
+    # --- Persistence ---
+
+    def save(self, path: Optional[str] = None) -> str:
+        path = path or os.path.join(BASELINE_DIR, f"baseline-{self.version}.npz")
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, metadata=np.array(json.dumps(self.metadata)), keys=self.aadhaar.keys, counts=self.aadhaar.counts)
+        os.replace(tmp_path, path)
+        self.path = path
+        return path
+
+    @classmethod
+    def load(cls, path: str) -> "FittedBaseline":
+        with np.load(path) as data:
+            metadata = json.loads(str(data["metadata"]))
+            if metadata.get("format_version") != BASELINE_FORMAT_VERSION:
+                raise ValueError(
+                    f"Baseline {path} has format version {metadata.get('format_version')}, "
+                    f"expected {BASELINE_FORMAT_VERSION}; refit it with fit_baseline.py"
+                )
+            return cls(metadata, AadhaarIndex(data["keys"], data["counts"]), path)
+
+    # Detection workers get the detector pickled per job: send the path, not the
+    # arrays, and load each artifact once per process
+    def __getstate__(self) -> Dict[str, Any]:
+        if self.path is None:
+            return self.__dict__
+        return {"path": self.path, "version": self.version}
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        if "metadata" in state:
+            self.__dict__.update(state)
+            return
+        with _loaded_lock:
+            baseline = _loaded.get(state["path"])
+            if baseline is None or baseline.version != state["version"]:
+                baseline = _loaded[state["path"]] = FittedBaseline.load(state["path"])
+        if baseline.version != state["version"]:
+            raise RuntimeError(f"Baseline {state['path']} changed on disk while in use")
+        self.__dict__.update(baseline.__dict__)
+
+def load_configured_baseline() -> Optional[FittedBaseline]:
+    """The artifact named by SUBSIGUARD_BASELINE_PATH, if any."""
+    return FittedBaseline.load(BASELINE_PATH) if BASELINE_PATH else None
@@ -0,0 +1,89 @@
+import numpy as np
+import pandas as pd
+from typing import List, Optional
+
+# Scales a median absolute deviation to a standard deviation (normal data)
+MAD_SCALE = 1.4826
+
+# A baseline's spread is at least this fraction of its median (and at least 1),
+# so distributors with perfectly regular volumes do not flag on tiny changes
+MIN_SCALE_FRACTION = 0.1
+
+def daily_claims(df: pd.DataFrame, by: List[str], date: str, amount: Optional[str] = None) -> pd.DataFrame:
+    """
+    Claims and claimed amount per (``by``..., ``date``) group. Mergeable: the
+    frames of several shards or chunks add up (concat, then sum per group).
+    """
+    values = pd.DataFrame({
+        "claims": np.ones(len(df), dtype=np.int64),
+        "amount": pd.to_numeric(df[amount], errors='coerce').fillna(0).to_numpy(dtype=float)
+        if amount and amount in df.columns else np.zeros(len(df))
+    }, index=df.index)
+    return values.groupby([df[column] for column in by + [date]], sort=False, observed=True).sum()
+
+def _robust_z(values: np.ndarray, median: np.ndarray, mad: np.ndarray) -> np.ndarray:
+    scale = np.maximum(MAD_SCALE * mad, np.maximum(MIN_SCALE_FRACTION * np.abs(median), 1.0))
+    return (values - median) / scale
+
+def flag_bursts(daily: pd.DataFrame, window_days: int = 1, min_claims: int = 10, threshold: float = 3.5, min_history: int = 7) -> pd.Index:
+    """
+    (distributor, date) groups of ``daily`` (see ``daily_claims``) on which the
+    distributor's claim volume or amount over the trailing ``window_days`` is
+    anomalous, judged by robust Z-scores (median/MAD):
+
+    - against peers: all distributors' windows, and
+    - against the distributor's own windows, once it has ``min_history`` active days.
+
+    A window needs at least ``min_claims`` claims, and only days that add more
+    claims than the distributor's usual day are flagged. Everything is sorted
+    array arithmetic over distinct distributor-days: windows are prefix-sum
+    differences found by binary search, baselines are group medians.
+    """
+    if daily.empty:
+        return daily.index[:0]
+
+    # Dates are parsed once per distinct value, not once per distributor-day
+    dates = pd.to_datetime(daily.index.levels[-1], errors='coerce', format='mixed')
+    days = dates.take(daily.index.codes[-1])
+    valid = ~days.isna()
+    if not valid.any():
+        return daily.index[:0]
+    daily = daily[valid]
+    day_numbers = days[valid].to_numpy(dtype='datetime64[D]').astype(np.int64)
+    distributors, _ = pd.factorize(daily.index.droplevel(-1))
+
+    # One sortable integer per distributor-day; a distributor's days are contiguous
+    # and ``span`` keeps any window from reaching into the previous distributor
+    first_day = day_numbers.min()
+    span = np.int64(day_numbers.max() - first_day + window_days + 1)
+    keys, inverse = np.unique(distributors.astype(np.int64) * span + (day_numbers - first_day), return_inverse=True)
+    claims = np.bincount(inverse, weights=daily["claims"].to_numpy(dtype=float), minlength=len(keys))
+    amounts = np.bincount(inverse, weights=daily["amount"].to_numpy(dtype=float), minlength=len(keys))
+    owners = keys // span
+
+    # Trailing window sums: prefix sums between the window's first day and today
+    starts = np.searchsorted(keys, keys - (window_days - 1), side='left')
+    def window(values: np.ndarray) -> np.ndarray:
+        prefix = np.concatenate([[0.0], np.cumsum(values)])
+        return prefix[1:] - prefix[starts]
+
+    history = pd.Series(owners).groupby(owners).transform('size').to_numpy()
+    established = history >= min_history
+    usual_day = pd.Series(claims).groupby(owners).transform('median').to_numpy()
+
+    anomalous = np.zeros(len(keys), dtype=bool)
+    window_claims = window(claims)
+    for values in (window_claims, window(amounts)):
+        peer_median = np.median(values)
+        peer_mad = np.median(np.abs(values - peer_median))
+        above_peers = _robust_z(values, peer_median, peer_mad) > threshold
+
+        series = pd.Series(values)
+        own_median = series.groupby(owners).transform('median').to_numpy()
+        own_mad = (series - own_median).abs().groupby(owners).transform('median').to_numpy()
+        above_own = _robust_z(values, own_median, own_mad) > threshold
+
+        anomalous |= above_peers & (~established | above_own)
+
+    flagged = (window_claims >= min_claims) & anomalous & (~established | (claims > usual_day))
+    return daily.index[flagged[inverse]]
@@ -0,0 +1,128 @@
+import numpy as np
+import pyarrow as pa
+import pandas as pd
+import os
+import uuid
+from typing import List, Optional
+from services.record_schema import to_frame
+
+IS_VERCEL = os.environ.get("VERCEL") == "1"
+
+# Where uploaded datasets are written as Arrow IPC files (Vercel only allows writes to /tmp)
+DATA_DIR = os.environ.get(
+    "SUBSIGUARD_DATA_DIR",
+    "/tmp/subsiguard_data" if IS_VERCEL else "./data_store"
+)
+
+def _stringify(series: pd.Series) -> pd.Series:
+    # Keep missing values missing, everything else becomes text
+    return series.where(series.isna(), series.astype(str))
+
+class ColumnarWriter:
+    """Appends DataFrame chunks to one Arrow IPC file with a fixed schema."""
+
+    def __init__(self, path: str, schema: Optional[pa.Schema] = None):
+        self.path = path
+        self._tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        self._writer = None
+        # Appended segments reuse the schema of the original upload
+        self._schema = schema
+        self.rows_written = 0
+
+    def write(self, df: pd.DataFrame) -> None:
+        if self._schema is not None:
+            df = df.reindex(columns=self._schema.names)
+        table = self._to_table(df)
+        if self._writer is None:
+            self._schema = table.schema
+            self._writer = pa.ipc.new_file(self._tmp_path, self._schema)
+        self._writer.write_table(table)
+        self.rows_written += len(df)
+
+    def close(self) -> str:
+        if self._writer is None:
+            # No chunks at all: still leave a readable (empty) file behind
+            self._writer = pa.ipc.new_file(self._tmp_path, self._schema or pa.schema([]))
+        self._writer.close()
+        os.replace(self._tmp_path, self.path)
+        return self.path
+
+    def abort(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+        if os.path.exists(self._tmp_path):
+            os.remove(self._tmp_path)
+
+    def _to_table(self, df: pd.DataFrame) -> pa.Table:
+        if self._schema is None:
+            try:
+                return pa.Table.from_pandas(df, preserve_index=False)
+            except (pa.ArrowInvalid, pa.ArrowTypeError):
+                # Mixed Python types in an object column: store it as text
+                df = df.copy()
+                for column in df.columns[df.dtypes == object]:
+                    df[column] = _stringify(df[column])
+                return pa.Table.from_pandas(df, preserve_index=False)
+
+        try:
+            return pa.Table.from_pandas(df, schema=self._schema, preserve_index=False)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            # Columns the first chunk stored as text take this chunk's values as text too
+            df = df.copy()
+            for field in self._schema:
+                if pa.types.is_string(field.type) and field.name in df.columns:
+                    df[field.name] = _stringify(df[field.name])
+            try:
+                return pa.Table.from_pandas(df, schema=self._schema, preserve_index=False)
+            except (pa.ArrowInvalid, pa.ArrowTypeError):
+                pass
+            try:
+                # Uploads stored before columns had declared types (e.g. Aadhaar as integers)
+                return pa.Table.from_pandas(df, preserve_index=False).cast(self._schema)
+            except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError) as e:
+                raise ValueError(f"Column types changed between chunks of the upload: {e}")
+
+class ColumnarStore:
+    def __init__(self, data_dir: str = DATA_DIR):
+        self.data_dir = data_dir
+
+    def path_for(self, file_id: str, segment_index: int = 0) -> str:
+        if segment_index == 0:
+            return os.path.join(self.data_dir, f"{file_id}.arrow")
+        return os.path.join(self.data_dir, f"{file_id}.{segment_index}.arrow")
+
+    def open_writer(self, file_id: str, segment_index: int = 0, schema: Optional[pa.Schema] = None) -> ColumnarWriter:
+        os.makedirs(self.data_dir, exist_ok=True)
+        return ColumnarWriter(self.path_for(file_id, segment_index), schema)
+
+    def read_schema(self, path: str) -> pa.Schema:
+        with pa.memory_map(path, "r") as source:
+            return pa.ipc.open_file(source).schema
+
+    def read(self, paths: List[str], columns: Optional[List[str]] = None) -> Optional[pd.DataFrame]:
+        """Whole upload, or only the given columns of it (missing ones are skipped)."""
+        table = self._open(paths)
+        if table is None:
+            return None
+        if columns is not None:
+            table = table.select([column for column in columns if column in table.column_names])
+        return to_frame(table)
+
+    def take(self, paths: List[str], positions: np.ndarray) -> Optional[pd.DataFrame]:
+        """Reads only the given row positions; untouched columns are never converted."""
+        table = self._open(paths)
+        if table is None:
+            return None
+        return to_frame(table.take(pa.array(positions, type=pa.int64())))
+
+    def _open(self, paths: List[str]) -> Optional[pa.Table]:
+        if not all(os.path.exists(path) for path in paths):
+            return None
+        # Memory-map the files: the columns are already typed, nothing is parsed again
+        tables = []
+        for path in paths:
+            with pa.memory_map(path, "r") as source:
+                tables.append(pa.ipc.open_file(source).read_all())
+        return pa.concat_tables(tables) if len(tables) > 1 else tables[0]
+
+columnar_store = ColumnarStore()
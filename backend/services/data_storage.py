@@ -1,50 +1,603 @@
-from sqlmodel import select
+from sqlmodel import select, func
 from sqlmodel.ext.asyncio.session import AsyncSession
-from models.schemas import UploadedFile, AnalysisResultDB
-from typing import Optional, Dict, Any, List
+from sqlalchemy import insert, update, delete
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import aliased
+from sqlalchemy.orm.attributes import set_committed_value
+from models.schemas import UploadedFile, UploadChunk, UploadSegment, AnalysisResultDB, AadhaarCount, DetectionState, AnalysisRollup, AnalysisBreakdown, FraudCaseDB
+from services.aadhaar_index import AadhaarIndex, aadhaar_index_store
+from services.columnar_storage import columnar_store
+from services.fraud_detection import CASE_FIELDS, FRAUD_REASONS, FlaggedCases, reasons_for
+from services.rule_engine import REASON_DTYPE
+from typing import Optional, Dict, Any, List, AsyncIterable, AsyncIterator, Callable, Tuple, Sequence, Iterable
+from datetime import datetime, timezone
+import numpy as np
 import pandas as pd
-import json
+import os
+
+# "arrow": typed Arrow IPC files on disk, DB keeps metadata only
+# "json": rows stored as JSON chunks inside the database
+STORAGE_BACKEND = os.environ.get("SUBSIGUARD_STORAGE_BACKEND", "arrow")
+
+# Keys per IN (...) query, below SQLite's bound-parameter limit
+SQL_BATCH_SIZE = 500
+
+# Fraud case rows per bulk INSERT
+CASE_INSERT_BATCH = 5_000
+
+REASON_BITS = {reason: 1 << bit for bit, reason in enumerate(FRAUD_REASONS)}
+
+# INSERT statements that can skip rows violating a unique index
+CONFLICT_INSERTS = {"sqlite": sqlite.insert, "postgresql": postgresql.insert}
 
 class DataStorageService:
+    def __init__(self, backend: str = STORAGE_BACKEND):
+        self.backend = backend
+
     async def save_upload(self, session: AsyncSession, file_id: str, filename: str, df: pd.DataFrame) -> None:
-        # Convert DataFrame to JSON-compatible list of dicts
-        data_json = df.to_dict(orient="records")
-        
-        upload = UploadedFile(
-            id=file_id, 
-            filename=filename, 
-            data={"records": data_json} # Wrapping in a dict for flexibility
-        )
+        async def single_chunk():
+            yield df
+
+        await self.save_upload_chunks(session, file_id, filename, single_chunk())
+
+    async def save_upload_chunks(self, session: AsyncSession, file_id: str, filename: str, chunks: AsyncIterable[pd.DataFrame], content_hash: Optional[Callable[[], str]] = None) -> UploadedFile:
+        """
+        Stores an upload chunk by chunk. ``content_hash`` gives the hash of the
+        uploaded bytes once the chunks are consumed; if an upload with that hash
+        exists, the new copy is dropped and the existing upload is returned.
+        The hash is claimed in the transaction that stores the upload (the
+        column is unique), so concurrent uploads of one file store it once.
+        """
+        # Persist each parsed chunk as soon as it arrives so only one chunk is held in memory
+        upload = UploadedFile(id=file_id, filename=filename)
+        indexes: List[AadhaarIndex] = []
+        chunks = self._indexed(chunks, indexes)
+
+        if self.backend == "arrow":
+            upload.total_rows, upload.storage_path = await self._write_columnar(file_id, 0, chunks)
+            upload.content_hash = content_hash() if content_hash else None
+            stored = await self._insert_upload(session, upload)
+            digest, storage_path = upload.content_hash, upload.storage_path
+        else:
+            session.add(upload)
+            await session.flush()
+
+            upload.total_rows = await self._write_json_chunks(session, file_id, 0, chunks)
+            session.add(upload)
+            await session.flush()
+            digest, storage_path = content_hash() if content_hash else None, None
+            stored = await self._claim_content_hash(session, file_id, digest)
+            if stored:
+                set_committed_value(upload, "content_hash", digest)
+
+        if not stored:
+            existing = await self.find_upload_by_hash(session, digest)
+            session.expunge(existing)
+            # Drops the rows stored so far along with the upload
+            await session.rollback()
+            if storage_path:
+                os.remove(storage_path)
+            return existing
+
+        await session.commit()
+        aadhaar_index_store.add(file_id, AadhaarIndex.combine(indexes))
+        return upload
+
+    async def _insert_upload(self, session: AsyncSession, upload: UploadedFile) -> bool:
+        """Inserts the upload unless one with its content hash exists. Returns whether it was inserted."""
+        conflict_insert = CONFLICT_INSERTS.get(session.bind.dialect.name)
+        if conflict_insert is None:
+            try:
+                await session.execute(insert(UploadedFile), [upload.model_dump()])
+                return True
+            except IntegrityError:
+                await session.rollback()
+                return False
+        statement = conflict_insert(UploadedFile).values(**upload.model_dump()).on_conflict_do_nothing(index_elements=["content_hash"])
+        return (await session.execute(statement)).rowcount == 1
+
+    async def _claim_content_hash(self, session: AsyncSession, file_id: str, content_hash: Optional[str]) -> bool:
+        """Sets the hash of a stored upload unless another upload has it. Returns whether it was set."""
+        if content_hash is None:
+            return True
+        other = aliased(UploadedFile)
+        statement = update(UploadedFile).where(
+            UploadedFile.id == file_id,
+            ~select(other.id).where(other.content_hash == content_hash).exists()
+        ).values(content_hash=content_hash)
+        try:
+            return (await session.execute(statement)).rowcount == 1
+        except IntegrityError:
+            # Server databases: a concurrent upload of the same content committed in between
+            await session.rollback()
+            return False
+
+    async def append_upload_chunks(self, session: AsyncSession, file_id: str, chunks: AsyncIterable[pd.DataFrame]) -> Optional[Tuple[int, int]]:
+        """Appends rows to an existing upload. Returns (first new row, rows added)."""
+        upload = await self.get_upload(session, file_id)
+        if upload is None:
+            return None
+        if upload.data:
+            raise ValueError("Uploads stored as a single JSON blob cannot be appended to")
+
+        start_row = upload.total_rows
+        indexes: List[AadhaarIndex] = []
+        chunks = self._indexed(chunks, indexes)
+        if upload.storage_path:
+            segments = await self._get_segments(session, file_id)
+            segment_index = len(segments) + 1
+            schema = columnar_store.read_schema(upload.storage_path)
+            rows_added, path = await self._write_columnar(file_id, segment_index, chunks, schema)
+            session.add(UploadSegment(
+                file_id=file_id,
+                segment_index=segment_index,
+                storage_path=path,
+                start_row=start_row,
+                row_count=rows_added
+            ))
+        else:
+            statement = select(func.count()).select_from(UploadChunk).where(UploadChunk.file_id == file_id)
+            next_chunk = (await session.exec(statement)).one()
+            rows_added = await self._write_json_chunks(session, file_id, next_chunk, chunks)
+
+        upload.total_rows = start_row + rows_added
+        # The content no longer matches the uploaded file
+        upload.content_hash = None
         session.add(upload)
         await session.commit()
-    
-    async def get_data(self, session: AsyncSession, file_id: str) -> Optional[pd.DataFrame]:
+
+        aadhaar_index_store.add(file_id, AadhaarIndex.combine(indexes))
+        return start_row, rows_added
+
+    async def backfill_aadhaar_indexes(self, session: AsyncSession) -> int:
+        """Adds uploads stored before the beneficiary index existed to it. Returns how many."""
+        file_ids = (await session.exec(select(UploadedFile.id))).all()
+        added = 0
+        for file_id in file_ids:
+            if aadhaar_index_store.has(file_id):
+                continue
+            df = await self.get_data(session, file_id)
+            if df is not None and 'aadhaar' in df.columns:
+                aadhaar_index_store.add(file_id, AadhaarIndex.from_series(df['aadhaar']))
+                added += 1
+        return added
+
+    @staticmethod
+    async def _indexed(chunks: AsyncIterable[pd.DataFrame], indexes: List[AadhaarIndex]) -> AsyncIterable[pd.DataFrame]:
+        # Collects each chunk's compact Aadhaar index while it is being stored
+        async for df in chunks:
+            if 'aadhaar' in df.columns:
+                indexes.append(AadhaarIndex.from_series(df['aadhaar']))
+            yield df
+
+    async def _write_columnar(self, file_id: str, segment_index: int, chunks: AsyncIterable[pd.DataFrame], schema=None) -> Tuple[int, str]:
+        writer = columnar_store.open_writer(file_id, segment_index, schema)
+        try:
+            async for df in chunks:
+                writer.write(df)
+            return writer.rows_written, writer.close()
+        except BaseException:
+            writer.abort()
+            raise
+
+    async def _write_json_chunks(self, session: AsyncSession, file_id: str, chunk_index: int, chunks: AsyncIterable[pd.DataFrame]) -> int:
+        total_rows = 0
+        async for df in chunks:
+            # Core INSERT: no ORM object is tracked, the rows can be freed right away
+            await session.execute(insert(UploadChunk), [{
+                "file_id": file_id,
+                "chunk_index": chunk_index,
+                "records": df.to_dict(orient="records") # JSON-compatible list of dicts
+            }])
+
+            total_rows += len(df)
+            chunk_index += 1
+        return total_rows
+
+    async def get_upload(self, session: AsyncSession, file_id: str) -> Optional[UploadedFile]:
         statement = select(UploadedFile).where(UploadedFile.id == file_id)
         result = await session.exec(statement)
-        uploaded_file = result.first()
+        return result.first()
+
+    async def find_upload_by_hash(self, session: AsyncSession, content_hash: str) -> Optional[UploadedFile]:
+        statement = select(UploadedFile).where(UploadedFile.content_hash == content_hash).order_by(UploadedFile.upload_date)
+        return (await session.exec(statement)).first()
+
+    async def _get_segments(self, session: AsyncSession, file_id: str) -> List[UploadSegment]:
+        statement = select(UploadSegment).where(UploadSegment.file_id == file_id).order_by(UploadSegment.segment_index)
+        return list((await session.exec(statement)).all())
+
+    async def get_columnar_paths(self, session: AsyncSession, file_id: str) -> Optional[List[str]]:
+        """Arrow files of an upload in row order, e.g. for out-of-core detection."""
+        upload = await self.get_upload(session, file_id)
+        if upload is None or not upload.storage_path:
+            return None
+        return await self._columnar_paths(session, upload)
+
+    async def _columnar_paths(self, session: AsyncSession, upload: UploadedFile) -> List[str]:
+        segments = await self._get_segments(session, upload.id)
+        return [upload.storage_path] + [segment.storage_path for segment in segments]
+    
+    async def get_data(self, session: AsyncSession, file_id: str, columns: Optional[List[str]] = None) -> Optional[pd.DataFrame]:
+        """The whole upload; with ``columns``, only those of them that exist."""
+        uploaded_file = await self.get_upload(session, file_id)
         
-        if uploaded_file and uploaded_file.data:
-            # Convert JSON back to DataFrame
+        if uploaded_file is None:
+            return None
+
+        if uploaded_file.storage_path:
+            return columnar_store.read(await self._columnar_paths(session, uploaded_file), columns)
+
+        if columns is not None:
+            df = await self.get_data(session, file_id)
+            return None if df is None else df[[column for column in columns if column in df.columns]]
+
+        if uploaded_file.data:
+            # Legacy uploads: convert the single JSON blob back to a DataFrame
             records = uploaded_file.data.get("records", [])
             return pd.DataFrame(records)
-        return None
 
-    async def save_results(self, session: AsyncSession, file_id: str, results: Dict[str, Any]) -> None:
+        statement = select(UploadChunk).where(UploadChunk.file_id == file_id).order_by(UploadChunk.chunk_index)
+        chunks = (await session.exec(statement)).all()
+        if not chunks:
+            return None
+        return pd.concat([pd.DataFrame(chunk.records) for chunk in chunks], ignore_index=True)
+
+    async def get_rows(self, session: AsyncSession, file_id: str, positions: Sequence[int]) -> Optional[pd.DataFrame]:
+        """Rows at the given positions, indexed by position."""
+        positions = np.asarray(positions, dtype=np.int64)
+        uploaded_file = await self.get_upload(session, file_id)
+        if uploaded_file is None:
+            return None
+
+        if uploaded_file.storage_path:
+            rows = columnar_store.take(await self._columnar_paths(session, uploaded_file), positions)
+        else:
+            # JSON-backed uploads have no random access, load the whole dataset
+            df = await self.get_data(session, file_id)
+            rows = None if df is None else df.iloc[positions].copy()
+
+        if rows is not None:
+            rows.index = pd.Index(positions)
+        return rows
+
+    async def get_detection_state(self, session: AsyncSession, file_id: str) -> Optional[DetectionState]:
+        statement = select(DetectionState).where(DetectionState.file_id == file_id)
+        return (await session.exec(statement)).first()
+
+    async def save_detection_state(self, session: AsyncSession, state: DetectionState) -> None:
+        # Not committed here: it is written together with the updated results
+        state.updated_at = datetime.now(timezone.utc)
+        await session.merge(state)
+
+    async def get_aadhaar_counts(self, session: AsyncSession, file_id: str, keys: List[str]) -> Dict[str, Tuple[int, int]]:
+        """Running (claim count, first row) for the given Aadhaar keys of one dataset."""
+        counts = {}
+        for start in range(0, len(keys), SQL_BATCH_SIZE):
+            statement = select(AadhaarCount).where(
+                AadhaarCount.file_id == file_id,
+                AadhaarCount.aadhaar_key.in_(keys[start:start + SQL_BATCH_SIZE])
+            )
+            for entry in (await session.exec(statement)).all():
+                counts[entry.aadhaar_key] = (entry.claim_count, entry.first_row)
+        return counts
+
+    async def save_aadhaar_counts(self, session: AsyncSession, file_id: str, counts: Dict[str, Tuple[int, int]], existing: Iterable[str] = ()) -> None:
+        """
+        Inserts new keys and updates the keys listed in ``existing``.
+        Not committed here: it is written together with the updated results.
+        """
+        existing = set(existing)
+        inserts = []
+        updates = []
+        for key, (claim_count, first_row) in counts.items():
+            entry = {"file_id": file_id, "aadhaar_key": key, "claim_count": claim_count, "first_row": first_row}
+            (updates if key in existing else inserts).append(entry)
+
+        if inserts:
+            await session.execute(insert(AadhaarCount), inserts)
+        if updates:
+            await session.execute(update(AadhaarCount), updates)
+
+    async def save_results(self, session: AsyncSession, file_id: str, results: Dict[str, Any], flagged: Optional[FlaggedCases] = None, detector_config: Optional[Dict[str, Any]] = None, cache_key: Optional[str] = None) -> None:
         # Convert Pydantic models in results to dicts if necessary (FastAPI/Pydantic usually handles this, but let's be safe)
         # results is likely a dict from AnalysisResult model
+
+        # Replaces results of an earlier detector version/config
+        await self._clear_results(session, file_id)
         
-        result_db = AnalysisResultDB(file_id=file_id, result=results)
+        # Cases go to their own table, the JSON keeps summary and report only
+        result_db = AnalysisResultDB(
+            file_id=file_id,
+            result=self._without_cases(results),
+            cache_key=cache_key,
+            detector_version=detector_config.get("version") if detector_config else None,
+            detector_config=detector_config
+        )
         session.add(result_db)
+        flagged = flagged if flagged is not None else self._flagged_from_dicts(results.get("cases", []))
+        await self._save_cases(session, file_id, flagged)
+        await self._save_rollup(session, file_id, results, flagged)
         await session.commit()
 
-    async def get_results(self, session: AsyncSession, file_id: str) -> Optional[Dict[str, Any]]:
-        statement = select(AnalysisResultDB).where(AnalysisResultDB.file_id == file_id)
-        result = await session.exec(statement)
-        db_result = result.first()
+    async def save_streamed_results(self, session: AsyncSession, file_id: str, batches: AsyncIterable[FlaggedCases], results: Callable[[], Dict[str, Any]], detector_config: Optional[Dict[str, Any]] = None, cache_key: Optional[str] = None) -> int:
+        """
+        Like save_results, for analyses whose cases are too many to hold at once:
+        each batch is stored (and committed) as the detector yields it, and
+        ``results`` builds the result JSON once the batches are exhausted. The
+        result row is written last, so until then the file has no results and
+        its partial cases are never served. Returns the number of cases stored.
+        """
+        await self._clear_results(session, file_id)
+        await session.commit()
+
+        stored, total_risk_score, breakdowns = 0, 0, None
+        try:
+            async for flagged in batches:
+                await self._insert_cases(session, file_id, flagged)
+                await session.commit()
+                stored += len(flagged)
+                total_risk_score += int(flagged.frame["risk_score"].sum())
+                # Per-value totals of the batches so far; a few rows per scheme and state
+                batch_breakdowns = self._breakdowns(flagged)
+                breakdowns = batch_breakdowns if breakdowns is None else pd.concat([breakdowns, batch_breakdowns]).groupby(
+                    ["dimension", "value"], as_index=False
+                ).sum()
+
+            results = results()
+            session.add(AnalysisResultDB(
+                file_id=file_id,
+                result=self._without_cases(results),
+                cache_key=cache_key,
+                detector_version=detector_config.get("version") if detector_config else None,
+                detector_config=detector_config
+            ))
+            await self._write_rollup(session, file_id, results.get("summary", {}), total_risk_score, breakdowns)
+            await session.commit()
+        except Exception:
+            # Don't leave the cases of an analysis that never finished
+            await session.rollback()
+            await self._clear_results(session, file_id)
+            await session.commit()
+            raise
+        return stored
+
+    @staticmethod
+    def _without_cases(results: Dict[str, Any]) -> Dict[str, Any]:
+        return {key: value for key, value in results.items() if key not in ("cases", "next_cursor")}
+
+    @staticmethod
+    def _flagged_from_dicts(cases: List[Dict[str, Any]]) -> FlaggedCases:
+        # Results passed (or stored, before cases had their own table) as FraudCase dicts
+        return FlaggedCases.from_dicts(cases, tuple(FRAUD_REASONS))
+
+    async def _save_cases(self, session: AsyncSession, file_id: str, flagged: FlaggedCases) -> None:
+        """Replaces the case rows of one analysis; committed together with the results."""
+        await session.execute(delete(FraudCaseDB).where(FraudCaseDB.file_id == file_id))
+        await self._insert_cases(session, file_id, flagged)
+
+    async def _insert_cases(self, session: AsyncSession, file_id: str, flagged: FlaggedCases) -> None:
+        # Stored bitmasks are over FRAUD_REASONS (REASON_BITS), whatever rules produced them
+        stored = flagged.recoded(tuple(FRAUD_REASONS))
+        for start in range(0, len(stored), CASE_INSERT_BATCH):
+            rows = stored.records(start, start + CASE_INSERT_BATCH)
+            for row in rows:
+                row["file_id"] = file_id
+            await session.execute(insert(FraudCaseDB), rows)
+
+    @staticmethod
+    def _case_from_row(row: FraudCaseDB) -> Dict[str, Any]:
+        return {
+            "id": str(row.row_id),
+            "beneficiary_name": row.beneficiary_name,
+            "scheme": row.scheme,
+            "amount": row.amount,
+            "risk_score": row.risk_score,
+            "fraud_reasons": list(reasons_for(row.reason_codes)),
+            "state": row.state
+        }
+
+    async def _save_rollup(self, session: AsyncSession, file_id: str, results: Dict[str, Any], flagged: FlaggedCases) -> None:
+        """Replaces the summary rollup of one analysis; committed together with the results."""
+        await self._write_rollup(
+            session, file_id, results.get("summary", {}), int(flagged.frame["risk_score"].sum()), self._breakdowns(flagged)
+        )
+
+    async def _write_rollup(self, session: AsyncSession, file_id: str, summary: Dict[str, Any], total_risk_score: int, breakdowns: Optional[pd.DataFrame]) -> None:
+        await session.merge(AnalysisRollup(
+            file_id=file_id,
+            total_records=summary.get("total_records", 0),
+            flagged_count=summary.get("flagged_count", 0),
+            total_leakage_amount=summary.get("total_leakage_amount", 0.0),
+            total_risk_score=total_risk_score
+        ))
+
+        await session.execute(delete(AnalysisBreakdown).where(AnalysisBreakdown.file_id == file_id))
+        if breakdowns is not None and len(breakdowns):
+            await session.execute(insert(AnalysisBreakdown), [
+                {"file_id": file_id, "dimension": dimension, "value": value, "flagged_count": int(count), "leakage_amount": float(total)}
+                for dimension, value, count, total in zip(breakdowns["dimension"], breakdowns["value"], breakdowns["flagged_count"], breakdowns["leakage_amount"])
+            ])
+
+    @staticmethod
+    def _breakdowns(flagged: FlaggedCases) -> pd.DataFrame:
+        """Flagged cases and leakage per state and per scheme, as AnalysisBreakdown rows."""
+        frame = flagged.frame[["scheme", "state"]].assign(
+            amount=pd.to_numeric(flagged.frame["amount"], errors="coerce").fillna(0.0)
+        )
+        parts = []
+        for dimension in ("state", "scheme"):
+            grouped = frame.groupby(dimension, observed=True)["amount"].agg(["size", "sum"])
+            parts.append(pd.DataFrame({
+                "dimension": dimension,
+                "value": grouped.index.astype(str),
+                "flagged_count": grouped["size"].to_numpy(dtype=np.int64),
+                "leakage_amount": grouped["sum"].to_numpy(dtype=float)
+            }))
+        return pd.concat(parts, ignore_index=True)
+
+    async def backfill_rollups(self, session: AsyncSession) -> int:
+        """Builds rollups for analyses saved before the rollup table existed. Returns how many."""
+        statement = select(AnalysisResultDB).where(
+            AnalysisResultDB.file_id.not_in(select(AnalysisRollup.file_id))
+        )
+        added = set()
+        for db_result in (await session.exec(statement)).all():
+            if db_result.file_id in added:
+                continue
+            await self._save_rollup(session, db_result.file_id, db_result.result, await self.get_flagged(session, db_result.file_id))
+            added.add(db_result.file_id)
+        await session.commit()
+        return len(added)
+
+    async def has_results(self, session: AsyncSession, file_id: str, cache_key: Optional[str] = None) -> bool:
+        """Existence check without loading the stored result JSON; optionally for one detector cache key."""
+        statement = select(AnalysisResultDB.id).where(AnalysisResultDB.file_id == file_id)
+        if cache_key is not None:
+            statement = statement.where(AnalysisResultDB.cache_key == cache_key)
+        return (await session.exec(statement)).first() is not None
+
+    async def get_results(self, session: AsyncSession, file_id: str, include_cases: bool = True) -> Optional[Dict[str, Any]]:
+        """Stored result; with ``include_cases=False`` the ``cases`` list is left out."""
+        db_result = await self._get_result_row(session, file_id)
         
-        if db_result:
+        if db_result is None:
+            return None
+
+        if not include_cases:
+            return self._without_cases(db_result.result)
+        if "cases" in db_result.result:
             return db_result.result
-        return None
+
+        statement = select(FraudCaseDB).where(FraudCaseDB.file_id == file_id).order_by(FraudCaseDB.row_id)
+        cases = [self._case_from_row(row) for row in (await session.exec(statement)).all()]
+        return {**db_result.result, "cases": cases}
+
+    async def _get_result_row(self, session: AsyncSession, file_id: str) -> Optional[AnalysisResultDB]:
+        statement = select(AnalysisResultDB).where(AnalysisResultDB.file_id == file_id)
+        db_result = (await session.exec(statement)).first()
+        if db_result is not None and "cases" in db_result.result:
+            # Saved before cases had their own table: move them over once
+            await self._save_cases(session, file_id, self._flagged_from_dicts(db_result.result["cases"]))
+            db_result.result = self._without_cases(db_result.result)
+            session.add(db_result)
+            await session.commit()
+        return db_result
+
+    async def get_flagged(self, session: AsyncSession, file_id: str) -> FlaggedCases:
+        """All cases of an analysis as columns, in row order, without building a model per case."""
+        await self._get_result_row(session, file_id)
+        columns = [getattr(FraudCaseDB, field) for field in CASE_FIELDS]
+        statement = select(*columns).where(FraudCaseDB.file_id == file_id).order_by(FraudCaseDB.row_id)
+        rows = (await session.exec(statement)).all()
+        frame = pd.DataFrame.from_records(rows, columns=CASE_FIELDS).astype(
+            {"row_id": np.int64, "amount": float, "risk_score": np.int64, "reason_codes": REASON_DTYPE}
+        )
+        return FlaggedCases(frame, tuple(FRAUD_REASONS))
+
+    async def get_cases(self, session: AsyncSession, file_id: str, limit: int, cursor: Optional[Tuple[int, int]] = None, sort: str = "risk", reason: Optional[str] = None, state: Optional[str] = None, scheme: Optional[str] = None) -> Tuple[List[Dict[str, Any]], Optional[Tuple[int, int]]]:
+        """
+        One page of cases, highest risk first (``sort="risk"``) or in row order
+        (``sort="row"``). ``cursor`` is the (risk_score, row_id) of the last case
+        of the previous page; the returned cursor is None on the last page.
+        """
+        await self._get_result_row(session, file_id)
+
+        statement = select(FraudCaseDB).where(FraudCaseDB.file_id == file_id)
+        if reason is not None:
+            statement = statement.where(FraudCaseDB.reason_codes.op("&")(REASON_BITS[reason]) != 0)
+        if state is not None:
+            statement = statement.where(FraudCaseDB.state == state)
+        if scheme is not None:
+            statement = statement.where(FraudCaseDB.scheme == scheme)
+
+        # Keyset pagination: continue after the last case instead of OFFSET
+        if sort == "risk":
+            if cursor is not None:
+                risk_score, row_id = cursor
+                statement = statement.where(
+                    (FraudCaseDB.risk_score < risk_score)
+                    | ((FraudCaseDB.risk_score == risk_score) & (FraudCaseDB.row_id < row_id))
+                )
+            statement = statement.order_by(FraudCaseDB.risk_score.desc(), FraudCaseDB.row_id.desc())
+        else:
+            if cursor is not None:
+                statement = statement.where(FraudCaseDB.row_id > cursor[1])
+            statement = statement.order_by(FraudCaseDB.row_id)
+
+        rows = (await session.exec(statement.limit(limit + 1))).all()
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = (rows[-1].risk_score, rows[-1].row_id)
+        return [self._case_from_row(row) for row in rows], next_cursor
+
+    async def iter_cases(self, session: AsyncSession, file_id: str, batch_size: int = CASE_INSERT_BATCH) -> AsyncIterator[List[Dict[str, Any]]]:
+        """All cases of an analysis in row order, one batch at a time."""
+        await self._get_result_row(session, file_id)
+
+        last_row = None
+        while True:
+            statement = select(FraudCaseDB).where(FraudCaseDB.file_id == file_id)
+            if last_row is not None:
+                statement = statement.where(FraudCaseDB.row_id > last_row)
+            rows = (await session.exec(statement.order_by(FraudCaseDB.row_id).limit(batch_size))).all()
+            if not rows:
+                return
+            last_row = rows[-1].row_id
+            yield [self._case_from_row(row) for row in rows]
+            # Release the batch before fetching the next one
+            session.expunge_all()
+
+    async def update_results(self, session: AsyncSession, file_id: str, results: Dict[str, Any], flagged: Optional[FlaggedCases] = None) -> None:
+        statement = select(AnalysisResultDB).where(AnalysisResultDB.file_id == file_id)
+        db_result = (await session.exec(statement)).first()
+        if db_result is None:
+            await self.save_results(session, file_id, results, flagged=flagged)
+            return
+
+        db_result.result = self._without_cases(results)
+        session.add(db_result)
+        flagged = flagged if flagged is not None else self._flagged_from_dicts(results.get("cases", []))
+        await self._save_cases(session, file_id, flagged)
+        await self._save_rollup(session, file_id, results, flagged)
+        await session.commit()
+
+    async def invalidate_results(self, session: AsyncSession, file_id: str) -> None:
+        # Drop stored results and incremental state so the next /analyze runs in full
+        await self._clear_results(session, file_id)
+        await session.commit()
+
+    async def _clear_results(self, session: AsyncSession, file_id: str) -> None:
+        for model in (AnalysisResultDB, FraudCaseDB, DetectionState, AadhaarCount, AnalysisRollup, AnalysisBreakdown):
+            await session.execute(delete(model).where(model.file_id == file_id))
+
+    async def get_summary_totals(self, session: AsyncSession) -> Dict[str, Any]:
+        """Totals over every analysis, as one aggregate query on the rollup table."""
+        statement = select(
+            func.coalesce(func.sum(AnalysisRollup.total_records), 0),
+            func.coalesce(func.sum(AnalysisRollup.flagged_count), 0),
+            func.coalesce(func.sum(AnalysisRollup.total_leakage_amount), 0.0)
+        )
+        total_records, flagged_count, total_leakage = (await session.exec(statement)).one()
+        return {"total_records": total_records, "flagged_count": flagged_count, "total_leakage": total_leakage}
+
+    async def get_breakdown(self, session: AsyncSession, dimension: str, file_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Flagged cases and leakage per state or scheme across all analyses (or one file's), largest leakage first."""
+        leakage = func.sum(AnalysisBreakdown.leakage_amount)
+        statement = (
+            select(AnalysisBreakdown.value, func.sum(AnalysisBreakdown.flagged_count), leakage)
+            .where(AnalysisBreakdown.dimension == dimension)
+            .group_by(AnalysisBreakdown.value)
+            .order_by(leakage.desc())
+        )
+        if file_id is not None:
+            statement = statement.where(AnalysisBreakdown.file_id == file_id)
+        return [
+            {"value": value, "flagged_count": flagged_count, "leakage_amount": leakage_amount}
+            for value, flagged_count, leakage_amount in (await session.exec(statement)).all()
+        ]
 
     async def get_all_results(self, session: AsyncSession) -> List[Dict[str, Any]]:
         statement = select(AnalysisResultDB)
@@ -0,0 +1,187 @@
+import asyncio
+import functools
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, Optional
+from services.metrics import METRIC_MESSAGE, registry
+
+IS_VERCEL = os.environ.get("VERCEL") == "1"
+
+# "process" runs detection in worker processes (true CPU parallelism),
+# "thread" in a thread pool (serverless platforms cannot fork workers)
+EXECUTOR_KIND = os.environ.get("SUBSIGUARD_EXECUTOR", "thread" if IS_VERCEL else "process")
+MAX_WORKERS = int(os.environ.get("SUBSIGUARD_MAX_WORKERS", os.cpu_count() or 1))
+
+# Set in worker processes by the pool initializer
+_worker_progress_queue = None
+
+def _init_worker(progress_queue) -> None:
+    global _worker_progress_queue
+    _worker_progress_queue = progress_queue
+    # Stage timings observed in the worker are recorded by the API process
+    registry.forward_to(progress_queue)
+
+class ProgressReporter:
+    """
+    Picklable progress callback for a job: ``reporter(stage, percent)``.
+    Inside a worker process it sends the update back through a queue.
+    """
+
+    def __init__(self, job_id: str):
+        self.job_id = job_id
+
+    def __call__(self, stage: str, percent: int) -> None:
+        if _worker_progress_queue is not None:
+            _worker_progress_queue.put((self.job_id, stage, percent))
+        else:
+            detection_executor.record_progress(self.job_id, stage, percent)
+
+class DetectionExecutor:
+    """
+    Runs CPU-bound detection work off the event loop.
+    At most ``max_workers`` jobs run at once; the rest wait in a queue.
+    """
+
+    def __init__(self, kind: str = EXECUTOR_KIND, max_workers: int = MAX_WORKERS):
+        if kind not in ("process", "thread"):
+            raise ValueError(f"Unknown executor kind: {kind}")
+        self.kind = kind
+        self.max_workers = max(1, max_workers)
+        self._pool: Optional[Executor] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._progress_queue = None
+
+        # Latest progress per job id: stage, percent and when each stage started
+        self.progress: Dict[str, Dict[str, Any]] = {}
+
+        # Metrics
+        self.queued = 0
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+
+    def _get_pool(self) -> Executor:
+        # Created on first use so importing the app stays cheap
+        if self._pool is None:
+            if self.kind == "process":
+                # spawn: forking a process that runs an event loop and DB threads is unsafe
+                context = multiprocessing.get_context("spawn")
+                self._progress_queue = context.Queue()
+                threading.Thread(target=self._drain_progress, args=(self._progress_queue,), daemon=True).start()
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=context,
+                    initializer=_init_worker,
+                    initargs=(self._progress_queue,)
+                )
+            else:
+                self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="detection")
+        return self._pool
+
+    async def run(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """Runs ``fn(*args, **kwargs)`` in the pool; arguments must be picklable in process mode."""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_workers)
+
+        self.queued += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.queued -= 1
+
+        self.running += 1
+        try:
+            loop = asyncio.get_running_loop()
+            result = await loop.run_in_executor(self._get_pool(), functools.partial(fn, *args, **kwargs))
+            self.completed += 1
+            return result
+        except BaseException:
+            self.failed += 1
+            raise
+        finally:
+            self.running -= 1
+            self._semaphore.release()
+
+    async def iterate(self, iterator: Iterator[Any]) -> AsyncIterator[Any]:
+        """
+        Steps a CPU-bound iterator off the event loop and yields its items as they
+        are produced, e.g. out-of-core detection, whose cases are stored while it
+        runs. A generator cannot move to a worker process, so it always runs on a
+        thread of this one; it holds one of the ``max_workers`` slots throughout.
+        """
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_workers)
+
+        self.queued += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.queued -= 1
+
+        self.running += 1
+        done = object()
+        try:
+            loop = asyncio.get_running_loop()
+            pool = self._get_pool() if self.kind == "thread" else None
+            while True:
+                item = await loop.run_in_executor(pool, next, iterator, done)
+                if item is done:
+                    break
+                yield item
+            self.completed += 1
+        except BaseException:
+            self.failed += 1
+            raise
+        finally:
+            # Stopped early: let the generator clean up (e.g. its spill directory)
+            close = getattr(iterator, "close", None)
+            if close is not None:
+                close()
+            self.running -= 1
+            self._semaphore.release()
+
+    def reporter(self, job_id: str) -> ProgressReporter:
+        return ProgressReporter(job_id)
+
+    def record_progress(self, job_id: str, stage: str, percent: int) -> None:
+        entry = self.progress.setdefault(job_id, {"stage_starts": {}})
+        entry["stage"] = stage
+        entry["progress"] = percent
+        entry["stage_starts"].setdefault(stage, time.time())
+
+    def pop_progress(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return self.progress.pop(job_id, None)
+
+    def _drain_progress(self, progress_queue) -> None:
+        # Forwards progress and metrics sent by worker processes; None stops the thread
+        while True:
+            item = progress_queue.get()
+            if item is None:
+                return
+            if item[0] == METRIC_MESSAGE:
+                registry.record(*item[1:])
+            else:
+                self.record_progress(*item)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "executor": self.kind,
+            "max_workers": self.max_workers,
+            "running": self.running,
+            "queue_depth": self.queued,
+            "completed": self.completed,
+            "failed": self.failed
+        }
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+        if self._progress_queue is not None:
+            self._progress_queue.put(None)
+            self._progress_queue = None
+
+detection_executor = DetectionExecutor()
@@ -1,95 +1,595 @@
+import numpy as np
 import pandas as pd
-from typing import List, Dict, Any, Tuple
-from models.schemas import FraudRecord, AnalysisResult, FraudCase, AnalysisSummary, AnalysisReportDetails
+import hashlib
+import json
+import os
+from functools import lru_cache
+from typing import TYPE_CHECKING, List, Dict, Any, Tuple, Optional, Callable
+from models.schemas import AnalysisResult, FraudCase, AnalysisSummary, AnalysisReportDetails, DetectionState
+from services.aadhaar_index import aadhaar_keys
+from services.metrics import timed
+from services.robust_stats import RobustBaseline
+from services.rule_engine import RuleContext, RuleEngine, REASON_DTYPE, merge_rule_stats, rule_engine
+
+if TYPE_CHECKING:
+    from services.baseline_model import FittedBaseline
+    from services.ml_engine import IsolationForestEngine, IsolationForestModel
+
+STATISTICAL_ANOMALY = "Statistical Anomaly (High Deviation)"
+
+# Fraud reasons in the order they are reported on a case.
+# Bit i of a row's reason code corresponds to FRAUD_REASONS[i].
+RULE_REASONS = rule_engine.reasons
+FRAUD_REASONS = RULE_REASONS + [STATISTICAL_ANOMALY]
+
+@lru_cache(maxsize=4096)
+def reasons_for(code: int, reasons: Tuple[str, ...] = tuple(FRAUD_REASONS)) -> Tuple[str, ...]:
+    """Reason strings of a reason code, so flagged rows only need a (cached) lookup."""
+    return tuple(reason for bit, reason in enumerate(reasons) if code & (1 << bit))
+
+def _no_progress(stage: str, percent: int) -> None:
+    pass
+
+# Numeric columns scored with Z-scores
+STAT_FEATURES = ['amount', 'income']
+
+# Statistics thresholds (rule thresholds live in the rule definitions)
+Z_SCORE_THRESHOLD = 3
+Z_SCORE_CAP = 5
+ROBUST_Z_THRESHOLD = 3.5
+
+# "global": one mean/std Z-score per feature over the whole dataset.
+# "stratified": robust median/MAD Z-scores per scheme and state, so e.g. PMAY
+# amounts are judged against PMAY claims rather than LPG refills
+STAT_MODES = ("global", "stratified")
+STAT_MODE = os.environ.get("SUBSIGUARD_STAT_MODE", "global")
+
+# Engine of the anomaly stage: "zscore" (above) or "isolation_forest"
+# (scikit-learn, optional; see services/ml_engine.py)
+SCORING_ENGINES = {"zscore": "Rule-based + Statistical Z-score", "isolation_forest": "Rule-based + Isolation Forest"}
+SCORING_ENGINE = os.environ.get("SUBSIGUARD_SCORING_ENGINE", "zscore")
+
+# Bump when detection logic changes in a way the config below does not capture;
+# stored results of another version/config are recomputed
+DETECTOR_VERSION = "5"
+
+def aadhaar_claim_counts(df: pd.DataFrame) -> Dict[str, Tuple[int, int]]:
+    """Aadhaar key -> (claims in ``df``, row label of the first claim)."""
+    if 'aadhaar' not in df.columns:
+        return {}
+    keys = aadhaar_keys(df['aadhaar']).dropna()
+    first_rows = keys.drop_duplicates()
+    counts = keys.value_counts().reindex(first_rows.to_numpy())
+    return dict(zip(first_rows.tolist(), zip(counts.tolist(), first_rows.index.tolist())))
+
+def feature_moments(values: np.ndarray) -> Dict[str, float]:
+    """Count, mean and sum of squared deviations (M2) of one batch of values."""
+    count = len(values)
+    if count == 0:
+        return {"count": 0, "mean": 0.0, "m2": 0.0}
+    mean = float(values.mean())
+    return {"count": count, "mean": mean, "m2": float(((values - mean) ** 2).sum())}
+
+def merge_moments(a: Dict[str, float], b: Dict[str, float]) -> Dict[str, float]:
+    """Combines the moments of two batches (Chan et al. parallel update)."""
+    count = a["count"] + b["count"]
+    if count == 0:
+        return {"count": 0, "mean": 0.0, "m2": 0.0}
+    delta = b["mean"] - a["mean"]
+    return {
+        "count": count,
+        "mean": a["mean"] + delta * b["count"] / count,
+        "m2": a["m2"] + b["m2"] + delta ** 2 * a["count"] * b["count"] / count
+    }
+
+def moments_std(moments: Dict[str, float]) -> float:
+    # Sample standard deviation, like pandas' Series.std()
+    if moments["count"] < 2:
+        return float("nan")
+    return float(np.sqrt(moments["m2"] / (moments["count"] - 1)))
+
+# Moments are computed per block of this many rows and merged in row order.
+# Shards always start on a block boundary, so the merged statistics (and the
+# scores) are bit-for-bit the same however many shards the data is split into.
+STAT_BLOCK_ROWS = 65_536
+
+def block_moments(values: np.ndarray) -> List[Dict[str, float]]:
+    return [feature_moments(values[start:start + STAT_BLOCK_ROWS]) for start in range(0, len(values), STAT_BLOCK_ROWS)]
+
+def combine_moments(blocks: List[Dict[str, float]]) -> Dict[str, float]:
+    combined = feature_moments(np.empty(0))
+    for block in blocks:
+        combined = merge_moments(combined, block)
+    return combined
+
+def shard_bounds(total_rows: int, max_shards: int) -> List[Tuple[int, int]]:
+    """Splits rows into at most ``max_shards`` ranges that start on block boundaries."""
+    blocks = max(1, -(-total_rows // STAT_BLOCK_ROWS))
+    blocks_per_shard = -(-blocks // max(1, max_shards))
+    shard_rows = blocks_per_shard * STAT_BLOCK_ROWS
+    return [(start, min(start + shard_rows, total_rows)) for start in range(0, max(total_rows, 1), shard_rows)]
+
+# Columns carried from scored shards into the final cases and summary
+CASE_COLUMNS = ['name', 'subsidy_type', 'amount', 'state']
+
+# FlaggedCases columns, named as in FraudCaseDB
+CASE_FIELDS = ['row_id', 'beneficiary_name', 'scheme', 'state', 'amount', 'risk_score', 'reason_codes']
+
+class FlaggedCases:
+    """
+    The flagged rows of an analysis, column by column: row positions, the few
+    row fields a case shows, risk scores and a reason bitmask per case (bit i =
+    ``reasons[i]``). FraudCase models are only built for the cases actually
+    serialized (``cases``); storage writes its rows straight from the columns.
+    """
+
+    def __init__(self, frame: pd.DataFrame, reasons: Tuple[str, ...]):
+        self.frame = frame
+        self.reasons = reasons
+
+    @classmethod
+    def from_rows(cls, flagged_rows: pd.DataFrame, reason_codes: np.ndarray, risk_scores: np.ndarray, reasons: Tuple[str, ...]) -> "FlaggedCases":
+        def column(name: str, default: Any) -> Any:
+            return flagged_rows[name].array if name in flagged_rows.columns else np.full(len(flagged_rows), default, dtype=object)
+
+        return cls(pd.DataFrame({
+            "row_id": np.asarray(flagged_rows.index, dtype=np.int64),
+            "beneficiary_name": column('name', 'Unknown'),
+            "scheme": column('subsidy_type', 'Unknown'),
+            "state": column('state', None),
+            "amount": column('amount', 0.0),
+            "risk_score": np.asarray(risk_scores, dtype=np.int64),
+            "reason_codes": np.asarray(reason_codes, dtype=REASON_DTYPE)
+        }), reasons)
+
+    @classmethod
+    def from_dicts(cls, cases: List[Dict[str, Any]], reasons: Tuple[str, ...]) -> "FlaggedCases":
+        """Cases serialized as FraudCase dicts (results stored before cases had their own table)."""
+        bits = {reason: 1 << bit for bit, reason in enumerate(reasons)}
+        return cls(pd.DataFrame({
+            "row_id": np.array([int(case["id"]) for case in cases], dtype=np.int64),
+            "beneficiary_name": [case["beneficiary_name"] for case in cases],
+            "scheme": [case["scheme"] for case in cases],
+            "state": [case.get("state") for case in cases],
+            "amount": [case["amount"] for case in cases],
+            "risk_score": np.array([case["risk_score"] for case in cases], dtype=np.int64),
+            "reason_codes": np.array([sum(bits.get(reason, 0) for reason in case["fraud_reasons"]) for case in cases], dtype=REASON_DTYPE)
+        }), reasons)
+
+    @classmethod
+    def concat(cls, parts: List["FlaggedCases"]) -> "FlaggedCases":
+        """Cases of several parts, in part order, with reason codes of the first part's reasons."""
+        reasons = parts[0].reasons
+        frames = [part.frame if part.reasons == reasons else part.recoded(reasons).frame for part in parts]
+        return cls(pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0], reasons)
+
+    def __len__(self) -> int:
+        return len(self.frame)
+
+    def take(self, mask: np.ndarray) -> "FlaggedCases":
+        return FlaggedCases(self.frame[mask].reset_index(drop=True), self.reasons)
+
+    def sorted_by_row(self) -> "FlaggedCases":
+        return FlaggedCases(self.frame.sort_values("row_id", kind="stable", ignore_index=True), self.reasons)
+
+    def codes_for(self, reasons: Tuple[str, ...]) -> np.ndarray:
+        """Reason codes re-expressed over another reason list (unknown reasons are dropped)."""
+        codes = self.frame["reason_codes"].to_numpy(dtype=REASON_DTYPE)
+        if reasons[:len(self.reasons)] == self.reasons:
+            return codes
+        recoded = np.zeros(len(codes), dtype=REASON_DTYPE)
+        for bit, reason in enumerate(self.reasons):
+            if reason in reasons:
+                recoded[(codes >> REASON_DTYPE(bit)) & REASON_DTYPE(1) == 1] |= REASON_DTYPE(1 << reasons.index(reason))
+        return recoded
+
+    def recoded(self, reasons: Tuple[str, ...]) -> "FlaggedCases":
+        return FlaggedCases(self.frame.assign(reason_codes=self.codes_for(reasons)), reasons)
+
+    def records(self, start: int = 0, stop: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Plain dicts (FraudCaseDB fields) of cases ``start:stop``."""
+        page = self.frame.iloc[start:stop]
+        states = page["state"]
+        columns = {field: page[field].tolist() for field in CASE_FIELDS if field != "state"}
+        columns["state"] = states.astype(str).where(states.notna(), None).tolist()
+        return [dict(zip(CASE_FIELDS, values)) for values in zip(*(columns[field] for field in CASE_FIELDS))]
+
+    def cases(self, start: int = 0, stop: Optional[int] = None) -> List[FraudCase]:
+        """FraudCase models of cases ``start:stop`` only."""
+        return [
+            FraudCase(
+                id=str(record["row_id"]),
+                beneficiary_name=record["beneficiary_name"],
+                scheme=record["scheme"],
+                amount=record["amount"],
+                risk_score=record["risk_score"],
+                fraud_reasons=list(reasons_for(record["reason_codes"], self.reasons)),
+                state=record["state"]
+            )
+            for record in self.records(start, stop)
+        ]
 
 class FraudDetector:
-    def __init__(self, contamination: float = 0.08):
+    def __init__(self, contamination: float = 0.08, rules: Optional[RuleEngine] = None, stat_mode: str = STAT_MODE, baseline: Optional["FittedBaseline"] = None, engine: str = SCORING_ENGINE):
+        if stat_mode not in STAT_MODES:
+            raise ValueError(f"Unknown statistics mode {stat_mode!r}, expected one of {STAT_MODES}")
+        if engine not in SCORING_ENGINES:
+            raise ValueError(f"Unknown scoring engine {engine!r}, expected one of {tuple(SCORING_ENGINES)}")
+        # Expected share of anomalies (isolation_forest engine)
         self.contamination = contamination
-        # No heavy ML model needed for Z-Score analysis
+        self.engine = engine
+        # The ML engine is only created (and scikit-learn imported) when first used
+        self._ml_engine: Optional["IsolationForestEngine"] = None
+        self.rules = rules or rule_engine
+        self.stat_mode = stat_mode
+        # Fitted reference statistics; without one every batch is its own baseline
+        self.baseline = baseline
+        self.fraud_reasons = tuple(self.rules.reasons + [STATISTICAL_ANOMALY])
 
-    def detect_fraud(self, file_id: str, df: pd.DataFrame) -> AnalysisResult:
-        # 1. Rule-Based Detection
-        rule_flags = self._apply_rules(df)
-        
-        # 2. Statistical Detection (Z-Score)
-        # Replaces heavy ML model with lightweight stats
-        stat_flags, scores = self._apply_statistical_analysis(df)
-        
-        # 3. Combine Results
-        results = []
-        flagged_count = 0
-        
-        for idx, row in df.iterrows():
-            reasons = rule_flags.get(idx, [])
-            is_stat_fraud = stat_flags[idx] == 1 
-            
-            if is_stat_fraud:
-                reasons.append("Statistical Anomaly (High Deviation)")
-            
-            is_fraud = len(reasons) > 0
-            if is_fraud:
-                flagged_count += 1
-            
-            # Use the statistical score as the fraud score (clamped 0-1)
-            normalized_score = scores[idx]
-            normalized_score = max(0.0, min(1.0, normalized_score))
-
-            if is_fraud:
-                 results.append(FraudRecord(
-                    record_id=idx,
-                    data=row.to_dict(),
-                    fraud_score=normalized_score,
-                    is_fraud=True,
-                    reasons=reasons
-                ))
-
-        leakage_percent = (flagged_count / len(df)) * 100 if len(df) > 0 else 0
-        
-        # Prepare FraudCase objects
-        fraud_cases = []
-        total_leakage_amount = 0.0
-        total_risk_score = 0
-        
-        for record in results:
-            fraud_cases.append(FraudCase(
-                id=str(record.record_id),
-                beneficiary_name=record.data.get('name', 'Unknown'),
-                scheme=record.data.get('subsidy_type', 'Unknown'),
-                amount=record.data.get('amount', 0.0),
-                risk_score=int(record.fraud_score * 100),
-                fraud_reasons=record.reasons
-            ))
-            total_leakage_amount += record.data.get('amount', 0.0)
-            total_risk_score += int(record.fraud_score * 100)
+    def config(self) -> Dict[str, Any]:
+        """Everything that changes the output of detection, for result caching."""
+        return {
+            "version": DETECTOR_VERSION,
+            "contamination": self.contamination,
+            "reasons": list(self.fraud_reasons),
+            "rules": self.rules.definitions,
+            "stat_features": STAT_FEATURES,
+            "z_score_threshold": Z_SCORE_THRESHOLD,
+            "z_score_cap": Z_SCORE_CAP,
+            "stat_mode": self.stat_mode,
+            "robust_z_threshold": ROBUST_Z_THRESHOLD,
+            "baseline": self.baseline.version if self.baseline is not None else None,
+            "engine": self.engine,
+            "ml": self.ml_engine.config() if self.engine == "isolation_forest" else None
+        }
+
+    @property
+    def ml_engine(self) -> "IsolationForestEngine":
+        if self._ml_engine is None:
+            from services.ml_engine import IsolationForestEngine
+            self._ml_engine = IsolationForestEngine(self.contamination)
+        return self._ml_engine
+
+    def fit_model(self, df: pd.DataFrame, file_id: Optional[str] = None) -> Optional["IsolationForestModel"]:
+        """Isolation Forest of the whole dataset (isolation_forest engine only), cached per file and row count."""
+        if self.engine != "isolation_forest":
+            return None
+        return self.ml_engine.model_for(df, self._model_key(file_id, len(df)) if file_id else None)
+
+    @staticmethod
+    def _model_key(file_id: str, rows: int) -> str:
+        return f"{file_id}:{rows}"
+
+    def cache_key(self) -> str:
+        return hashlib.sha256(json.dumps(self.config(), sort_keys=True).encode()).hexdigest()
+
+    def detect_fraud(self, file_id: str, df: pd.DataFrame, progress: Optional[Callable[[str, int], None]] = None, cross_file_aadhaar: Optional[np.ndarray] = None) -> AnalysisResult:
+        """
+        ``progress(stage, percent)`` is called as the rules, stats and aggregation stages start.
+        ``cross_file_aadhaar`` holds the sorted Aadhaar keys that also claim in other uploads.
+        """
+        progress = progress or _no_progress
+
+        # Same two passes as sharded detection, over a single shard:
+        # 1. Dataset-wide aggregates (rule aggregates such as Aadhaar counts, feature moments)
+        aggregates = self.merge_partials([self.compute_partials(df)], cross_file_aadhaar)
+        aggregates["baseline"] = self.robust_baseline(df)
+        aggregates["model"] = self.fit_model(df, file_id)
+
+        # 2. Rule-Based + Statistical Detection, combined into a reason bitmask per row
+        scored = self.score_shard(df, aggregates, progress=progress)
+
+        progress("aggregation", 60)
+        return self.combine_shards(file_id, len(df), [scored])
+
+    def robust_baseline(self, df: pd.DataFrame) -> Optional[RobustBaseline]:
+        """Per-stratum medians/MADs of the whole dataset (stratified mode only; not mergeable across shards)."""
+        if self.stat_mode != "stratified":
+            return None
+        if self.baseline is not None:
+            return self.baseline.robust
+        return RobustBaseline.from_frame(df, STAT_FEATURES)
+
+    def compute_partials(self, df: pd.DataFrame) -> Dict[str, Any]:
+        """Pass 1 of (sharded) detection: mergeable aggregates of one shard."""
+        return {
+            "rules": self.rules.partials(df),
+            # A fitted baseline replaces the dataset's own moments
+            "moments": self._block_moments(df) if self.baseline is None else {}
+        }
+
+    @staticmethod
+    def _block_moments(df: pd.DataFrame) -> Dict[str, List[Dict[str, float]]]:
+        moments = {}
+        for feature in STAT_FEATURES:
+            if feature in df.columns:
+                values = pd.to_numeric(df[feature], errors='coerce').fillna(0).to_numpy(dtype=float)
+                moments[feature] = block_moments(values)
+        return moments
+
+    def merge_partials(self, partials: List[Dict[str, Any]], cross_file_aadhaar: Optional[np.ndarray] = None) -> Dict[str, Any]:
+        """Reduces per-shard aggregates (in shard order) to the dataset-wide values scoring needs."""
+        feature_stats = {}
+        for feature in STAT_FEATURES:
+            if any(feature in partial["moments"] for partial in partials):
+                moments = combine_moments([block for partial in partials for block in partial["moments"].get(feature, [])])
+                feature_stats[feature] = (moments["mean"], moments_std(moments))
+
+        return {
+            "rules": self.with_reference_duplicates(self.rules.merge([partial["rules"] for partial in partials])),
+            "cross_file_aadhaar": cross_file_aadhaar,
+            "feature_stats": feature_stats
+        }
+
+    def with_reference_duplicates(self, rule_aggregates: Dict[str, Any]) -> Dict[str, Any]:
+        """Aadhaar numbers already duplicated in the fitted reference stay duplicates in every batch."""
+        if self.baseline is None or len(self.baseline.duplicate_aadhaar) == 0:
+            return rule_aggregates
+        merged = dict(rule_aggregates)
+        for rule in self.rules.rules:
+            if rule.kind == "duplicate" and rule.column == 'aadhaar' and merged.get(rule.name) is not None:
+                merged[rule.name] = np.union1d(merged[rule.name], self.baseline.duplicate_aadhaar)
+        return merged
+
+    def score_shard(self, df: pd.DataFrame, aggregates: Dict[str, Any], progress: Optional[Callable[[str, int], None]] = None) -> Dict[str, Any]:
+        """Pass 2: scores one shard against dataset-wide aggregates and keeps only its flagged rows."""
+        reason_codes, scores, rule_stats = self._score_rows(
+            df,
+            rule_aggregates=aggregates["rules"],
+            cross_file_aadhaar=aggregates.get("cross_file_aadhaar"),
+            feature_stats=aggregates["feature_stats"],
+            baseline=aggregates.get("baseline"),
+            model=aggregates.get("model"),
+            progress=progress
+        )
+        flagged = np.flatnonzero(reason_codes)
+        return {
+            "rows": df.iloc[flagged][[column for column in CASE_COLUMNS if column in df.columns]],
+            "reason_codes": reason_codes[flagged],
+            "scores": scores[flagged],
+            "rule_stats": rule_stats
+        }
+
+    def combine_shards(self, file_id: str, total_records: int, scored: List[Dict[str, Any]]) -> AnalysisResult:
+        """Builds the result from scored shards, in shard order."""
+        flagged_rows = pd.concat([shard["rows"] for shard in scored]) if len(scored) > 1 else scored[0]["rows"]
+        reason_codes = np.concatenate([shard["reason_codes"] for shard in scored])
+        scores = np.concatenate([shard["scores"] for shard in scored])
+        flagged_count = len(flagged_rows)
+
+        # Cases stay columnar; FraudCase objects are only built for the page being served
+        risk_scores = self._risk_scores(scores)
+        with timed("detect.build_cases"):
+            flagged = FlaggedCases.from_rows(flagged_rows, reason_codes, risk_scores, self.fraud_reasons)
+
+        total_leakage_amount = self._running_total(flagged_rows['amount'].to_numpy()) if 'amount' in flagged_rows.columns else 0.0
+        total_risk_score = int(risk_scores.sum())
 
         average_risk_score = int(total_risk_score / flagged_count) if flagged_count > 0 else 0
         
         # Identify top risk state
         top_risk_state = "N/A"
-        if flagged_count > 0:
-            flagged_df = pd.DataFrame([r.data for r in results])
-            if 'state' in flagged_df.columns:
-                 top_risk_state = flagged_df['state'].value_counts().idxmax()
+        if flagged_count > 0 and 'state' in flagged_rows.columns:
+            top_risk_state = flagged_rows['state'].value_counts().idxmax()
 
         return AnalysisResult(
             file_id=file_id,
             summary=AnalysisSummary(
                 total_leakage_amount=round(total_leakage_amount, 2),
                 flagged_count=flagged_count,
-                total_records=len(df),
+                total_records=total_records,
                 average_risk_score=average_risk_score,
                 top_risk_state=top_risk_state
             ),
-            cases=fraud_cases,
-            report_details=self._generate_report_details(flagged_count, len(df), total_leakage_amount, top_risk_state)
+            cases=[],
+            flagged=flagged,
+            report_details=self._generate_report_details(flagged_count, total_records, total_leakage_amount, top_risk_state),
+            rule_stats=merge_rule_stats([shard["rule_stats"] for shard in scored])
         )
 
+    def build_state(self, df: pd.DataFrame, result: AnalysisResult) -> Tuple[DetectionState, Dict[str, Tuple[int, int]]]:
+        """
+        Running state for incremental analysis of a dataset already scored by detect_fraud.
+        Returns the state plus Aadhaar key -> (claim count, first row) for every key.
+        """
+        state = DetectionState(file_id=result.file_id, total_records=len(df), model_rows=len(df))
+
+        state.moments = {
+            feature: combine_moments(blocks) for feature, blocks in self._block_moments(df).items()
+        }
+        baseline = self.robust_baseline(df)
+        state.robust_baseline = baseline.to_dict() if baseline is not None else {}
+        group_partials = self.rules.partials(df, self.rules.group_rules)
+        state.group_partials = {
+            rule.name: rule.partial_to_dict(group_partials.get(rule.name)) for rule in self.rules.group_rules
+        }
+
+        # Exact running totals behind the (rounded) summary
+        cases = result.flagged.frame
+        state.flagged_count = len(cases)
+        state.total_leakage_amount = self._running_total(cases['amount'].to_numpy(dtype=float))
+        state.total_risk_score = int(cases['risk_score'].sum())
+        flagged_states = {}
+        if 'state' in df.columns and len(cases):
+            positions = cases['row_id'].to_numpy()
+            flagged_states = {
+                str(state_name): int(count)
+                for state_name, count in df['state'].iloc[positions].value_counts().items()
+                if count # Categorical columns also list states without cases
+            }
+        state.flagged_state_counts = flagged_states
+
+        return state, aadhaar_claim_counts(df)
+
+    def fold_group_rows(self, state: DetectionState, new_rows: pd.DataFrame, earlier: Optional[pd.DataFrame] = None) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """
+        Adds appended rows to the per-group aggregates of the group rules kept in
+        ``state``. Returns each group rule's flagged groups over the whole dataset,
+        for detect_delta, and the groups whose flag changed either way: earlier rows
+        in those groups must be rescored. A burst changes its peers' baseline, so
+        groups without new rows can change too. ``earlier`` (the group columns of
+        the rows already in ``state``) is only read for rules the state has no
+        aggregates of, e.g. states saved before they were kept.
+        """
+        stored = dict(state.group_partials or {})
+        aggregates, changed = {}, {}
+        for rule in self.rules.group_rules:
+            if rule.name in stored:
+                previous = rule.partial_from_dict(stored[rule.name])
+            else:
+                previous = self.rules.partials(earlier, [rule]).get(rule.name) if earlier is not None else None
+            combined = rule.combine([previous, self.rules.partials(new_rows, [rule]).get(rule.name)])
+            stored[rule.name] = rule.partial_to_dict(combined)
+
+            flagged = rule.finalize(combined)
+            if flagged is None:
+                continue # Columns missing: the rule never matches
+            before = rule.finalize(previous)
+            aggregates[rule.name] = flagged
+            changed[rule.name] = flagged if before is None else flagged.symmetric_difference(before)
+        state.group_partials = stored
+        return aggregates, changed
+
+    def detect_delta(self, result: AnalysisResult, state: DetectionState, rows: pd.DataFrame, aadhaar_counts: Dict[str, int], cross_file_aadhaar: Optional[np.ndarray] = None, rule_aggregates: Optional[Dict[str, Any]] = None) -> AnalysisResult:
+        """
+        Extends ``result`` with newly appended rows without rescoring the whole dataset.
+
+        ``rows`` holds the appended rows plus any earlier rows whose Aadhaar only now
+        became a duplicate or whose group's flag changed (see fold_group_rows),
+        indexed by row position; earlier rows are rescored and their cases replaced.
+        ``aadhaar_counts`` must contain the dataset-wide claim count of every Aadhaar
+        in ``rows``, ``rule_aggregates`` the group rules' flagged groups from
+        fold_group_rows. Earlier rows keep the Z-score they were given, only new rows
+        see the updated statistics: an earlier case's risk score differs from a full
+        re-run's by at most 100 * max over STAT_FEATURES of
+        (|std drift| + |mean drift| / Z_SCORE_CAP) / std, plus 1 for rounding, where
+        std is the current standard deviation and the drift is since the row was
+        scored. In stratified mode rows are scored against the robust baseline of
+        the full analysis, which is not updated.
+        ``cross_file_aadhaar`` is as for detect_fraud.
+        """
+        previous_total = state.total_records
+        new_rows = rows[rows.index >= previous_total]
+
+        # Fold the delta into the running mean/variance first, new rows are scored against it
+        moments = dict(state.moments)
+        for feature in STAT_FEATURES:
+            if feature in new_rows.columns:
+                values = pd.to_numeric(new_rows[feature], errors='coerce').fillna(0).to_numpy(dtype=float)
+                previous = moments.get(feature, feature_moments(np.empty(0)))
+                moments[feature] = merge_moments(previous, feature_moments(values))
+        state.moments = moments
+        state.total_records += len(new_rows)
+
+        feature_stats = {feature: (m["mean"], moments_std(m)) for feature, m in moments.items()}
+        baseline = RobustBaseline.from_dict(state.robust_baseline) if state.robust_baseline else None
+        # The forest trained by the full analysis, if still cached
+        model = self.ml_engine.cached(self._model_key(result.file_id, state.model_rows)) if self.engine == "isolation_forest" else None
+        reason_codes, scores, rule_stats = self._score_rows(rows, aadhaar_counts=aadhaar_counts, feature_stats=feature_stats, rule_aggregates=rule_aggregates, cross_file_aadhaar=cross_file_aadhaar, baseline=baseline, model=model)
+
+        flagged = np.flatnonzero(reason_codes)
+        flagged_rows = rows.iloc[flagged]
+        risk_scores = self._risk_scores(scores[flagged])
+        with timed("detect.build_cases"):
+            new_cases = FlaggedCases.from_rows(flagged_rows, reason_codes[flagged], risk_scores, self.fraud_reasons)
+
+        row_states = rows['state'] if 'state' in rows.columns else pd.Series(None, index=rows.index, dtype=object)
+        flagged_states = dict(state.flagged_state_counts)
+
+        # Earlier rows being rescored give up their old case first
+        old_cases = result.flagged
+        rescored = old_cases.frame['row_id'].isin(rows.index[rows.index < previous_total]).to_numpy()
+        removed = old_cases.frame[rescored]
+        for position, amount, risk_score in zip(removed['row_id'].tolist(), removed['amount'].tolist(), removed['risk_score'].tolist()):
+            state.flagged_count -= 1
+            state.total_leakage_amount -= amount
+            state.total_risk_score -= risk_score
+            self._count_state(flagged_states, row_states[position], -1)
+
+        added = new_cases.frame
+        for position, amount, risk_score in zip(added['row_id'].tolist(), added['amount'].tolist(), added['risk_score'].tolist()):
+            state.flagged_count += 1
+            state.total_leakage_amount += amount
+            state.total_risk_score += risk_score
+            self._count_state(flagged_states, row_states[position], 1)
+        state.flagged_state_counts = flagged_states
+
+        # Rescored rows' earlier rule hits are replaced by their new ones, not added to them
+        replaced_codes = old_cases.codes_for(self.fraud_reasons)[rescored]
+        replaced_stats = {
+            rule.name: {"hits": -int(np.count_nonzero(replaced_codes & REASON_DTYPE(1 << bit))), "seconds": 0.0}
+            for bit, rule in enumerate(self.rules.rules)
+        }
+
+        top_risk_state = max(flagged_states, key=flagged_states.get) if flagged_states else "N/A"
+        average_risk_score = int(state.total_risk_score / state.flagged_count) if state.flagged_count > 0 else 0
+
+        return AnalysisResult(
+            file_id=result.file_id,
+            summary=AnalysisSummary(
+                total_leakage_amount=round(state.total_leakage_amount, 2),
+                flagged_count=state.flagged_count,
+                total_records=state.total_records,
+                average_risk_score=average_risk_score,
+                top_risk_state=top_risk_state
+            ),
+            cases=[],
+            flagged=FlaggedCases.concat([old_cases.take(~rescored), new_cases]).sorted_by_row(),
+            report_details=self._generate_report_details(state.flagged_count, state.total_records, state.total_leakage_amount, top_risk_state),
+            rule_stats=merge_rule_stats([result.rule_stats or {}, replaced_stats, rule_stats])
+        )
+
+    @staticmethod
+    def _count_state(counts: Dict[str, int], state_name: Any, change: int) -> None:
+        if pd.isna(state_name):
+            return
+        key = str(state_name)
+        counts[key] = counts.get(key, 0) + change
+        if counts[key] <= 0:
+            del counts[key]
+
+    def _score_rows(self, df: pd.DataFrame, aadhaar_counts: Optional[Dict[str, int]] = None, feature_stats: Optional[Dict[str, Tuple[float, float]]] = None, progress: Optional[Callable[[str, int], None]] = None, rule_aggregates: Optional[Dict[str, Any]] = None, cross_file_aadhaar: Optional[np.ndarray] = None, baseline: Optional[RobustBaseline] = None, model: Optional["IsolationForestModel"] = None) -> Tuple[np.ndarray, np.ndarray, Dict[str, Dict[str, float]]]:
+        progress = progress or _no_progress
+
+        # Rule-Based Detection: all compiled rules in one pass, one bit per rule.
+        # Dataset-wide aggregates (sharded/streamed detection) or running counts
+        # (incremental analysis) are used when supplied, else the frame's own.
+        progress("rules", 10)
+        with timed("detect.rules"):
+            reason_codes, rule_stats = self.rules.evaluate(df, RuleContext(rule_aggregates, aadhaar_counts, cross_file_aadhaar))
+        
+        # Statistical Detection (Z-Score)
+        # Replaces heavy ML model with lightweight stats
+        progress("stats", 40)
+        with timed("detect.stats"):
+            stat_flags, scores = self._apply_statistical_analysis(df, feature_stats, baseline, model)
+        
+        # The statistical flag takes the bit after the rules
+        reason_codes |= stat_flags.astype(REASON_DTYPE) << REASON_DTYPE(len(self.rules.rules))
+
+        return reason_codes, scores, rule_stats
+
+    @staticmethod
+    def _risk_scores(scores: np.ndarray) -> np.ndarray:
+        # Use the statistical score as the fraud score (clamped 0-1)
+        return (np.clip(scores, 0.0, 1.0) * 100).astype(np.int64)
+
+    @staticmethod
+    def _running_total(values: np.ndarray) -> float:
+        # cumsum adds left to right like a plain running sum, unlike the pairwise
+        # summation in np.sum, so the total stays identical to the per-row loop
+        if len(values) == 0:
+            return 0.0
+        if values.dtype.kind in 'biuf':
+            return float(np.cumsum(values.astype(np.float64))[-1])
+        return sum(values, 0.0)
+
     def _generate_report_details(self, flagged_count: int, total_records: int, leakage_amount: float, top_state: str) -> AnalysisReportDetails:
         leakage_cr = round(leakage_amount / 10000000, 2)
         percentage = round((flagged_count / total_records * 100), 1) if total_records > 0 else 0
         
         return AnalysisReportDetails(
-            executive_summary=f"The automated audit of the provided beneficiary dataset reveals significant anomalies indicating potential systemic fraud. The hybrid detection engine (Rule-based + Isolation Forest) has flagged {percentage}% of the total records as 'High Risk'. The primary drivers of these anomalies appear to be duplicate identity registrations across multiple schemes and income threshold violations. Immediate corrective action is advised to prevent estimated leakage of ₹{leakage_cr} Cr.",
+            executive_summary=f"The automated audit of the provided beneficiary dataset reveals significant anomalies indicating potential systemic fraud. The hybrid detection engine ({SCORING_ENGINES[self.engine]}) has flagged {percentage}% of the total records as 'High Risk'. The primary drivers of these anomalies appear to be duplicate identity registrations across multiple schemes and income threshold violations. Immediate corrective action is advised to prevent estimated leakage of ₹{leakage_cr} Cr.",
             key_findings=[
                 f"{flagged_count} beneficiaries flagged with Risk Score > 80, indicating near-certain fraud.",
                 f"Cluster analysis detected distinct groups of 'Ghost Beneficiaries' sharing identical bank account details.",
@@ -105,84 +605,66 @@ class FraudDetector:
             conclusion=f"The dataset exhibits a high probability of organized leakage. While the majority of records ({(100-percentage):.1f}%) appear compliant, the concentrated nature of the flagged cases suggests a coordinated attempt to siphon funds. Implementing the recommended freeze and re-verification protocols could save the exchequer approximately ₹{leakage_cr} Cr in this cycle alone."
         )
 
-    def _apply_rules(self, df: pd.DataFrame) -> Dict[int, List[str]]:
-        flags = {}
-        
-        # Pre-calculate implementation for speed
-        if 'aadhaar' in df.columns:
-            aadhaar_counts = df['aadhaar'].value_counts()
-        else:
-            aadhaar_counts = {}
-        
-        for idx, row in df.iterrows():
-            reasons = []
-            
-            # Rule 1: Duplicate Aadhaar
-            if 'aadhaar' in row and aadhaar_counts.get(row['aadhaar'], 0) > 1:
-                reasons.append("Duplicate Aadhaar Number")
-            
-            # Rule 2: High Income Threshold
-            try:
-                income = float(row.get('income', 0))
-                if income > 250000:
-                    reasons.append("Income exceeds threshold (₹2.5L)")
-            except ValueError:
-                pass
-            
-            # Rule 3: High Claim Amount (Simple threshold for MVP)
-            try:
-                 amount = float(row.get('amount', 0))
-                 if amount > 50000: # Arbitrary high amount for MVP
-                      reasons.append("Unusually high claim amount (>₹50k)")
-            except ValueError:
-                 pass
-
-            if reasons:
-                flags[idx] = reasons
-                
-        return flags
-
-    def _apply_statistical_analysis(self, df: pd.DataFrame) -> Tuple[Any, Any]:
+    def _apply_statistical_analysis(self, df: pd.DataFrame, feature_stats: Optional[Dict[str, Tuple[float, float]]] = None, baseline: Optional[RobustBaseline] = None, model: Optional["IsolationForestModel"] = None) -> Tuple[np.ndarray, np.ndarray]:
         """
         Calculates Z-scores for numerical columns to find statistical outliers.
         This replaces the heavy ML model for Vercel optimization.
+        ``feature_stats`` (feature -> (mean, std)) overrides the frame's own statistics,
+        and a fitted baseline overrides both (per-row values of the row's scheme).
+        In stratified mode rows are scored by robust (median/MAD) Z-scores within
+        their scheme and state, against ``baseline`` or else the frame's own.
+        The isolation_forest engine scores with ``model`` (or one fitted on the frame).
+        Returns outlier flags and a 0-1 score per row.
         """
-        features = ['amount', 'income']
-        # Initialize flags (0 = normal, 1 = anomaly/fraud)
-        flags = pd.Series(0, index=df.index)
-        # Initialize scores (0.0 to 1.0)
-        scores = pd.Series(0.0, index=df.index)
+        if self.engine == "isolation_forest":
+            return self.ml_engine.score(df, model or self.fit_model(df))
+        if self.stat_mode == "stratified":
+            baseline = baseline or self.robust_baseline(df)
+            return baseline.score(df, ROBUST_Z_THRESHOLD, Z_SCORE_CAP)
+        if self.baseline is not None:
+            feature_stats = self.baseline.feature_stats_for(df)
+
+        # Initialize flags (False = normal, True = anomaly/fraud)
+        flags = np.zeros(len(df), dtype=bool)
+        # One column of 0-1 scores per feature, filled in place
+        feature_scores = np.zeros((len(df), len(STAT_FEATURES)))
         
         # Ensure we have data
         if df.empty:
-            return flags, scores
+            return flags, feature_scores.max(axis=1, initial=0.0)
 
-        for feature in features:
+        for column, feature in enumerate(STAT_FEATURES):
             if feature not in df.columns:
                 continue
                 
             # Convert to numeric, handle errors
-            series = pd.to_numeric(df[feature], errors='coerce').fillna(0)
+            values = pd.to_numeric(df[feature], errors='coerce').fillna(0).to_numpy(dtype=float)
             
             # Calculate Z-Score: (Value - Mean) / StdDev
-            mean = series.mean()
-            std = series.std()
+            if feature_stats is None:
+                moments = combine_moments(block_moments(values))
+                mean = moments["mean"]
+                std = moments_std(moments)
+            elif feature in feature_stats:
+                mean, std = feature_stats[feature]
+            else:
+                continue
             
-            if std == 0:
+            # Scalars, or one value per row (per-scheme baseline)
+            std = np.asarray(std, dtype=float)
+            spread = std > 0 # False for 0 and NaN
+            if not spread.any():
                 continue
                 
-            z_scores = (series - mean) / std
+            z_scores = np.zeros(len(values))
+            np.divide(np.abs(values - mean), std, out=z_scores, where=spread)
             
             # Flag anything > 3 standard deviations as anomaly
-            # Using bitwise OR to combine flags from multiple features
-            is_outlier = z_scores.abs() > 3
-            flags = flags | is_outlier.astype(int)
+            flags |= z_scores > Z_SCORE_THRESHOLD
             
             # Normalize Z-score to 0-1 specific risk contribution
             # Cap Z-score at 5 for normalization purposes
-            risk_contribution = (z_scores.abs() / 5).clip(0, 1)
-            
-            # Take the max risk score across features
-            scores = pd.concat([scores, risk_contribution], axis=1).max(axis=1)
+            np.clip(z_scores / Z_SCORE_CAP, 0, 1, out=feature_scores[:, column])
 
-        return flags, scores
+        # Take the max risk score across features
+        return flags, feature_scores.max(axis=1)
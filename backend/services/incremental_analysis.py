@@ -0,0 +1,109 @@
+from sqlmodel.ext.asyncio.session import AsyncSession
+from starlette.concurrency import run_in_threadpool
+from models.schemas import AnalysisResult, DetectionState
+from services.aadhaar_index import aadhaar_index_store
+from services.data_storage import data_storage
+from services.executor import detection_executor
+from services.fraud_detection import FraudDetector, aadhaar_claim_counts
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+
+# Functions below run in the detection pool: a worker process updates its own
+# copy of the state, so they return it
+
+def _fold_group_rows(detector: FraudDetector, state: DetectionState, delta: pd.DataFrame, earlier: Optional[pd.DataFrame]) -> Tuple[Dict[str, Any], Dict[str, Any], DetectionState]:
+    aggregates, changed = detector.fold_group_rows(state, delta, earlier)
+    return aggregates, changed, state
+
+def _detect_delta(detector: FraudDetector, result: AnalysisResult, state: DetectionState, rows: pd.DataFrame, aadhaar_counts: Dict[str, int], cross_file_aadhaar: Any, rule_aggregates: Dict[str, Any]) -> Tuple[AnalysisResult, DetectionState]:
+    return detector.detect_delta(result, state, rows, aadhaar_counts, cross_file_aadhaar=cross_file_aadhaar, rule_aggregates=rule_aggregates), state
+
+def _rows_in_changed_groups(detector: FraudDetector, earlier: pd.DataFrame, changed: Dict[str, Any]) -> List[int]:
+    touched = np.zeros(len(earlier), dtype=bool)
+    for rule in detector.rules.group_rules:
+        if len(changed.get(rule.name, ())) and all(column in earlier.columns for column in rule.group_by):
+            touched |= rule.in_groups(earlier, changed[rule.name])
+    return earlier.index[touched].tolist()
+
+async def apply_appended_rows(session: AsyncSession, detector: FraudDetector, file_id: str, start_row: int, rows_added: int) -> Optional[AnalysisResult]:
+    """
+    Folds rows appended to an analyzed dataset into its stored results, in time
+    proportional to the appended batch. Returns None if the file was never analyzed
+    (or by another detector version/config, whose results are then dropped).
+    Scoring runs in the detection pool, like /analyze, so the event loop keeps serving.
+    """
+    existing = await data_storage.get_results(session, file_id, include_cases=False)
+    if existing is None:
+        return None
+    if not await data_storage.has_results(session, file_id, detector.cache_key()):
+        # Analyzed by another detector version/config, whose running state (e.g.
+        # Aadhaar keys) may not line up: the next /analyze recomputes in full
+        await data_storage.invalidate_results(session, file_id)
+        return None
+    # Cases are loaded as columns; no FraudCase model is built for them
+    result = AnalysisResult.model_validate({**existing, "cases": []})
+    result.flagged = await data_storage.get_flagged(session, file_id)
+
+    state = await data_storage.get_detection_state(session, file_id)
+    if state is None:
+        # First append since the full analysis: build the running state once
+        base = await data_storage.get_rows(session, file_id, np.arange(start_row))
+        state, counts = await detection_executor.run(detector.build_state, base, result)
+        del base
+        await data_storage.save_aadhaar_counts(session, file_id, counts)
+
+    delta = await data_storage.get_rows(session, file_id, np.arange(start_row, start_row + rows_added))
+
+    # Merge the delta's Aadhaar counts into the running counts
+    delta_counts = await run_in_threadpool(aadhaar_claim_counts, delta)
+    prior = await data_storage.get_aadhaar_counts(session, file_id, list(delta_counts))
+    merged = {}
+    touched_rows = []
+    for key, (count, first_row) in delta_counts.items():
+        if key not in prior:
+            merged[key] = (count, first_row)
+            continue
+        prior_count, prior_first_row = prior[key]
+        if prior_count == 1:
+            # The earlier single claim just became a duplicate and needs rescoring
+            touched_rows.append(prior_first_row)
+        merged[key] = (prior_count + count, prior_first_row)
+    await data_storage.save_aadhaar_counts(session, file_id, merged, existing=prior.keys())
+
+    # Group rules (e.g. distributor bursts) are judged on dataset-wide per-group
+    # aggregates: fold the delta into them and rescore earlier rows of every group
+    # whose flag changed, so results match a full re-analysis
+    rule_aggregates = {}
+    group_rules = detector.rules.group_rules
+    if group_rules:
+        earlier = None
+        group_columns = list(dict.fromkeys(
+            column for rule in group_rules for column in rule.group_by + ([rule.column] if rule.column else [])
+        ))
+        async def load_earlier() -> pd.DataFrame:
+            df = await data_storage.get_data(session, file_id, columns=group_columns)
+            return df.iloc[:start_row]
+        if any(rule.name not in (state.group_partials or {}) for rule in group_rules):
+            earlier = await load_earlier()
+        rule_aggregates, changed, state = await detection_executor.run(_fold_group_rows, detector, state, delta, earlier)
+        if any(len(groups) for groups in changed.values()):
+            if earlier is None:
+                earlier = await load_earlier()
+            touched_rows.extend(await detection_executor.run(_rows_in_changed_groups, detector, earlier, changed))
+        del earlier
+
+    rows = delta
+    if touched_rows:
+        earlier_rows = await data_storage.get_rows(session, file_id, sorted(set(touched_rows)))
+        rows = pd.concat([earlier_rows, delta])
+
+    cross_file_aadhaar = await run_in_threadpool(aadhaar_index_store.claimed_elsewhere, file_id)
+    result, state = await detection_executor.run(
+        _detect_delta, detector, result, state, rows,
+        {key: count for key, (count, _) in merged.items()}, cross_file_aadhaar, rule_aggregates
+    )
+
+    await data_storage.save_detection_state(session, state)
+    await data_storage.update_results(session, file_id, result.model_dump(), flagged=result.flagged)
+    return result
@@ -0,0 +1,129 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# Seconds; stages range from sub-millisecond lookups to multi-minute analyses
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+# Marks metric observations sent from detection worker processes (see services/executor.py)
+METRIC_MESSAGE = "__metric__"
+
+Labels = Tuple[Tuple[str, str], ...]
+
+def _labels(labels: Dict[str, str]) -> Labels:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+def _format_labels(labels: Labels, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    escaped = (value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(pairs, escaped)) + "}"
+
+class Counter:
+    def __init__(self, name: str, help: str):
+        self.name, self.help, self.kind = name, help, "counter"
+        self._values: Dict[Labels, float] = {}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        registry.record(self.name, _labels(labels), amount)
+
+    def _apply(self, labels: Labels, amount: float) -> None:
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def _render(self) -> List[str]:
+        return [f"{self.name}{_format_labels(labels)} {float(value)!r}" for labels, value in sorted(self._values.items())]
+
+class Gauge(Counter):
+    def __init__(self, name: str, help: str):
+        super().__init__(name, help)
+        self.kind = "gauge"
+
+    def set(self, value: float, **labels: str) -> None:
+        # Gauges describe the API process itself, so they are never forwarded
+        with registry._lock:
+            self._values[_labels(labels)] = value
+
+class Histogram:
+    def __init__(self, name: str, help: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name, self.help, self.kind = name, help, "histogram"
+        self.buckets = buckets
+        # labels -> (count per bucket incl. +Inf, sum, count)
+        self._values: Dict[Labels, Tuple[List[int], float, int]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        registry.record(self.name, _labels(labels), value)
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def _apply(self, labels: Labels, value: float) -> None:
+        counts, total, count = self._values.get(labels) or ([0] * (len(self.buckets) + 1), 0.0, 0)
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        self._values[labels] = (counts, total + value, count + 1)
+
+    def _render(self) -> List[str]:
+        lines = []
+        for labels, (counts, total, count) in sorted(self._values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(list(self.buckets) + [float("inf")], counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                lines.append(f"{self.name}_bucket{_format_labels(labels, ('le', le))} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {total!r}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {count}")
+        return lines
+
+class MetricsRegistry:
+    """
+    In-process metrics in the Prometheus text format. Detection worker processes
+    forward their observations to the API process through the executor's queue.
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+        self._lock = threading.Lock()
+        self._forward_queue = None
+
+    def register(self, metric):
+        self._metrics[metric.name] = metric
+        return metric
+
+    def forward_to(self, queue) -> None:
+        """Called in worker processes: send observations to the parent instead of keeping them."""
+        self._forward_queue = queue
+
+    def record(self, name: str, labels: Labels, value: float) -> None:
+        if self._forward_queue is not None:
+            self._forward_queue.put((METRIC_MESSAGE, name, labels, value))
+            return
+        with self._lock:
+            self._metrics[name]._apply(labels, value)
+
+    def render(self) -> str:
+        lines = []
+        with self._lock:
+            for metric in self._metrics.values():
+                lines.append(f"# HELP {metric.name} {metric.help}")
+                lines.append(f"# TYPE {metric.name} {metric.kind}")
+                lines.extend(metric._render())
+        return "\n".join(lines) + "\n"
+
+registry = MetricsRegistry()
+
+stage_seconds = registry.register(Histogram("subsiguard_stage_seconds", "Time spent per pipeline stage"))
+request_seconds = registry.register(Histogram("subsiguard_http_request_seconds", "HTTP request latency per route"))
+rows_processed = registry.register(Counter("subsiguard_rows_processed_total", "Rows uploaded or analyzed"))
+flagged_cases = registry.register(Counter("subsiguard_flagged_cases_total", "Fraud cases flagged by analyses"))
+executor_jobs = registry.register(Gauge("subsiguard_executor_jobs", "Detection pool jobs by state"))
+
+def timed(stage: str):
+    """``with timed("detect.rules"):`` records the block's duration under ``stage``."""
+    return stage_seconds.time(stage=stage)
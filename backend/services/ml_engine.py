@@ -0,0 +1,244 @@
+import numpy as np
+import pandas as pd
+import hashlib
+import json
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+from services.columnar_storage import DATA_DIR
+from services.robust_stats import feature_matrix
+
+# scikit-learn (and joblib) are optional: see requirements-ml.txt. They are
+# imported on first use, so cold starts of the default z-score path never pay for them.
+
+# Parallel scoring workers (-1: one per CPU) and rows per scoring batch
+ML_JOBS = int(os.environ.get("SUBSIGUARD_ML_JOBS", -1))
+ML_BATCH_ROWS = int(os.environ.get("SUBSIGUARD_ML_BATCH_ROWS", 65_536))
+
+# Models are fitted on a uniform sample of at most this many rows
+ML_FIT_ROWS = int(os.environ.get("SUBSIGUARD_ML_FIT_ROWS", 200_000))
+
+ML_ESTIMATORS = int(os.environ.get("SUBSIGUARD_ML_ESTIMATORS", 100))
+
+# Trained models, on disk and (most recently used) in memory. Both caches evict
+# the least recently used model; on disk, a model's mtime is its last use.
+MODEL_DIR = os.path.join(DATA_DIR, "models")
+MODEL_CACHE_SIZE = 8
+MODEL_DISK_CACHE_SIZE = int(os.environ.get("SUBSIGUARD_MODEL_DISK_CACHE_SIZE", 64))
+
+# Anomaly scores of the training sample kept with a model, as this many quantiles;
+# rows are scored by their rank among them
+REFERENCE_QUANTILES = 1_001
+
+NUMERIC_FEATURES = ['amount', 'income']
+CATEGORICAL_FEATURES = ['subsidy_type', 'state']
+
+def _require_sklearn():
+    try:
+        from sklearn.ensemble import IsolationForest
+    except ImportError as e:
+        raise RuntimeError(
+            "The isolation_forest scoring engine needs scikit-learn: pip install -r requirements-ml.txt"
+        ) from e
+    return IsolationForest
+
+class IsolationForestModel:
+    """
+    A fitted forest plus the category encoding of its training data, and the
+    quantiles of the training sample's anomaly scores.
+    """
+
+    def __init__(self, forest: Any, categories: Dict[str, pd.Index], reference: Optional[np.ndarray] = None):
+        self.forest = forest
+        self.categories = categories
+        self.reference = reference
+
+    def rank(self, anomaly_scores: np.ndarray) -> np.ndarray:
+        """Share of the training sample at most as anomalous as each score (0-1)."""
+        return np.searchsorted(self.reference, anomaly_scores, side='right') / len(self.reference)
+
+    def matrix(self, df: pd.DataFrame) -> np.ndarray:
+        """Numeric features as-is, categoricals as their training codes (-1 = unseen)."""
+        numeric = feature_matrix(df, NUMERIC_FEATURES)
+        codes = np.full((len(df), len(CATEGORICAL_FEATURES)), -1.0)
+        for column, feature in enumerate(CATEGORICAL_FEATURES):
+            if feature in df.columns and feature in self.categories:
+                codes[:, column] = self.categories[feature].get_indexer(df[feature].astype(object))
+        return np.hstack([numeric, codes])
+
+class BottomKSample:
+    """
+    Uniform sample of at most ``k`` rows from a stream of chunks: each row gets
+    a random priority and the ``k`` lowest priorities seen so far are kept.
+    """
+
+    def __init__(self, k: int, random_state: int = 0):
+        self.k = k
+        self._rng = np.random.default_rng(random_state)
+        self._rows: Optional[pd.DataFrame] = None
+        self._priorities = np.empty(0)
+
+    def add(self, chunk: pd.DataFrame) -> None:
+        priorities = self._rng.random(len(chunk))
+        rows = chunk if self._rows is None else pd.concat([self._rows, chunk], ignore_index=True)
+        priorities = np.concatenate([self._priorities, priorities])
+        if len(rows) > self.k:
+            keep = np.argpartition(priorities, self.k)[:self.k]
+            rows, priorities = rows.iloc[keep].reset_index(drop=True), priorities[keep]
+        self._rows, self._priorities = rows, priorities
+
+    def frame(self) -> pd.DataFrame:
+        return self._rows if self._rows is not None else pd.DataFrame()
+
+class IsolationForestEngine:
+    """
+    Scores rows with a scikit-learn IsolationForest on amount, income and the
+    encoded scheme and state. Fitting uses a bounded sample; scoring runs in
+    batches spread over ``n_jobs`` threads (tree traversal releases the GIL).
+    """
+
+    def __init__(self, contamination: float, n_estimators: int = ML_ESTIMATORS, n_jobs: int = ML_JOBS, batch_rows: int = ML_BATCH_ROWS, fit_rows: int = ML_FIT_ROWS, random_state: int = 0):
+        self.contamination = contamination
+        self.n_estimators = n_estimators
+        self.n_jobs = n_jobs
+        self.batch_rows = batch_rows
+        self.fit_rows = fit_rows
+        self.random_state = random_state
+        self._models: "OrderedDict[str, IsolationForestModel]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def config(self) -> Dict[str, Any]:
+        # Settings that change scores (not n_jobs/batch_rows)
+        return {
+            "contamination": self.contamination,
+            "n_estimators": self.n_estimators,
+            "fit_rows": self.fit_rows,
+            "random_state": self.random_state,
+            "features": NUMERIC_FEATURES + CATEGORICAL_FEATURES,
+            "score": "training_rank"
+        }
+
+    def fit(self, df: pd.DataFrame) -> IsolationForestModel:
+        IsolationForest = _require_sklearn()
+        sample = df.sample(n=self.fit_rows, random_state=self.random_state) if len(df) > self.fit_rows else df
+        categories = {
+            feature: pd.Index(sample[feature].dropna().astype(object).unique())
+            for feature in CATEGORICAL_FEATURES if feature in sample.columns
+        }
+        model = IsolationForestModel(None, categories)
+        X = model.matrix(sample)
+        model.forest = IsolationForest(
+            n_estimators=self.n_estimators,
+            contamination=self.contamination,
+            random_state=self.random_state,
+            n_jobs=self.n_jobs
+        ).fit(X)
+        model.reference = np.quantile(-model.forest.score_samples(X), np.linspace(0, 1, REFERENCE_QUANTILES))
+        return model
+
+    # --- Trained-model cache ---
+
+    def cache_key(self, dataset_key: str) -> str:
+        config = json.dumps(self.config(), sort_keys=True)
+        return hashlib.sha256(f"{dataset_key}:{config}".encode()).hexdigest()[:32]
+
+    def cached(self, dataset_key: str) -> Optional[IsolationForestModel]:
+        key = self.cache_key(dataset_key)
+        path = os.path.join(MODEL_DIR, f"{key}.joblib")
+        with self._lock:
+            model = self._models.get(key)
+            if model is not None:
+                self._models.move_to_end(key)
+        if model is None:
+            import joblib
+            try:
+                model = joblib.load(path)
+            except FileNotFoundError:
+                # Never trained, or evicted (possibly by another process) meanwhile
+                return None
+            self._remember(key, model)
+        try:
+            os.utime(path) # Last use, for eviction
+        except FileNotFoundError:
+            pass # Evicted from disk; the in-memory copy still serves this process
+        return model
+
+    def model_for(self, df: pd.DataFrame, dataset_key: Optional[str] = None) -> IsolationForestModel:
+        """The cached model of ``dataset_key``, else one fitted on ``df`` (and cached under the key)."""
+        if dataset_key is None:
+            return self.fit(df)
+        model = self.cached(dataset_key)
+        if model is not None:
+            return model
+
+        model = self.fit(df)
+        key = self.cache_key(dataset_key)
+        import joblib
+        os.makedirs(MODEL_DIR, exist_ok=True)
+        path = os.path.join(MODEL_DIR, f"{key}.joblib")
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        joblib.dump(model, tmp_path)
+        os.replace(tmp_path, path)
+        self._evict_from_disk()
+        self._remember(key, model)
+        return model
+
+    def _evict_from_disk(self) -> None:
+        entries = []
+        for entry in os.scandir(MODEL_DIR):
+            if entry.name.endswith(".joblib"):
+                try:
+                    entries.append((entry.stat().st_mtime, entry.path))
+                except FileNotFoundError:
+                    continue
+        for _, path in sorted(entries)[:max(len(entries) - MODEL_DISK_CACHE_SIZE, 0)]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass # Evicted by another process
+
+    def _remember(self, key: str, model: IsolationForestModel) -> None:
+        with self._lock:
+            self._models[key] = model
+            self._models.move_to_end(key)
+            while len(self._models) > MODEL_CACHE_SIZE:
+                self._models.popitem(last=False)
+
+    # --- Scoring ---
+
+    def score(self, df: pd.DataFrame, model: IsolationForestModel) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Anomaly flags (the ``contamination`` cut-off learned in fitting) and a
+        0-1 score per row: the row's rank among the training sample's anomaly
+        scores. The forest's raw scores sit around 0.5 for ordinary and anomalous
+        rows alike; ranks spread them out, e.g. 0.95 = more isolated than 95% of
+        the training rows.
+        """
+        if df.empty:
+            return np.zeros(0, dtype=bool), np.zeros(0)
+        from joblib import Parallel, delayed
+
+        X = model.matrix(df)
+        batches: List[np.ndarray] = [X[start:start + self.batch_rows] for start in range(0, len(X), self.batch_rows)]
+        if len(batches) == 1:
+            samples = [model.forest.score_samples(batches[0])]
+        else:
+            samples = Parallel(n_jobs=self.n_jobs, prefer="threads")(delayed(model.forest.score_samples)(batch) for batch in batches)
+
+        # score_samples is the negated anomaly score; offset_ is the fitted cut-off
+        score_samples = np.concatenate(samples)
+        flags = score_samples < model.forest.offset_
+        return flags, model.rank(-score_samples)
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # Worker processes get the settings, not the in-memory model cache
+        state = self.__dict__.copy()
+        state["_models"] = OrderedDict()
+        state["_lock"] = None
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
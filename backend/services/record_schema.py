@@ -0,0 +1,111 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pa_csv
+import os
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional
+
+# Declared columns of a beneficiary record; other columns are type-inferred.
+# Aadhaar stays text: as an integer it loses leading zeros and can overflow.
+TEXT_COLUMNS = ['beneficiary_id', 'aadhaar', 'name', 'claim_date']
+# Few distinct values: stored as text, loaded for detection as pandas categoricals
+CATEGORICAL_COLUMNS = ['state', 'district', 'subsidy_type', 'distributor_id']
+# Parsed once on upload and stored as float64, so detection never re-parses them
+NUMERIC_COLUMNS = ['amount', 'income']
+
+# Numeric columns are read as text and converted per block, so one bad value
+# drops its row instead of failing the whole file
+CSV_COLUMN_TYPES = {column: pa.string() for column in TEXT_COLUMNS + CATEGORICAL_COLUMNS + NUMERIC_COLUMNS}
+
+# Bytes of CSV parsed per block (each block is tokenized and converted on all cores)
+CSV_BLOCK_BYTES = int(os.environ.get("SUBSIGUARD_CSV_BLOCK_BYTES", 16 << 20))
+
+# Bad rows listed in an upload's report (all of them are counted)
+MAX_BAD_ROW_SAMPLES = 20
+
+class BadRowReport:
+    """Rows skipped while parsing an upload: a count plus the first few, with why."""
+
+    def __init__(self, max_samples: int = MAX_BAD_ROW_SAMPLES):
+        self.max_samples = max_samples
+        self.count = 0
+        self.samples: List[Dict[str, Any]] = []
+        self._malformed_rows: List[int] = []
+
+    def add(self, row: Optional[int], error: str, column: Optional[str] = None, value: Optional[str] = None) -> None:
+        self.count += 1
+        if len(self.samples) < self.max_samples:
+            self.samples.append({"row": row, "column": column, "value": value, "error": error})
+
+    def add_value_error(self, parsed_row: int, column: str, value: str) -> None:
+        if len(self.samples) >= self.max_samples:
+            self.count += 1
+            return
+        # ``parsed_row`` does not count the malformed rows skipped before it
+        row = parsed_row
+        for skipped in sorted(self._malformed_rows):
+            if skipped <= row:
+                row += 1
+        self.add(row, "Not a number", column, value)
+
+    def _invalid_row(self, row: pa_csv.InvalidRow) -> str:
+        # Wrong number of fields; ``row.number`` is the line number (header = 1), when known
+        data_row = row.number - 1 if row.number is not None else None
+        if data_row is not None:
+            self._malformed_rows.append(data_row)
+        self.add(data_row, f"Expected {row.expected_columns} fields, found {row.actual_columns}", value=row.text)
+        return "skip"
+
+def open_csv(source: BinaryIO, report: BadRowReport, block_bytes: int = CSV_BLOCK_BYTES) -> pa_csv.CSVStreamingReader:
+    """Multithreaded streaming CSV reader with the declared column types."""
+    return pa_csv.open_csv(
+        source,
+        read_options=pa_csv.ReadOptions(block_size=block_bytes, use_threads=True),
+        parse_options=pa_csv.ParseOptions(invalid_row_handler=report._invalid_row),
+        convert_options=pa_csv.ConvertOptions(column_types=CSV_COLUMN_TYPES, strings_can_be_null=True)
+    )
+
+def iter_records(reader: pa_csv.CSVStreamingReader, report: BadRowReport) -> Iterator[pd.DataFrame]:
+    """
+    Typed DataFrames of the reader's blocks. Rows with an unparseable numeric
+    value are reported and dropped; empty blocks are not yielded.
+    """
+    rows_read = 0
+    for batch in reader:
+        bad = np.zeros(batch.num_rows, dtype=bool)
+        numerics = {}
+        for column in NUMERIC_COLUMNS:
+            if column not in batch.schema.names:
+                continue
+            text = batch.column(column)
+            try:
+                numerics[column] = pc.cast(text, pa.float64())
+            except pa.ArrowInvalid:
+                # Slow path, only for blocks with bad values: find them row by row
+                raw = text.to_pandas()
+                values = pd.to_numeric(raw, errors='coerce')
+                invalid = (values.isna() & raw.notna()).to_numpy()
+                for position in np.flatnonzero(invalid & ~bad):
+                    report.add_value_error(rows_read + int(position) + 1, column, raw.iloc[position])
+                bad |= invalid
+                numerics[column] = pa.array(values.to_numpy(dtype=float), from_pandas=True)
+
+        table = pa.Table.from_batches([batch])
+        for column, values in numerics.items():
+            table = table.set_column(table.schema.get_field_index(column), column, values)
+        rows_read += table.num_rows
+        if bad.any():
+            table = table.filter(pa.array(~bad))
+        if table.num_rows:
+            yield table.to_pandas()
+
+def read_records(source: BinaryIO, report: Optional[BadRowReport] = None) -> Iterator[pd.DataFrame]:
+    """Typed DataFrames of a beneficiary CSV, one per parsed block."""
+    report = report if report is not None else BadRowReport()
+    return iter_records(open_csv(source, report), report)
+
+def to_frame(table: pa.Table) -> pd.DataFrame:
+    """Stored records as a DataFrame, with the declared categorical columns as categoricals."""
+    categories = [column for column in CATEGORICAL_COLUMNS if column in table.column_names]
+    return table.to_pandas(split_blocks=True, categories=categories)
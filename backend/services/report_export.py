@@ -0,0 +1,95 @@
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import io
+import zlib
+from typing import Any, AsyncIterator, Dict, List
+
+# Every exported row is a case; "Type" is kept for readers of the first report format
+ROW_TYPE = "Fraud Case"
+
+# Column name in the exported report -> FraudCase field. The first report's
+# columns keep their order; Case ID and State were added after them
+EXPORT_COLUMNS = {
+    "Beneficiary Name": "beneficiary_name",
+    "Scheme": "scheme",
+    "Amount": "amount",
+    "Risk Score": "risk_score",
+    "Fraud Reasons": "fraud_reasons",
+    "Case ID": "id",
+    "State": "state"
+}
+
+PARQUET_SCHEMA = pa.schema([
+    ("Type", pa.string()),
+    ("Beneficiary Name", pa.string()),
+    ("Scheme", pa.string()),
+    ("Amount", pa.float64()),
+    ("Risk Score", pa.int64()),
+    ("Fraud Reasons", pa.string()),
+    ("Case ID", pa.string()),
+    ("State", pa.string())
+])
+
+def _report_frame(cases: List[Dict[str, Any]]) -> pd.DataFrame:
+    df = pd.DataFrame(cases, columns=list(EXPORT_COLUMNS.values()))
+    df["fraud_reasons"] = df["fraud_reasons"].map(", ".join)
+    df = df.set_axis(list(EXPORT_COLUMNS), axis=1)
+    df.insert(0, "Type", ROW_TYPE)
+    return df
+
+async def csv_stream(batches: AsyncIterator[List[Dict[str, Any]]], gzip: bool = False) -> AsyncIterator[bytes]:
+    """Encodes case batches as CSV (optionally gzip-compressed) as they arrive."""
+    compressor = zlib.compressobj(wbits=31) if gzip else None # wbits=31: gzip container
+    header = True
+    async for cases in batches:
+        data = _report_frame(cases).to_csv(index=False, header=header).encode("utf-8")
+        header = False
+        if compressor is not None:
+            data = compressor.compress(data)
+        if data:
+            yield data
+
+    if header:
+        # No cases at all: still send the header row
+        data = _report_frame([]).to_csv(index=False).encode("utf-8")
+        yield compressor.compress(data) if compressor is not None else data
+    if compressor is not None:
+        yield compressor.flush()
+
+class _ChunkSink(io.RawIOBase):
+    # Write-only file that hands out what was written so far; tell() keeps counting
+    # across drains, so the offsets in the Parquet footer stay correct
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+async def parquet_stream(batches: AsyncIterator[List[Dict[str, Any]]]) -> AsyncIterator[bytes]:
+    """Encodes case batches as a Parquet file, one row group per batch."""
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, PARQUET_SCHEMA)
+    try:
+        async for cases in batches:
+            writer.write_table(pa.Table.from_pandas(_report_frame(cases), schema=PARQUET_SCHEMA, preserve_index=False))
+            data = sink.drain()
+            if data:
+                yield data
+    finally:
+        writer.close()
+    yield sink.drain()
@@ -0,0 +1,328 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+# Columns whose value combinations form the strata of stratified scoring
+STRATA = ['subsidy_type', 'state']
+
+# Strata with fewer rows fall back to the next coarser level (scheme, then dataset-wide)
+MIN_STRATUM_ROWS = 30
+
+# Modified Z-score (Iglewicz & Hoaglin): 0.6745 * (x - median) / MAD
+MAD_Z_FACTOR = 0.6745
+
+# Bits of every median fixed per pass over spilled values (StreamingBaseline)
+RADIX_BITS = 8
+
+_SIGN_BIT = np.uint64(1 << 63)
+
+def _stratum_index(df: pd.DataFrame, by: List[str]) -> pd.Index:
+    return pd.Index(df[by[0]]) if len(by) == 1 else pd.MultiIndex.from_frame(df[by])
+
+def _json_value(value: Any) -> Any:
+    return value.item() if isinstance(value, np.generic) else value
+
+def _sortable(values: np.ndarray) -> np.ndarray:
+    """Float64 values as uint64 keys of the same order (negatives: all bits flipped, others: sign bit set)."""
+    bits = np.ascontiguousarray(values, dtype=np.float64).view(np.uint64)
+    return np.where(bits & _SIGN_BIT, ~bits, bits | _SIGN_BIT)
+
+def _unsortable(keys: np.ndarray) -> np.ndarray:
+    return np.where(keys & _SIGN_BIT, keys & ~_SIGN_BIT, ~keys).view(np.float64)
+
+def select_ranks(passes: Callable[[], Iterator[Tuple[np.ndarray, np.ndarray]]], ranks: np.ndarray) -> np.ndarray:
+    """
+    The value of rank ``ranks[q]`` (0-based, ascending) among the values of every
+    query q. ``passes()`` reads the values anew, as (query ids, values) pairs.
+    Radix selection: each pass fixes the next RADIX_BITS bits of every answer's
+    sortable key, so memory is one small histogram per query, however many values.
+    """
+    queries, buckets = len(ranks), 1 << RADIX_BITS
+    answers = np.zeros(queries, dtype=np.uint64)
+    remaining = np.asarray(ranks, dtype=np.int64).copy()
+    for shift in range(64 - RADIX_BITS, -1, -RADIX_BITS):
+        fixed = np.uint64(shift + RADIX_BITS)
+        counts = np.zeros(queries * buckets, dtype=np.int64)
+        for query_ids, values in passes():
+            keys = _sortable(values)
+            if shift + RADIX_BITS < 64:
+                # Only values that agree with the answer on the bits fixed so far
+                same = (keys >> fixed) == (answers[query_ids] >> fixed)
+                keys, query_ids = keys[same], query_ids[same]
+            digits = ((keys >> np.uint64(shift)) & np.uint64(buckets - 1)).astype(np.int64)
+            counts += np.bincount(query_ids * buckets + digits, minlength=queries * buckets)
+        cumulative = counts.reshape(queries, buckets).cumsum(axis=1)
+        digits = np.minimum((cumulative <= remaining[:, None]).sum(axis=1), buckets - 1)
+        remaining -= np.where(digits > 0, cumulative[np.arange(queries), digits - 1], 0)
+        answers |= digits.astype(np.uint64) << np.uint64(shift)
+    return _unsortable(answers)
+
+def feature_matrix(df: pd.DataFrame, features: List[str]) -> np.ndarray:
+    """Features as one float matrix (unparseable or missing values count as 0)."""
+    values = np.zeros((len(df), len(features)))
+    for column, feature in enumerate(features):
+        if feature in df.columns:
+            values[:, column] = pd.to_numeric(df[feature], errors='coerce').fillna(0).to_numpy(dtype=float)
+    return values
+
+class RobustBaseline:
+    """
+    Median and MAD of every feature per stratum, at every level of the ``by``
+    hierarchy: per scheme and state, else per scheme, else dataset-wide. A row is
+    scored against the finest level whose stratum has enough rows.
+    """
+
+    def __init__(self, by: List[str], features: List[str], levels: List[Tuple[List[str], pd.DataFrame]], overall: Dict[str, Tuple[float, float]]):
+        self.by = by
+        self.features = features
+        # Coarsest first: (key columns, frame); index: stratum keys; columns: (median|mad, feature)
+        self.levels = levels
+        self.overall = overall
+        # Build the indexes' lazy lookup tables now: shards scored on a thread pool
+        # share this baseline, and concurrent first lookups race on building them
+        for _, strata in self.levels:
+            strata.index.is_unique
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, features: List[str], by: List[str] = STRATA, min_rows: int = MIN_STRATUM_ROWS) -> "RobustBaseline":
+        by = [column for column in by if column in df.columns]
+        features = [feature for feature in features if feature in df.columns]
+        values = pd.DataFrame(feature_matrix(df, features), columns=features)
+
+        medians = values.median()
+        overall = {
+            feature: (float(medians[feature]), float((values[feature] - medians[feature]).abs().median()))
+            for feature in features
+        }
+
+        if not by or df.empty:
+            return cls(by, features, [], overall)
+
+        levels = []
+        for depth in range(1, len(by) + 1):
+            strata = cls._strata(df, values, by[:depth], min_rows)
+            if len(strata):
+                levels.append((by[:depth], strata))
+        return cls(by, features, levels, overall)
+
+    @staticmethod
+    def _strata(df: pd.DataFrame, values: pd.DataFrame, by: List[str], min_rows: int) -> pd.DataFrame:
+        """
+        Stratum keys are factorized once; medians and MADs of all features then
+        come from two group reductions over the same integer codes.
+        """
+        # Rows with a missing stratum key get no group and use a coarser level
+        codes = df.groupby(by, sort=False, observed=True).ngroup().to_numpy()
+        keyed = codes >= 0
+        codes = codes[keyed].astype(np.int64)
+        values = values[keyed]
+
+        grouped = values.groupby(codes)
+        stratum_medians = grouped.median()
+        stratum_mads = (values - stratum_medians.to_numpy()[codes]).abs().groupby(codes).median()
+        sizes = grouped.size()
+        large = (sizes >= min_rows).to_numpy()
+
+        keys = _stratum_index(df[keyed], by)
+        first_rows = pd.Series(np.arange(len(codes))).groupby(codes).first().to_numpy()
+        strata = pd.concat({"median": stratum_medians, "mad": stratum_mads}, axis=1)[large]
+        strata.index = keys[first_rows[large]]
+        return strata
+
+    def score(self, df: pd.DataFrame, threshold: float, cap: float) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Outlier flags (any feature's |modified Z| above ``threshold``) and a 0-1
+        score per row (the largest |modified Z| across features, divided by ``cap``).
+        """
+        flags = np.zeros(len(df), dtype=bool)
+        feature_scores = np.zeros((len(df), len(self.features)))
+        if df.empty or not self.features:
+            return flags, feature_scores.max(axis=1, initial=0.0)
+
+        values = feature_matrix(df, self.features)
+        overall_medians = np.array([self.overall[feature][0] for feature in self.features])
+        overall_mads = np.array([self.overall[feature][1] for feature in self.features])
+        medians = np.tile(overall_medians, (len(df), 1))
+        mads = np.tile(overall_mads, (len(df), 1))
+
+        # Finer levels overwrite coarser ones wherever the row's stratum is known
+        for by, strata in self.levels:
+            if not all(column in df.columns for column in by):
+                continue
+            positions = strata.index.get_indexer(_stratum_index(df, by))
+            known = positions >= 0
+            medians[known] = strata["median"][self.features].to_numpy()[positions[known]]
+            # A stratum without spread cannot say what an outlier is: keep the coarser MAD
+            stratum_mads = strata["mad"][self.features].to_numpy()[positions[known]]
+            mads[known] = np.where(stratum_mads > 0, stratum_mads, mads[known])
+
+        # Not even the overall MAD, e.g. a constant feature: no score
+        spread = mads > 0
+
+        z_scores = np.zeros_like(values)
+        np.divide(MAD_Z_FACTOR * np.abs(values - medians), mads, out=z_scores, where=spread)
+        flags = (z_scores > threshold).any(axis=1)
+        np.clip(z_scores / cap, 0, 1, out=feature_scores)
+        return flags, feature_scores.max(axis=1)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """JSON-safe form, for the incremental analysis state."""
+        return {
+            "by": self.by,
+            "features": self.features,
+            "overall": {feature: list(stats) for feature, stats in self.overall.items()},
+            "levels": [
+                {"by": by, "strata": [
+                    {"key": [_json_value(value) for value in (key if isinstance(key, tuple) else (key,))],
+                     "median": [float(strata["median"][feature].iloc[i]) for feature in self.features],
+                     "mad": [float(strata["mad"][feature].iloc[i]) for feature in self.features]}
+                    for i, key in enumerate(strata.index)
+                ]}
+                for by, strata in self.levels
+            ]
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "RobustBaseline":
+        by, features = data["by"], data["features"]
+        overall = {feature: (stats[0], stats[1]) for feature, stats in data["overall"].items()}
+        # Baselines saved before levels existed only have the finest one
+        levels = data["levels"] if "levels" in data else [{"by": by, "strata": data["strata"]}]
+        return cls(by, features, [
+            (level["by"], cls._strata_from_rows(level["by"], features, level["strata"]))
+            for level in levels if level["strata"]
+        ], overall)
+
+    @staticmethod
+    def _strata_from_rows(by: List[str], features: List[str], rows: List[Dict[str, Any]]) -> pd.DataFrame:
+        keys = [row["key"] for row in rows]
+        index = pd.Index([key[0] for key in keys], name=by[0]) if len(by) == 1 else pd.MultiIndex.from_tuples([tuple(key) for key in keys], names=by)
+        return pd.concat({
+            "median": pd.DataFrame([row["median"] for row in rows], columns=features, index=index),
+            "mad": pd.DataFrame([row["mad"] for row in rows], columns=features, index=index)
+        }, axis=1)
+
+class StreamingBaseline:
+    """
+    Builds the RobustBaseline that ``from_frame`` would over the concatenation of
+    a stream of chunks, in memory bounded by the number of strata. Each chunk's
+    stratum codes and feature values are spilled to an Arrow file at ``path``;
+    exact medians (and then MADs) come from radix selection over the spill.
+    """
+
+    def __init__(self, path: str, features: List[str], by: List[str] = STRATA, min_rows: int = MIN_STRATUM_ROWS):
+        self.path = path
+        self.requested = (by, features)
+        self.min_rows = min_rows
+        self.by: Optional[List[str]] = None
+        self.features: Optional[List[str]] = None
+        # Per level: known stratum keys (in order of first appearance) and their row counts
+        self._keys: List[Optional[pd.Index]] = []
+        self._sizes: List[np.ndarray] = []
+        self._rows = 0
+        self._writer = None
+
+    def add(self, chunk: pd.DataFrame) -> None:
+        if self.by is None:
+            by, features = self.requested
+            self.by = [column for column in by if column in chunk.columns]
+            self.features = [feature for feature in features if feature in chunk.columns]
+            self._keys = [None] * len(self.by)
+            self._sizes = [np.zeros(0, dtype=np.int64) for _ in self.by]
+
+        columns = {f"level_{depth}": self._encode(chunk, depth) for depth in range(1, len(self.by) + 1)}
+        values = feature_matrix(chunk, self.features)
+        columns.update({feature: values[:, column] for column, feature in enumerate(self.features)})
+        batch = pa.RecordBatch.from_pydict(columns)
+        if self._writer is None:
+            self._writer = pa.ipc.new_file(self.path, batch.schema)
+        self._writer.write_batch(batch)
+        self._rows += len(chunk)
+
+    def _encode(self, chunk: pd.DataFrame, depth: int) -> np.ndarray:
+        by = self.by[:depth]
+        keyed = chunk[by].notna().all(axis=1).to_numpy()
+        index = _stratum_index(chunk[keyed], by)
+        known = self._keys[depth - 1]
+        positions = known.get_indexer(index) if known is not None else np.full(len(index), -1)
+        if (positions < 0).any():
+            added = index[positions < 0].unique()
+            known = added if known is None else known.append(added)
+            self._keys[depth - 1] = known
+            positions = known.get_indexer(index)
+
+        codes = np.full(len(chunk), -1, dtype=np.int64)
+        codes[keyed] = positions
+        sizes = np.bincount(positions, minlength=len(known) if known is not None else 0)
+        sizes[:len(self._sizes[depth - 1])] += self._sizes[depth - 1]
+        self._sizes[depth - 1] = sizes
+        return codes
+
+    def baseline(self) -> RobustBaseline:
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        if self.by is None or not self._rows or not self.features:
+            return RobustBaseline.from_frame(pd.DataFrame(), [])
+
+        # Level 0 is the whole dataset as a single stratum
+        sizes = [np.array([self._rows])] + self._sizes
+        features = self.features
+        # Query (level, feature, lower|upper middle value, stratum); pandas averages the two
+        offsets = np.cumsum([0] + [2 * len(features) * len(level) for level in sizes])
+        ranks = np.concatenate([np.tile(np.concatenate([(level - 1) // 2, level // 2]), len(features)) for level in sizes])
+
+        def passes(medians: Optional[np.ndarray] = None) -> Callable[[], Iterator[Tuple[np.ndarray, np.ndarray]]]:
+            # With ``medians``: absolute deviations from the query's stratum median
+            def read() -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+                with pa.memory_map(self.path, "r") as spill:
+                    reader = pa.ipc.open_file(spill)
+                    for i in range(reader.num_record_batches):
+                        batch = reader.get_batch(i)
+                        for level, level_sizes in enumerate(sizes):
+                            codes = batch.column(f"level_{level}").to_numpy() if level else np.zeros(batch.num_rows, dtype=np.int64)
+                            keyed = codes >= 0
+                            codes = codes[keyed]
+                            for column, feature in enumerate(features):
+                                values = batch.column(feature).to_numpy()[keyed]
+                                for middle in range(2):
+                                    ids = offsets[level] + (2 * column + middle) * len(level_sizes) + codes
+                                    yield ids, values if medians is None else np.abs(values - medians[ids])
+            return read
+
+        def middle_means(selected: np.ndarray) -> np.ndarray:
+            # Mean of each query pair's two middle values, stored at both of its queries
+            means = np.empty_like(selected)
+            for level, level_sizes in enumerate(sizes):
+                count = len(level_sizes)
+                for column in range(len(features)):
+                    start = offsets[level] + 2 * column * count
+                    lower, upper = selected[start:start + count], selected[start + count:start + 2 * count]
+                    means[start:start + count] = means[start + count:start + 2 * count] = (lower + upper) / 2
+            return means
+
+        medians = middle_means(select_ranks(passes(), ranks))
+        mads = middle_means(select_ranks(passes(medians), ranks))
+
+        def per_stratum(stats: np.ndarray, level: int) -> pd.DataFrame:
+            count = len(sizes[level])
+            start = offsets[level]
+            return pd.DataFrame({
+                feature: stats[start + 2 * column * count:start + (2 * column + 1) * count]
+                for column, feature in enumerate(features)
+            })
+
+        overall_medians, overall_mads = per_stratum(medians, 0), per_stratum(mads, 0)
+        overall = {feature: (float(overall_medians[feature].iloc[0]), float(overall_mads[feature].iloc[0])) for feature in features}
+
+        levels = []
+        for depth in range(1, len(self.by) + 1):
+            if self._keys[depth - 1] is None:
+                continue
+            large = sizes[depth] >= self.min_rows
+            strata = pd.concat({"median": per_stratum(medians, depth), "mad": per_stratum(mads, depth)}, axis=1)[large]
+            strata.index = self._keys[depth - 1][large]
+            if len(strata):
+                levels.append((self.by[:depth], strata))
+        return RobustBaseline(self.by, features, levels, overall)
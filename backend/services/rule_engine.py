@@ -0,0 +1,311 @@
+import numpy as np
+import pandas as pd
+import json
+import os
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from services.aadhaar_index import AadhaarIndex, aadhaar_keys, aadhaar_uint64, contains, find_duplicates
+from services.collusion_detection import daily_claims, flag_bursts
+
+# Fraud reasons reported by the built-in rules
+DUPLICATE_AADHAAR = "Duplicate Aadhaar Number"
+CROSS_FILE_AADHAAR = "Aadhaar also claims in another upload"
+HIGH_INCOME = "Income exceeds threshold (₹2.5L)"
+HIGH_AMOUNT = "Unusually high claim amount (>₹50k)"
+DISTRIBUTOR_BURST = "Anomalous claim burst via one distributor"
+
+# Declarative rule definitions, evaluated in this order. Rule types:
+#   duplicate:   value of ``column`` claimed more than once in the dataset
+#   cross_file:  value of ``column`` also claims in another upload
+#   threshold:   ``column`` <op> ``value``; ``by`` + ``overrides`` give per-group
+#                thresholds, e.g. {"by": "subsidy_type", "overrides": {"PMAY": 250000}}
+#   group_count: number of rows per ``by`` group <op> ``value``
+#   group_sum:   sum of ``column`` per ``by`` group <op> ``value``
+#   burst:       claims (or sum of ``column``) per ``by`` over a trailing window of
+#                ``window_days`` ending on ``date``, anomalous against the group's
+#                own history and its peers (see services/collusion_detection.py)
+DEFAULT_RULES: List[Dict[str, Any]] = [
+    {"name": "duplicate_aadhaar", "type": "duplicate", "reason": DUPLICATE_AADHAAR, "column": "aadhaar"},
+    {"name": "cross_file_aadhaar", "type": "cross_file", "reason": CROSS_FILE_AADHAAR, "column": "aadhaar"},
+    {"name": "high_income", "type": "threshold", "reason": HIGH_INCOME, "column": "income", "op": ">", "value": 250000,
+     "by": "subsidy_type", "overrides": {}},
+    {"name": "high_amount", "type": "threshold", "reason": HIGH_AMOUNT, "column": "amount", "op": ">", "value": 50000,
+     "by": "subsidy_type", "overrides": {}},
+    {"name": "distributor_burst", "type": "burst", "reason": DISTRIBUTOR_BURST, "column": "amount",
+     "by": "distributor_id", "date": "claim_date", "window_days": 1, "min_claims": 10, "threshold": 3.5,
+     "min_history": 7},
+]
+
+# JSON file with a list of rule definitions replacing DEFAULT_RULES
+RULES_FILE = os.environ.get("SUBSIGUARD_RULES_FILE")
+
+OPERATORS: Dict[str, Callable[[Any, Any], Any]] = {
+    ">": np.greater,
+    ">=": np.greater_equal,
+    "<": np.less,
+    "<=": np.less_equal,
+    "==": np.equal,
+    "!=": np.not_equal
+}
+
+# Reason codes are a bitmask; the last bit is left for the statistical stage
+MAX_RULES = 31
+REASON_DTYPE = np.uint32
+
+# Rules that flag whole groups of rows from dataset-wide per-group aggregates
+GROUP_KINDS = ("group_count", "group_sum", "burst")
+
+class Rule:
+    """One compiled rule: a vectorized function from a frame to a boolean array."""
+
+    def __init__(self, definition: Dict[str, Any]):
+        self.definition = definition
+        self.name: str = definition["name"]
+        self.kind: str = definition["type"]
+        self.reason: str = definition["reason"]
+        self.column: Optional[str] = definition.get("column")
+        by = definition.get("by")
+        self.by: List[str] = [by] if isinstance(by, str) else list(by or [])
+
+        if self.kind in ("threshold", "group_count", "group_sum"):
+            if definition.get("op") not in OPERATORS:
+                raise ValueError(f"Rule '{self.name}': unknown operator {definition.get('op')!r}")
+            self.op = OPERATORS[definition["op"]]
+            self.value = float(definition["value"])
+        if self.kind in GROUP_KINDS and not self.by:
+            raise ValueError(f"Rule '{self.name}': group rules need 'by' columns")
+        self.date: Optional[str] = definition.get("date")
+        if self.kind == "burst":
+            if not self.date:
+                raise ValueError(f"Rule '{self.name}': burst rules need a 'date' column")
+            if int(definition.get("window_days", 1)) < 1:
+                raise ValueError(f"Rule '{self.name}': 'window_days' must be at least 1")
+        # Columns identifying the groups a group rule flags
+        self.group_by: List[str] = self.by + ([self.date] if self.kind == "burst" else [])
+
+        evaluators = {
+            "duplicate": self._duplicate,
+            "cross_file": self._cross_file,
+            "threshold": self._threshold,
+            "group_count": self._group,
+            "group_sum": self._group,
+            "burst": self._group
+        }
+        if self.kind not in evaluators:
+            raise ValueError(f"Rule '{self.name}': unknown rule type {self.kind!r}")
+        self.evaluate = evaluators[self.kind]
+
+    def columns(self) -> List[str]:
+        """Columns the rule needs; without them it never matches."""
+        if self.kind == "threshold":
+            # Per-group thresholds fall back to ``value`` when ``by`` is missing
+            return [self.column]
+        if self.kind == "burst":
+            # Without ``column`` only claim volumes are compared
+            return self.group_by
+        return ([self.column] if self.column else []) + self.by
+
+    # --- Dataset-wide aggregates (mergeable across shards) ---
+
+    def partial(self, df: pd.DataFrame) -> Any:
+        if self.kind == "duplicate":
+            return AadhaarIndex.from_series(df[self.column])
+        if self.kind == "group_count":
+            return df.groupby(self.by, sort=False, observed=True).size()
+        if self.kind == "group_sum":
+            values = pd.to_numeric(df[self.column], errors='coerce')
+            return values.groupby([df[column] for column in self.by], sort=False, observed=True).sum()
+        if self.kind == "burst":
+            return daily_claims(df, self.by, self.date, self.column)
+        return None
+
+    def combine(self, partials: List[Any]) -> Any:
+        """Merges partials into one partial of the same kind (counts/sums add up)."""
+        partials = [partial for partial in partials if partial is not None]
+        if not partials:
+            return None
+        if len(partials) == 1:
+            return partials[0]
+        if self.kind == "duplicate":
+            return AadhaarIndex.combine(partials)
+        return pd.concat(partials).groupby(level=list(range(len(self.group_by))), sort=False, observed=True).sum()
+
+    def finalize(self, combined: Any) -> Any:
+        """What scoring needs: duplicated keys, or the groups that satisfy the rule."""
+        if combined is None:
+            return None
+        if self.kind == "duplicate":
+            return combined.duplicates()
+        if self.kind == "burst":
+            return flag_bursts(
+                combined,
+                window_days=int(self.definition.get("window_days", 1)),
+                min_claims=int(self.definition.get("min_claims", 10)),
+                threshold=float(self.definition.get("threshold", 3.5)),
+                min_history=int(self.definition.get("min_history", 7))
+            )
+        return combined[self.op(combined.to_numpy(dtype=float), self.value)].index
+
+    def merge(self, partials: List[Any]) -> Any:
+        return self.finalize(self.combine(partials))
+
+    def partial_to_dict(self, partial: Any) -> Optional[Dict[str, Any]]:
+        """JSON form of a group rule's partial, kept in the incremental detection state."""
+        if partial is None:
+            return None
+        frame = partial.to_frame("value") if isinstance(partial, pd.Series) else partial
+        levels = [frame.index.get_level_values(level) for level in range(frame.index.nlevels)]
+        return {
+            "names": list(frame.index.names),
+            "dtypes": [str(level.dtype) for level in levels],
+            # Datetimes as epoch nanoseconds; everything else as plain Python values
+            "keys": [level.asi8.tolist() if isinstance(level, pd.DatetimeIndex) else level.tolist() for level in levels],
+            "values": {column: frame[column].tolist() for column in frame.columns}
+        }
+
+    def partial_from_dict(self, data: Optional[Dict[str, Any]]) -> Any:
+        if data is None:
+            return None
+        levels = []
+        for keys, dtype in zip(data["keys"], data["dtypes"]):
+            if dtype.startswith("datetime64"):
+                levels.append(pd.DatetimeIndex(pd.to_datetime(keys)).astype(dtype))
+            elif dtype in ("object", "category", "string", "str"):
+                # Compared by value with the (possibly categorical) columns of new rows
+                levels.append(pd.Index(keys, dtype=object))
+            else:
+                levels.append(pd.Index(keys).astype(dtype))
+        index = pd.MultiIndex.from_arrays(levels, names=data["names"]) if len(levels) > 1 else levels[0].rename(data["names"][0])
+        if self.kind == "burst":
+            return pd.DataFrame(data["values"], index=index)
+        return pd.Series(data["values"]["value"], index=index)
+
+    def in_groups(self, df: pd.DataFrame, groups: Any) -> np.ndarray:
+        """Rows of ``df`` belonging to any of ``groups`` (as returned by ``finalize``)."""
+        if len(groups) == 0:
+            return np.zeros(len(df), dtype=bool)
+        row_groups = df[self.group_by[0]] if len(self.group_by) == 1 else pd.MultiIndex.from_frame(df[self.group_by])
+        return np.asarray(row_groups.isin(groups), dtype=bool)
+
+    # --- Evaluators ---
+
+    def _duplicate(self, df: pd.DataFrame, context: "RuleContext") -> np.ndarray:
+        if context.aadhaar_counts is not None and context.aggregates.get(self.name) is None:
+            # Running counts of incremental analysis (Aadhaar column only)
+            return (aadhaar_keys(df[self.column]).map(context.aadhaar_counts) > 1).to_numpy(dtype=bool, na_value=False)
+        # Integer keys: sort-based duplicate search instead of hashing mixed objects
+        keys, valid = context.keys(df, self.column)
+        duplicates = context.aggregates.get(self.name)
+        if duplicates is None:
+            duplicates = find_duplicates(keys[valid])
+        return valid & contains(duplicates, keys)
+
+    def _cross_file(self, df: pd.DataFrame, context: "RuleContext") -> np.ndarray:
+        if context.cross_file_aadhaar is None or len(context.cross_file_aadhaar) == 0:
+            return np.zeros(len(df), dtype=bool)
+        keys, valid = context.keys(df, self.column)
+        return valid & contains(context.cross_file_aadhaar, keys)
+
+    def _threshold(self, df: pd.DataFrame, context: "RuleContext") -> np.ndarray:
+        # Values that cannot be parsed as numbers become NaN and never match
+        values = context.numeric(df, self.column)
+        thresholds = self.value
+        overrides = self.definition.get("overrides") or {}
+        if overrides and self.by and self.by[0] in df.columns:
+            thresholds = df[self.by[0]].map(overrides).astype(float).fillna(self.value).to_numpy()
+        return self.op(values, thresholds)
+
+    def _group(self, df: pd.DataFrame, context: "RuleContext") -> np.ndarray:
+        flagged_groups = context.aggregates.get(self.name)
+        if flagged_groups is None:
+            flagged_groups = self.merge([self.partial(df)])
+        return self.in_groups(df, flagged_groups)
+
+class RuleContext:
+    """Inputs shared by all rules of one pass, plus per-pass column caches."""
+
+    def __init__(self, aggregates: Optional[Dict[str, Any]] = None, aadhaar_counts: Optional[Dict[str, int]] = None, cross_file_aadhaar: Optional[np.ndarray] = None):
+        self.aggregates = aggregates or {}
+        self.aadhaar_counts = aadhaar_counts
+        self.cross_file_aadhaar = cross_file_aadhaar
+        self._numeric: Dict[str, np.ndarray] = {}
+        self._keys: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+
+    def numeric(self, df: pd.DataFrame, column: str) -> np.ndarray:
+        if column not in self._numeric:
+            self._numeric[column] = pd.to_numeric(df[column], errors='coerce').to_numpy(dtype=float, na_value=np.nan)
+        return self._numeric[column]
+
+    def keys(self, df: pd.DataFrame, column: str) -> Tuple[np.ndarray, np.ndarray]:
+        if column not in self._keys:
+            self._keys[column] = aadhaar_uint64(df[column])
+        return self._keys[column]
+
+class RuleEngine:
+    """Compiles rule definitions and evaluates them in one batched pass over a frame."""
+
+    def __init__(self, definitions: Optional[List[Dict[str, Any]]] = None):
+        self.definitions = definitions if definitions is not None else DEFAULT_RULES
+        self.rules = [Rule(definition) for definition in self.definitions]
+        if len(self.rules) > MAX_RULES:
+            raise ValueError(f"At most {MAX_RULES} rules are supported")
+        names = [rule.name for rule in self.rules]
+        if len(set(names)) != len(names):
+            raise ValueError("Rule names must be unique")
+
+    @classmethod
+    def from_file(cls, path: Optional[str]) -> "RuleEngine":
+        if not path:
+            return cls()
+        with open(path) as f:
+            return cls(json.load(f))
+
+    @property
+    def reasons(self) -> List[str]:
+        return [rule.reason for rule in self.rules]
+
+    @property
+    def group_rules(self) -> List[Rule]:
+        return [rule for rule in self.rules if rule.kind in GROUP_KINDS]
+
+    def partials(self, df: pd.DataFrame, rules: Optional[List[Rule]] = None) -> Dict[str, Any]:
+        """Mergeable per-shard aggregates of the rules that need dataset-wide values."""
+        return {
+            rule.name: rule.partial(df)
+            for rule in (self.rules if rules is None else rules)
+            if all(column in df.columns for column in rule.columns())
+        }
+
+    def merge(self, partials: List[Dict[str, Any]]) -> Dict[str, Any]:
+        return {rule.name: rule.merge([partial.get(rule.name) for partial in partials]) for rule in self.rules}
+
+    def evaluate(self, df: pd.DataFrame, context: RuleContext) -> Tuple[np.ndarray, Dict[str, Dict[str, float]]]:
+        """
+        Reason bitmask per row (bit i = rule i) and per-rule stats
+        (hits, seconds). Rules whose columns are missing never match.
+        """
+        reason_codes = np.zeros(len(df), dtype=REASON_DTYPE)
+        stats = {}
+        for bit, rule in enumerate(self.rules):
+            started = time.perf_counter()
+            hits = 0
+            if all(column in df.columns for column in rule.columns()):
+                flags = rule.evaluate(df, context)
+                reason_codes |= flags.astype(REASON_DTYPE) << REASON_DTYPE(bit)
+                hits = int(np.count_nonzero(flags))
+            stats[rule.name] = {"hits": hits, "seconds": time.perf_counter() - started}
+        return reason_codes, stats
+
+def merge_rule_stats(stats: List[Dict[str, Dict[str, float]]]) -> Dict[str, Dict[str, float]]:
+    """Sums per-rule stats of several passes (shards, chunks)."""
+    merged: Dict[str, Dict[str, float]] = {}
+    for entry in stats:
+        for name, values in entry.items():
+            total = merged.setdefault(name, {"hits": 0, "seconds": 0.0})
+            total["hits"] += int(values["hits"])
+            total["seconds"] += values["seconds"]
+    for values in merged.values():
+        values["seconds"] = round(values["seconds"], 6)
+    return merged
+
+rule_engine = RuleEngine.from_file(RULES_FILE)
@@ -0,0 +1,40 @@
+from models.schemas import AnalysisResult
+from services.executor import DetectionExecutor
+from services.fraud_detection import FraudDetector, shard_bounds, _no_progress
+from starlette.concurrency import run_in_threadpool
+from typing import Callable, Optional
+import asyncio
+import numpy as np
+import os
+import pandas as pd
+
+# Datasets at least this large are split across the detection pool
+SHARDED_MIN_ROWS = int(os.environ.get("SUBSIGUARD_SHARDED_MIN_ROWS", 500_000))
+
+def should_shard(df: pd.DataFrame, executor: DetectionExecutor) -> bool:
+    return executor.max_workers > 1 and len(df) >= SHARDED_MIN_ROWS
+
+async def detect_fraud_sharded(detector: FraudDetector, executor: DetectionExecutor, file_id: str, df: pd.DataFrame, progress: Optional[Callable[[str, int], None]] = None, cross_file_aadhaar: Optional[np.ndarray] = None) -> AnalysisResult:
+    """
+    Map-reduce version of ``detector.detect_fraud`` over the executor's workers.
+
+    Pass 1 computes mergeable aggregates per shard (compact Aadhaar indexes and
+    blockwise Welford moments), pass 2 scores every shard against the merged
+    dataset-wide values. The result is identical to the single-process path.
+    """
+    progress = progress or _no_progress
+    shards = [df.iloc[start:stop] for start, stop in shard_bounds(len(df), executor.max_workers)]
+
+    progress("rules", 10)
+    partials = await asyncio.gather(*(executor.run(detector.compute_partials, shard) for shard in shards))
+    aggregates = detector.merge_partials(partials, cross_file_aadhaar)
+    # Medians do not merge: the stratified baseline is computed over the whole frame
+    aggregates["baseline"] = await run_in_threadpool(detector.robust_baseline, df)
+    # One forest for the whole dataset, shipped to every shard
+    aggregates["model"] = await run_in_threadpool(detector.fit_model, df, file_id)
+
+    progress("stats", 40)
+    scored = await asyncio.gather(*(executor.run(detector.score_shard, shard, aggregates) for shard in shards))
+
+    progress("aggregation", 60)
+    return await executor.run(detector.combine_shards, file_id, len(df), scored)
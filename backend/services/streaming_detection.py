@@ -0,0 +1,232 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import os
+import tempfile
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Union
+from models.schemas import AnalysisSummary, AnalysisReportDetails, FraudCase
+from services.aadhaar_index import aadhaar_uint64, find_duplicates
+from services.columnar_storage import ColumnarWriter
+from services.record_schema import read_records, to_frame
+from services.fraud_detection import FlaggedCases, FraudDetector, STAT_FEATURES, block_moments, combine_moments, moments_std
+from services.ml_engine import CATEGORICAL_FEATURES, NUMERIC_FEATURES, BottomKSample
+from services.robust_stats import RobustBaseline, StreamingBaseline
+from services.rule_engine import merge_rule_stats
+
+# A multiple of the moment block size, so streamed statistics match the in-memory path
+STREAM_CHUNK_ROWS = 4 * 65_536
+
+# Aadhaar keys are spilled to this many hash partitions; counting one partition
+# at a time needs roughly 1/STREAM_PARTITIONS of the keys in memory
+STREAM_PARTITIONS = 64
+
+# Uploads at least this large are analyzed out of core, straight from their
+# Arrow segments, with cases stored as they are found
+OUT_OF_CORE_MIN_ROWS = int(os.environ.get("SUBSIGUARD_OUT_OF_CORE_MIN_ROWS", 5_000_000))
+
+KEY_SCHEMA = pa.schema([("key", pa.uint64())])
+
+ChunkSource = Union[str, List[str], Iterable[pd.DataFrame]]
+
+def should_stream(total_rows: int) -> bool:
+    return total_rows >= OUT_OF_CORE_MIN_ROWS
+
+class OutOfCoreDetector:
+    """
+    Runs the detector over data larger than RAM in two bounded-memory passes.
+
+    ``source`` is a CSV, Parquet or Arrow IPC file path (or a list of Arrow
+    segment paths), or any iterable of DataFrame chunks. Pass 1 folds feature
+    moments and rule aggregates; duplicate rules spill normalized Aadhaar keys to
+    hash partitions on disk, which are then counted one partition at a time.
+    Pass 2 scores each chunk and yields its flagged cases (``detect_batches``:
+    as one columnar batch per chunk). ``summary``, ``report_details`` and
+    ``rule_stats`` are set once the cases have been consumed.
+    In stratified statistics mode pass 1 also spills every row's strata codes and
+    features to disk; exact medians are then selected from the spill (StreamingBaseline).
+    """
+
+    def __init__(self, detector: FraudDetector, chunksize: int = STREAM_CHUNK_ROWS, partitions: int = STREAM_PARTITIONS, spill_dir: Optional[str] = None):
+        self.detector = detector
+        self.chunksize = chunksize
+        self.partitions = partitions
+        self.spill_dir = spill_dir
+        self.summary: Optional[AnalysisSummary] = None
+        self.report_details: Optional[AnalysisReportDetails] = None
+        self.rule_stats: Optional[Dict[str, Dict[str, float]]] = None
+
+    def detect(self, source: ChunkSource, cross_file_aadhaar: Optional[np.ndarray] = None) -> Iterator[FraudCase]:
+        for batch in self.detect_batches(source, cross_file_aadhaar):
+            yield from batch.cases()
+
+    def detect_batches(self, source: ChunkSource, cross_file_aadhaar: Optional[np.ndarray] = None) -> Iterator[FlaggedCases]:
+        """Flagged cases of each chunk that has any, in row order. ``cross_file_aadhaar`` is as for detect_fraud."""
+        with tempfile.TemporaryDirectory(prefix="subsiguard_stream_", dir=self.spill_dir) as workdir:
+            # An iterator can only be read once: keep a columnar copy for pass 2
+            if not isinstance(source, (str, list)):
+                source = self._spill_chunks(source, os.path.join(workdir, "chunks.arrow"))
+
+            feature_stats, rule_aggregates, baseline, model = self._first_pass(source, workdir)
+            yield from self._second_pass(source, feature_stats, rule_aggregates, baseline, model, cross_file_aadhaar)
+
+    def _first_pass(self, source: ChunkSource, workdir: str):
+        moments: Dict[str, Dict[str, float]] = {}
+        # Stratified mode: exact medians of every row's features, from a spill on disk
+        spilled_baseline = None
+        if self.detector.stat_mode == "stratified" and self.detector.baseline is None:
+            spilled_baseline = StreamingBaseline(os.path.join(workdir, "baseline.arrow"), STAT_FEATURES)
+        # isolation_forest engine: uniform training sample of the whole stream
+        training_sample = BottomKSample(self.detector.ml_engine.fit_rows) if self.detector.engine == "isolation_forest" else None
+        # Duplicate rules spill their keys; other rules fold their (per-group) partials
+        rules = self.detector.rules.rules
+        duplicate_rules = [rule for rule in rules if rule.kind == "duplicate"]
+        folded: Dict[str, Any] = {}
+        key_writers = {rule.name: [None] * self.partitions for rule in duplicate_rules}
+        paths = {
+            rule.name: [os.path.join(workdir, f"keys-{rule.name}-{i}.arrow") for i in range(self.partitions)]
+            for rule in duplicate_rules
+        }
+
+        try:
+            for chunk in self._read_chunks(source):
+                for feature in STAT_FEATURES:
+                    if feature in chunk.columns:
+                        values = pd.to_numeric(chunk[feature], errors='coerce').fillna(0).to_numpy(dtype=float)
+                        blocks = ([moments[feature]] if feature in moments else []) + block_moments(values)
+                        moments[feature] = combine_moments(blocks)
+                if spilled_baseline is not None:
+                    spilled_baseline.add(chunk)
+                if training_sample is not None:
+                    training_sample.add(chunk[[column for column in NUMERIC_FEATURES + CATEGORICAL_FEATURES if column in chunk.columns]])
+
+                for rule in rules:
+                    if not all(column in chunk.columns for column in rule.columns()):
+                        continue
+                    if rule.kind != "duplicate":
+                        folded[rule.name] = rule.combine([folded.get(rule.name), rule.partial(chunk)])
+                        continue
+                    keys, valid = aadhaar_uint64(chunk[rule.column])
+                    keys = keys[valid]
+                    writers = key_writers[rule.name]
+                    partition_ids = keys % np.uint64(self.partitions)
+                    for partition in np.unique(partition_ids):
+                        if writers[partition] is None:
+                            writers[partition] = pa.ipc.new_stream(paths[rule.name][partition], KEY_SCHEMA)
+                        writers[partition].write_table(pa.table({"key": pa.array(keys[partition_ids == partition], type=pa.uint64())}))
+        finally:
+            for writers in key_writers.values():
+                for writer in writers:
+                    if writer is not None:
+                        writer.close()
+
+        rule_aggregates = {rule.name: rule.finalize(folded.get(rule.name)) for rule in rules if rule.kind != "duplicate"}
+        for rule in duplicate_rules:
+            # Count one partition at a time; only the duplicated keys are kept
+            duplicate_keys: List[np.ndarray] = []
+            for partition, path in enumerate(paths[rule.name]):
+                if key_writers[rule.name][partition] is None:
+                    continue
+                with pa.memory_map(path, "r") as spill:
+                    keys = pa.ipc.open_stream(spill).read_all().column("key").to_numpy()
+                duplicate_keys.append(find_duplicates(keys))
+                os.remove(path)
+            rule_aggregates[rule.name] = np.sort(np.concatenate(duplicate_keys)) if duplicate_keys else np.empty(0, dtype=np.uint64)
+
+        feature_stats = {feature: (m["mean"], moments_std(m)) for feature, m in moments.items()}
+        baseline = spilled_baseline.baseline() if spilled_baseline is not None else self.detector.robust_baseline(pd.DataFrame())
+        model = self.detector.fit_model(training_sample.frame()) if training_sample is not None else None
+        return feature_stats, self.detector.with_reference_duplicates(rule_aggregates), baseline, model
+
+    def _second_pass(self, source: ChunkSource, feature_stats, rule_aggregates: Dict[str, Any], baseline: Optional[RobustBaseline], model: Any = None, cross_file_aadhaar: Optional[np.ndarray] = None) -> Iterator[FlaggedCases]:
+        total_records = 0
+        flagged_count = 0
+        total_leakage_amount = 0.0
+        total_risk_score = 0
+        state_counts: Dict[Any, int] = {}
+        rule_stats: List[Dict[str, Dict[str, float]]] = []
+
+        for chunk in self._read_chunks(source):
+            chunk.index = pd.RangeIndex(total_records, total_records + len(chunk))
+            total_records += len(chunk)
+
+            reason_codes, scores, chunk_stats = self.detector._score_rows(
+                chunk, feature_stats=feature_stats, rule_aggregates=rule_aggregates, cross_file_aadhaar=cross_file_aadhaar,
+                baseline=baseline, model=model
+            )
+            rule_stats.append(chunk_stats)
+
+            flagged = np.flatnonzero(reason_codes)
+            if len(flagged) == 0:
+                continue
+            flagged_rows = chunk.iloc[flagged]
+            risk_scores = self.detector._risk_scores(scores[flagged])
+
+            flagged_count += len(flagged)
+            total_risk_score += int(risk_scores.sum())
+            if 'amount' in flagged_rows.columns:
+                # Continue the running total left to right, as the in-memory path does
+                amounts = flagged_rows['amount'].to_numpy()
+                total_leakage_amount = self.detector._running_total(np.concatenate([[total_leakage_amount], amounts]))
+            if 'state' in flagged_rows.columns:
+                for state_name, count in flagged_rows['state'].value_counts().items():
+                    if count:
+                        state_counts[state_name] = state_counts.get(state_name, 0) + int(count)
+
+            yield FlaggedCases.from_rows(flagged_rows, reason_codes[flagged], risk_scores, self.detector.fraud_reasons)
+
+        top_risk_state = max(state_counts, key=state_counts.get) if state_counts else "N/A"
+        average_risk_score = int(total_risk_score / flagged_count) if flagged_count > 0 else 0
+        self.summary = AnalysisSummary(
+            total_leakage_amount=round(total_leakage_amount, 2),
+            flagged_count=flagged_count,
+            total_records=total_records,
+            average_risk_score=average_risk_score,
+            top_risk_state=top_risk_state
+        )
+        self.report_details = self.detector._generate_report_details(flagged_count, total_records, total_leakage_amount, top_risk_state)
+        self.rule_stats = merge_rule_stats(rule_stats)
+
+    def _read_chunks(self, source: ChunkSource) -> Iterator[pd.DataFrame]:
+        if isinstance(source, list) or source.endswith((".arrow", ".feather", ".ipc")):
+            paths = source if isinstance(source, list) else [source]
+            tables = []
+            for path in paths:
+                with pa.memory_map(path, "r") as mapped:
+                    tables.append(pa.ipc.open_file(mapped).read_all())
+            # Memory-mapped: only the slice being converted is materialized
+            table = pa.concat_tables(tables)
+            for offset in range(0, table.num_rows, self.chunksize):
+                yield to_frame(table.slice(offset, self.chunksize))
+        elif source.endswith(".parquet"):
+            import pyarrow.parquet as pq
+            for batch in pq.ParquetFile(source).iter_batches(batch_size=self.chunksize):
+                yield batch.to_pandas()
+        else:
+            # Declared column types; unparseable rows are skipped
+            with open(source, "rb") as f:
+                yield from self._rechunk(read_records(f))
+
+    def _rechunk(self, frames: Iterable[pd.DataFrame]) -> Iterator[pd.DataFrame]:
+        # Parsed CSV blocks vary in size; chunks must keep the fixed ``chunksize``
+        pending: List[pd.DataFrame] = []
+        rows = 0
+        for frame in frames:
+            pending.append(frame)
+            rows += len(frame)
+            while rows >= self.chunksize:
+                merged = pd.concat(pending, ignore_index=True) if len(pending) > 1 else pending[0]
+                yield merged.iloc[:self.chunksize]
+                pending = [merged.iloc[self.chunksize:]]
+                rows = len(pending[0])
+        if rows:
+            yield pd.concat(pending, ignore_index=True)
+
+    def _spill_chunks(self, chunks: Iterable[pd.DataFrame], path: str) -> str:
+        writer = ColumnarWriter(path)
+        try:
+            for chunk in chunks:
+                writer.write(chunk)
+            return writer.close()
+        except BaseException:
+            writer.abort()
+            raise
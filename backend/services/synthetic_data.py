@@ -1,7 +1,10 @@
 from faker import Faker
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 import random
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterator, Optional
 
 fake = Faker('en_IN')
 
@@ -86,3 +89,136 @@ def generate_synthetic_data(num_rows: int = 100) -> List[Dict[str, Any]]:
     # Shuffle data
     random.shuffle(data)
     return data[:num_rows + num_fraud] # Ensure we return requested rows + fraud injection
+
+# --- Bulk generation (load tests) ---
+# Columns are sampled as NumPy arrays; Faker only fills fixed pools of names and
+# cities once per generator, so cost per row is a few array lookups.
+
+# Share of rows carrying each injected fraud pattern (the ``fraud_type`` label)
+DEFAULT_FRAUD_RATES = {
+    "duplicate_aadhaar": 0.033, # same Aadhaar as an earlier row, different name
+    "ineligible": 0.033,        # high income and unusually high amount
+    "collusion": 0.033          # many claims through one FRAUD-DIST-* distributor on one day
+}
+
+# Claims per injected collusion ring (one distributor, one day)
+COLLUSION_RING_SIZE = 40
+
+# Claims fall in the year before this date; fixed so a seed always gives the same data
+BULK_END_DATE = "2025-03-31"
+
+BULK_CHUNK_ROWS = 1_000_000
+
+_HEX = np.array([f"{i:02x}" for i in range(256)], dtype="S2")
+
+class SyntheticGenerator:
+    """
+    Seedable NumPy generator of synthetic claims with ground-truth labels.
+    Chunk ``i`` depends only on (seed, i), so output is reproducible chunk by chunk.
+    """
+
+    def __init__(self, seed: int = 0, fraud_rates: Optional[Dict[str, float]] = None, pool_size: int = 5_000, end_date: str = BULK_END_DATE):
+        self.seed = seed
+        self.fraud_rates = {**DEFAULT_FRAUD_RATES, **(fraud_rates or {})}
+        unknown = set(self.fraud_rates) - set(DEFAULT_FRAUD_RATES)
+        if unknown:
+            raise ValueError(f"Unknown fraud patterns: {sorted(unknown)}")
+        if sum(self.fraud_rates.values()) > 1:
+            raise ValueError("Fraud rates must add up to at most 1")
+
+        pool_fake = Faker('en_IN')
+        pool_fake.seed_instance(seed)
+        self.names = np.array([pool_fake.name() for _ in range(pool_size)], dtype=object)
+        self.cities = np.array([pool_fake.city() for _ in range(pool_size)], dtype=object)
+        self.distributors = np.array([f"DIST-{i}" for i in range(10_000)], dtype=object)
+        days = np.arange(np.datetime64(end_date) - np.timedelta64(365, 'D'), np.datetime64(end_date) + np.timedelta64(1, 'D'))
+        self.dates = np.datetime_as_string(days).astype(object)
+
+    def chunk(self, rows: int, index: int = 0) -> pd.DataFrame:
+        rng = np.random.default_rng([self.seed, index])
+
+        # 16 random bytes per row, written as 32 hex digits
+        ids = _HEX[rng.integers(0, 256, size=(rows, 16), dtype=np.uint8)].view("S32").ravel().astype(str)
+        df = pd.DataFrame({
+            "beneficiary_id": ids,
+            "aadhaar": rng.integers(10 ** 11, 10 ** 12, size=rows, dtype=np.int64),
+            "name": self.names[rng.integers(0, len(self.names), size=rows)],
+            "state": pd.Categorical.from_codes(rng.integers(0, len(INDIAN_STATES), size=rows), categories=INDIAN_STATES),
+            "district": self.cities[rng.integers(0, len(self.cities), size=rows)],
+            "subsidy_type": pd.Categorical.from_codes(rng.integers(0, len(SUBSIDY_TYPES), size=rows), categories=SUBSIDY_TYPES),
+            "amount": rng.uniform(1000, 50000, size=rows).round(2),
+            "income": rng.uniform(50000, 1000000, size=rows).round(2),
+            "distributor_id": self.distributors[rng.integers(0, len(self.distributors), size=rows)],
+            "claim_date": self.dates[rng.integers(0, len(self.dates), size=rows)],
+            "fraud_type": pd.Categorical.from_codes(np.full(rows, -1), categories=list(DEFAULT_FRAUD_RATES))
+        })
+
+        # Disjoint random positions per pattern: no shuffle needed afterwards
+        positions = rng.permutation(rows)
+        counts = {pattern: int(rows * rate) for pattern, rate in self.fraud_rates.items()}
+        offsets = np.cumsum([0] + list(counts.values()))
+        picked = {pattern: positions[offsets[i]:offsets[i + 1]] for i, pattern in enumerate(counts)}
+        clean = positions[offsets[-1]:]
+
+        duplicates = picked["duplicate_aadhaar"]
+        if len(duplicates) and len(clean):
+            # Identity theft: copy an untouched row, then change name and amount
+            sources = clean[rng.integers(0, len(clean), size=len(duplicates))]
+            for column in ["aadhaar", "state", "district", "subsidy_type", "income", "distributor_id", "claim_date"]:
+                df.iloc[duplicates, df.columns.get_loc(column)] = df[column].iloc[sources].array
+
+        ineligible = picked["ineligible"]
+        df.loc[ineligible, "amount"] = rng.uniform(80000, 150000, size=len(ineligible)).round(2)
+        df.loc[ineligible, "income"] = rng.uniform(1500000, 5000000, size=len(ineligible)).round(2)
+
+        collusion = picked["collusion"]
+        if len(collusion):
+            rings = max(1, len(collusion) // COLLUSION_RING_SIZE)
+            ring = rng.integers(0, rings, size=len(collusion))
+            ring_distributors = np.array([f"FRAUD-DIST-{index}-{i}" for i in range(rings)], dtype=object)
+            # Each ring claims on one day in the last month
+            ring_dates = self.dates[-30:][rng.integers(0, 30, size=rings)]
+            df.loc[collusion, "distributor_id"] = ring_distributors[ring]
+            df.loc[collusion, "claim_date"] = ring_dates[ring]
+            df.loc[collusion, "amount"] = rng.uniform(5000, 20000, size=len(collusion)).round(2)
+            df.loc[collusion, "income"] = rng.uniform(50000, 300000, size=len(collusion)).round(2)
+
+        for pattern, rows_picked in picked.items():
+            df.loc[rows_picked, "fraud_type"] = pattern
+        return df
+
+    def chunks(self, rows: int, chunk_rows: int = BULK_CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+        for index, start in enumerate(range(0, rows, chunk_rows)):
+            chunk = self.chunk(min(chunk_rows, rows - start), index)
+            chunk.index = pd.RangeIndex(start, start + len(chunk))
+            yield chunk
+
+def write_synthetic(path: str, rows: int, seed: int = 0, fraud_rates: Optional[Dict[str, float]] = None, chunk_rows: int = BULK_CHUNK_ROWS, labels: bool = True) -> Dict[str, int]:
+    """
+    Writes ``rows`` synthetic claims to a CSV or Parquet file (by extension), one
+    chunk at a time. The ``fraud_type`` label column is kept unless ``labels`` is
+    False. Returns the number of rows per label ("clean" for unlabelled rows).
+    """
+    generator = SyntheticGenerator(seed, fraud_rates)
+    label_counts: Dict[str, int] = {}
+    parquet_writer = None
+    try:
+        for i, chunk in enumerate(generator.chunks(rows, chunk_rows)):
+            for label, count in chunk["fraud_type"].value_counts(dropna=False).items():
+                label = "clean" if pd.isna(label) else label
+                label_counts[label] = label_counts.get(label, 0) + int(count)
+            if not labels:
+                chunk = chunk.drop(columns=["fraud_type"])
+
+            if path.endswith(".parquet"):
+                # Later chunks are cast to the first chunk's schema
+                table = pa.Table.from_pandas(chunk, schema=parquet_writer.schema if parquet_writer else None, preserve_index=False)
+                if parquet_writer is None:
+                    parquet_writer = pq.ParquetWriter(path, table.schema)
+                parquet_writer.write_table(table)
+            else:
+                chunk.to_csv(path, mode="w" if i == 0 else "a", header=i == 0, index=False)
+    finally:
+        if parquet_writer is not None:
+            parquet_writer.close()
+    return label_counts
@@ -0,0 +1,16 @@
+import os
+import pytest
+import tempfile
+
+# Set before any app module is imported: data files and the database of a test
+# run live in a temporary directory, never in ./data_store or ./subsiguard.db
+_workdir = tempfile.mkdtemp(prefix="subsiguard_tests_")
+os.environ.setdefault("SUBSIGUARD_DATA_DIR", os.path.join(_workdir, "data"))
+os.environ.setdefault("SUBSIGUARD_DATABASE_URL", f"sqlite+aiosqlite:///{os.path.join(_workdir, 'subsiguard.db')}")
+os.environ.setdefault("SUBSIGUARD_EXECUTOR", "thread")
+
+SAMPLE_DATA_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "data")
+
+@pytest.fixture(scope="session")
+def large_csv() -> str:
+    return os.path.join(SAMPLE_DATA_DIR, "large_subsidy_data.csv")
@@ -0,0 +1,71 @@
+import multiprocessing
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from services import aadhaar_index
+from services.aadhaar_index import AadhaarIndex, AadhaarIndexStore, aadhaar_uint64
+
+def test_leading_zeros_keep_numbers_apart():
+    keys, valid = aadhaar_uint64(pd.Series(["012345678901", "12345678901", "0012345678901", "0123 4567 8901"]))
+    assert valid.all()
+    assert len(set(keys[:3].tolist())) == 3
+    assert keys[3] == keys[0]
+
+def test_numeric_and_text_values_share_keys():
+    text, _ = aadhaar_uint64(pd.Series(["123456789012", "987654321098"]))
+    integers, _ = aadhaar_uint64(pd.Series([123456789012, 987654321098]))
+    floats, _ = aadhaar_uint64(pd.Series([123456789012.0, 987654321098.0, None]))
+    np.testing.assert_array_equal(text, integers)
+    np.testing.assert_array_equal(text, floats[:2])
+
+UPLOADS_PER_WORKER = 12
+WORKERS = 4
+
+def _upload_index(worker: int, upload: int) -> AadhaarIndex:
+    # Overlapping key ranges, so workers update the same corpus keys
+    rng = np.random.default_rng([worker, upload])
+    keys, counts = np.unique(rng.integers(10 ** 11, 10 ** 11 + 500, size=200).astype(np.uint64), return_counts=True)
+    return AadhaarIndex(keys, counts.astype(np.uint32))
+
+def _add_uploads(index_dir: str, worker: int) -> None:
+    store = AadhaarIndexStore(index_dir)
+    for upload in range(UPLOADS_PER_WORKER):
+        store.add(f"w{worker}-{upload}", _upload_index(worker, upload))
+
+@pytest.mark.skipif(aadhaar_index.fcntl is None or "fork" not in multiprocessing.get_all_start_methods(), reason="needs flock and fork")
+def test_concurrent_processes_lose_no_claims(tmp_path, monkeypatch):
+    monkeypatch.setattr(aadhaar_index, "CORPUS_COMPACT_SEGMENTS", 5)
+    context = multiprocessing.get_context("fork")
+    workers = [context.Process(target=_add_uploads, args=(str(tmp_path), worker)) for worker in range(WORKERS)]
+    for process in workers:
+        process.start()
+    for process in workers:
+        process.join()
+        assert process.exitcode == 0
+
+    expected = AadhaarIndex.combine(
+        _upload_index(worker, upload) for worker in range(WORKERS) for upload in range(UPLOADS_PER_WORKER)
+    )
+    corpus = AadhaarIndexStore(str(tmp_path)).load_corpus()
+    np.testing.assert_array_equal(corpus.keys, expected.keys)
+    np.testing.assert_array_equal(corpus.counts, expected.counts)
+
+def test_compaction_keeps_counts_and_drops_segments(tmp_path, monkeypatch):
+    monkeypatch.setattr(aadhaar_index, "CORPUS_COMPACT_SEGMENTS", 3)
+    store = AadhaarIndexStore(str(tmp_path))
+    indexes = [_upload_index(0, upload) for upload in range(7)]
+    for upload, index in enumerate(indexes):
+        store.add(f"u{upload}", index)
+
+    # Two compactions (generations 1 and 2) plus one pending delta
+    segments = sorted(name.split(".delta.")[0] for name in os.listdir(tmp_path) if name.startswith("corpus."))
+    assert segments == ["corpus.2", "corpus.2.npy"]
+    expected = AadhaarIndex.combine(indexes)
+    np.testing.assert_array_equal(store.load_corpus().counts, expected.counts)
+
+    # u0's keys are claimed by the other uploads too
+    assert len(store.claimed_elsewhere("u0")) > 0
+    assert len(AadhaarIndexStore(str(tmp_path / "empty")).claimed_elsewhere("u0")) == 0
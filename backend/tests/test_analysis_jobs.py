@@ -0,0 +1,71 @@
+import asyncio
+import io
+from datetime import datetime, timedelta, timezone
+
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+
+from api.database import async_session_factory, init_db
+from main import app
+from models.schemas import AnalysisJob
+from services import streaming_detection
+from services.aadhaar_index import aadhaar_index_store
+from services.analysis_jobs import AnalysisJobService, JOB_STALE_SECONDS, WORKER_ID
+from services.fraud_detection import FraudDetector
+from services.record_schema import read_records
+from services.streaming_detection import OutOfCoreDetector
+from test_incremental_analysis import _all_cases, _wait
+
+def test_recover_reclaims_only_stale_jobs():
+    async def scenario():
+        await init_db()
+        now = datetime.now(timezone.utc)
+        stale = now - timedelta(seconds=JOB_STALE_SECONDS * 2)
+        jobs = {
+            "live_other_worker": AnalysisJob(file_id="f1", status="running", owner="other:1:abcd", heartbeat_at=now),
+            "dead_other_worker": AnalysisJob(file_id="f2", status="running", owner="other:2:abcd", heartbeat_at=stale),
+            "never_started": AnalysisJob(file_id="f3", status="queued", owner=WORKER_ID),
+        }
+        async with async_session_factory() as session:
+            session.add_all(jobs.values())
+            await session.commit()
+
+        service = AnalysisJobService()
+        await service.recover()
+
+        async with async_session_factory() as session:
+            return {name: (await service.get(session, job.id)).status for name, job in jobs.items()}
+
+    statuses = asyncio.run(scenario())
+    assert statuses == {"live_other_worker": "running", "dead_other_worker": "failed", "never_started": "failed"}
+
+def test_large_uploads_are_analyzed_out_of_core(large_csv, monkeypatch):
+    streamed = []
+    detect_batches = OutOfCoreDetector.detect_batches
+    def spy(self, source, cross_file_aadhaar=None):
+        streamed.append(source)
+        return detect_batches(self, source, cross_file_aadhaar)
+    monkeypatch.setattr(OutOfCoreDetector, "detect_batches", spy)
+    monkeypatch.setattr(streaming_detection, "OUT_OF_CORE_MIN_ROWS", 0)
+
+    with open(large_csv, "rb") as f:
+        content = f.read()
+    with TestClient(app) as client:
+        file_id = client.post("/upload", files={"file": ("large.csv", content, "text/csv")}).json()["file_id"]
+        job = client.post("/analyze", json={"file_id": file_id}).json()
+        assert _wait(client, job["job_id"])["status"] == "completed"
+        result = client.get(f"/results/{file_id}", params={"limit": 1}).json()
+        cases = _all_cases(client, file_id)
+        by_scheme = client.get(f"/results/{file_id}/breakdown").json()["by_scheme"]
+    assert streamed
+
+    df = pd.concat(list(read_records(io.BytesIO(content))), ignore_index=True)
+    full = FraudDetector().detect_fraud(file_id, df, cross_file_aadhaar=aadhaar_index_store.claimed_elsewhere(file_id))
+    assert result["summary"]["flagged_count"] == full.summary.flagged_count
+    assert result["summary"]["total_leakage_amount"] == pytest.approx(full.summary.total_leakage_amount)
+    assert cases == {case.id: sorted(case.fraud_reasons) for case in full.flagged.cases()}
+    # Summed over the streamed batches
+    expected = full.flagged.frame.groupby("scheme")["amount"].agg(["size", "sum"])
+    assert {row["value"]: row["flagged_count"] for row in by_scheme} == expected["size"].to_dict()
+    assert {row["value"]: row["leakage_amount"] for row in by_scheme} == pytest.approx(expected["sum"].to_dict())
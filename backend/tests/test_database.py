@@ -0,0 +1,46 @@
+from sqlalchemy import create_engine, inspect, text
+from sqlmodel import SQLModel
+from api.database import add_missing_columns
+
+# Tables as the first release created them
+LEGACY_SCHEMA = [
+    "CREATE TABLE uploadedfile (id VARCHAR NOT NULL, filename VARCHAR NOT NULL, upload_date DATETIME NOT NULL, data JSON, PRIMARY KEY (id))",
+    "CREATE TABLE analysisresultdb (id VARCHAR NOT NULL, file_id VARCHAR NOT NULL, result JSON, created_at DATETIME NOT NULL, PRIMARY KEY (id), FOREIGN KEY(file_id) REFERENCES uploadedfile (id))",
+]
+
+def test_add_missing_columns_upgrades_legacy_tables():
+    engine = create_engine("sqlite://")
+    with engine.begin() as connection:
+        for ddl in LEGACY_SCHEMA:
+            connection.execute(text(ddl))
+        connection.execute(text("INSERT INTO uploadedfile (id, filename, upload_date, data) VALUES ('f1', 'old.csv', '2025-01-01', '{\"records\": []}')"))
+
+        added = add_missing_columns(connection)
+        assert {"uploadedfile.total_rows", "uploadedfile.content_hash", "uploadedfile.storage_path",
+                "analysisresultdb.cache_key", "analysisresultdb.detector_version", "analysisresultdb.detector_config"} <= set(added)
+
+        # Existing rows take the model default; new indexes exist
+        assert connection.execute(text("SELECT total_rows, content_hash FROM uploadedfile")).one() == (0, None)
+        indexes = {index["name"] for index in inspect(connection).get_indexes("uploadedfile")}
+        assert "ix_uploadedfile_content_hash" in indexes
+
+        # Running it again is a no-op
+        assert add_missing_columns(connection) == []
+
+def test_add_missing_columns_makes_content_hash_unique():
+    engine = create_engine("sqlite://")
+    with engine.begin() as connection:
+        SQLModel.metadata.create_all(connection)
+        # As created while the hash index was not unique, with one file uploaded twice
+        connection.execute(text("DROP INDEX ix_uploadedfile_content_hash"))
+        connection.execute(text("CREATE INDEX ix_uploadedfile_content_hash ON uploadedfile (content_hash)"))
+        for file_id, content_hash in [("f1", "a"), ("f2", "a"), ("f3", "b"), ("f4", None)]:
+            connection.execute(text(
+                "INSERT INTO uploadedfile (id, filename, upload_date, total_rows, content_hash) VALUES (:id, 'x.csv', '2025-01-01', 0, :hash)"
+            ), {"id": file_id, "hash": content_hash})
+
+        assert add_missing_columns(connection) == []
+        indexes = {index["name"]: index["unique"] for index in inspect(connection).get_indexes("uploadedfile")}
+        assert indexes["ix_uploadedfile_content_hash"]
+        hashes = dict(connection.execute(text("SELECT id, content_hash FROM uploadedfile")).all())
+        assert hashes == {"f1": "a", "f2": None, "f3": "b", "f4": None}
@@ -0,0 +1,151 @@
+import asyncio
+import pandas as pd
+import pytest
+from typing import Any, Dict, List
+from services import fraud_detection
+from services.executor import DetectionExecutor
+from services.fraud_detection import FraudDetector, STATISTICAL_ANOMALY, shard_bounds
+from services.record_schema import read_records
+from services.rule_engine import DEFAULT_RULES, RuleEngine
+from services.sharded_detection import detect_fraud_sharded
+from services.streaming_detection import OutOfCoreDetector
+
+# --- Frozen copy of the original iterrows detector (the regression reference) ---
+
+def reference_detect(df: pd.DataFrame) -> Dict[str, Any]:
+    aadhaar_counts = df['aadhaar'].value_counts() if 'aadhaar' in df.columns else {}
+    rule_flags: Dict[int, List[str]] = {}
+    for idx, row in df.iterrows():
+        reasons = []
+        if 'aadhaar' in row and aadhaar_counts.get(row['aadhaar'], 0) > 1:
+            reasons.append("Duplicate Aadhaar Number")
+        try:
+            if float(row.get('income', 0)) > 250000:
+                reasons.append("Income exceeds threshold (₹2.5L)")
+        except ValueError:
+            pass
+        try:
+            if float(row.get('amount', 0)) > 50000:
+                reasons.append("Unusually high claim amount (>₹50k)")
+        except ValueError:
+            pass
+        if reasons:
+            rule_flags[idx] = reasons
+
+    flags = pd.Series(0, index=df.index)
+    scores = pd.Series(0.0, index=df.index)
+    for feature in ['amount', 'income']:
+        if feature not in df.columns:
+            continue
+        series = pd.to_numeric(df[feature], errors='coerce').fillna(0)
+        mean, std = series.mean(), series.std()
+        if std == 0:
+            continue
+        z_scores = (series - mean) / std
+        flags = flags | (z_scores.abs() > 3).astype(int)
+        scores = pd.concat([scores, (z_scores.abs() / 5).clip(0, 1)], axis=1).max(axis=1)
+
+    cases = []
+    total_leakage_amount = 0.0
+    total_risk_score = 0
+    flagged_states = []
+    for idx, row in df.iterrows():
+        reasons = rule_flags.get(idx, [])
+        if flags[idx] == 1:
+            reasons.append(STATISTICAL_ANOMALY)
+        if not reasons:
+            continue
+        risk_score = int(max(0.0, min(1.0, scores[idx])) * 100)
+        cases.append({"id": str(idx), "amount": row.get('amount', 0.0), "risk_score": risk_score, "fraud_reasons": reasons})
+        total_leakage_amount += row.get('amount', 0.0)
+        total_risk_score += risk_score
+        flagged_states.append(row.get('state'))
+
+    flagged_count = len(cases)
+    return {
+        "summary": {
+            "total_leakage_amount": round(total_leakage_amount, 2),
+            "flagged_count": flagged_count,
+            "total_records": len(df),
+            "average_risk_score": int(total_risk_score / flagged_count) if flagged_count > 0 else 0,
+            "top_risk_state": pd.Series(flagged_states).value_counts().idxmax() if flagged_count > 0 else "N/A"
+        },
+        "cases": cases
+    }
+
+# The rules the original detector had, in its reason order
+ORIGINAL_RULES = [rule for rule in DEFAULT_RULES if rule["name"] in ("duplicate_aadhaar", "high_income", "high_amount")]
+
+@pytest.fixture(scope="module")
+def large_df(large_csv: str) -> pd.DataFrame:
+    return pd.read_csv(large_csv)
+
+@pytest.fixture(scope="module")
+def reference(large_df: pd.DataFrame) -> Dict[str, Any]:
+    return reference_detect(large_df)
+
+def assert_matches_reference(result, reference: Dict[str, Any]) -> None:
+    assert result.summary.model_dump() == reference["summary"]
+    cases = [
+        {"id": case.id, "amount": case.amount, "risk_score": case.risk_score, "fraud_reasons": case.fraud_reasons}
+        for case in result.flagged.cases()
+    ]
+    assert [case["id"] for case in cases] == [case["id"] for case in reference["cases"]]
+    assert cases == reference["cases"]
+
+def test_matches_original_detector(large_df, reference):
+    detector = FraudDetector(rules=RuleEngine(ORIGINAL_RULES), stat_mode="global", engine="zscore")
+    assert reference["summary"]["flagged_count"] > 0
+    assert_matches_reference(detector.detect_fraud("regression", large_df), reference)
+
+def test_matches_original_detector_on_declared_schema(large_csv, reference):
+    # Uploads are parsed with the declared column types (Aadhaar as text)
+    with open(large_csv, "rb") as f:
+        df = pd.concat(list(read_records(f)), ignore_index=True)
+    detector = FraudDetector(rules=RuleEngine(ORIGINAL_RULES), stat_mode="global", engine="zscore")
+    assert_matches_reference(detector.detect_fraud("regression", df), reference)
+
+# Parity of the map-reduce and out-of-core paths with detect_fraud. Small moment
+# blocks split the sample data into several shards/chunks; both paths and the
+# in-memory reference then merge statistics over the same blocks.
+PARITY_BLOCK_ROWS = 1024
+
+@pytest.fixture
+def small_blocks(monkeypatch):
+    monkeypatch.setattr(fraud_detection, "STAT_BLOCK_ROWS", PARITY_BLOCK_ROWS)
+
+@pytest.fixture
+def declared_df(large_csv: str) -> pd.DataFrame:
+    with open(large_csv, "rb") as f:
+        return pd.concat(list(read_records(f)), ignore_index=True)
+
+def result_fields(summary, rule_stats, cases) -> Dict[str, Any]:
+    return {
+        "summary": summary.model_dump(),
+        "hits": {name: stats["hits"] for name, stats in rule_stats.items()},
+        "cases": [case.model_dump() for case in cases]
+    }
+
+@pytest.mark.parametrize("stat_mode", ["global", "stratified"])
+def test_sharded_matches_detect_fraud(small_blocks, declared_df, stat_mode):
+    detector = FraudDetector(stat_mode=stat_mode, engine="zscore")
+    expected = detector.detect_fraud("parity", declared_df)
+    executor = DetectionExecutor("thread", max_workers=4)
+    try:
+        assert len(shard_bounds(len(declared_df), executor.max_workers)) > 1
+        result = asyncio.run(detect_fraud_sharded(detector, executor, "parity", declared_df))
+    finally:
+        executor.shutdown()
+    assert result_fields(result.summary, result.rule_stats, result.flagged.cases()) == \
+        result_fields(expected.summary, expected.rule_stats, expected.flagged.cases())
+    # Counts stay integers in the serialized result
+    assert {type(stats["hits"]) for stats in result.model_dump(mode="json")["rule_stats"].values()} == {int}
+
+@pytest.mark.parametrize("stat_mode", ["global", "stratified"])
+def test_out_of_core_matches_detect_fraud(small_blocks, declared_df, large_csv, tmp_path, stat_mode):
+    detector = FraudDetector(stat_mode=stat_mode, engine="zscore")
+    expected = detector.detect_fraud("parity", declared_df)
+    streaming = OutOfCoreDetector(detector, chunksize=2 * PARITY_BLOCK_ROWS, partitions=4, spill_dir=str(tmp_path))
+    cases = list(streaming.detect(large_csv))
+    assert result_fields(streaming.summary, streaming.rule_stats, cases) == \
+        result_fields(expected.summary, expected.rule_stats, expected.flagged.cases())
@@ -0,0 +1,96 @@
+import io
+import time
+
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+
+from main import app
+from services.aadhaar_index import aadhaar_index_store
+from services.fraud_detection import STAT_FEATURES, Z_SCORE_CAP, FraudDetector
+from services.record_schema import read_records
+
+BATCHES = 3
+BATCH_ROWS = 40
+
+def _csv(header: bytes, lines: list) -> bytes:
+    return b"\n".join([header] + lines) + b"\n"
+
+def _wait(client: TestClient, job_id: str) -> dict:
+    for _ in range(600):
+        job = client.get(f"/jobs/{job_id}").json()
+        if job["status"] in ("completed", "failed"):
+            return job
+        time.sleep(0.1)
+    pytest.fail(f"Job {job_id} did not finish")
+
+def _case_list(client: TestClient, file_id: str) -> list:
+    page = client.get(f"/results/{file_id}", params={"limit": 1000}).json()
+    cases, cursor = page["cases"], page["next_cursor"]
+    while cursor:
+        page = client.get(f"/results/{file_id}/cases", params={"limit": 1000, "cursor": cursor}).json()
+        cases += page["cases"]
+        cursor = page["next_cursor"]
+    return cases
+
+def _all_cases(client: TestClient, file_id: str) -> dict:
+    return {case["id"]: sorted(case["fraud_reasons"]) for case in _case_list(client, file_id)}
+
+def _stale_score_bound(df: pd.DataFrame, prefix_lengths: list) -> int:
+    # Documented in FraudDetector.detect_delta: the most an earlier row's risk
+    # score can be off by, given the statistics it may have been scored with
+    drift = 0.0
+    for feature in STAT_FEATURES:
+        values = pd.to_numeric(df[feature], errors="coerce").fillna(0)
+        mean, std = values.mean(), values.std()
+        for length in prefix_lengths:
+            prefix = values.iloc[:length]
+            drift = max(drift, (abs(prefix.std() - std) + abs(prefix.mean() - mean) / Z_SCORE_CAP) / std)
+    return int(100 * drift) + 1
+
+def test_appends_match_full_reanalysis(large_csv):
+    with open(large_csv, "rb") as f:
+        header, *body = [line for line in f.read().split(b"\n") if line]
+    base, appended = body[:-BATCHES * BATCH_ROWS], body[-BATCHES * BATCH_ROWS:]
+    batches = [appended[i:i + BATCH_ROWS] for i in range(0, len(appended), BATCH_ROWS)]
+    # Repeats an earlier high-income Aadhaar: that earlier row becomes a duplicate
+    income = header.split(b",").index(b"income")
+    batches[0].append(next(line for line in base if float(line.split(b",")[income]) > 250000))
+
+    with TestClient(app) as client:
+        file_id = client.post("/upload", files={"file": ("base.csv", _csv(header, base), "text/csv")}).json()["file_id"]
+        job = client.post("/analyze", json={"file_id": file_id}).json()
+        assert _wait(client, job["job_id"])["status"] == "completed"
+
+        for batch in batches:
+            response = client.post(f"/upload/{file_id}/append", files={"file": ("batch.csv", _csv(header, batch), "text/csv")})
+            assert response.status_code == 200, response.text
+        incremental = client.get(f"/results/{file_id}", params={"limit": 1}).json()
+        incremental_cases = _case_list(client, file_id)
+
+    combined = _csv(header, base + [line for batch in batches for line in batch])
+    df = pd.concat(list(read_records(io.BytesIO(combined))), ignore_index=True)
+    # Other tests' uploads share these Aadhaars: count them as the analysis did
+    full = FraudDetector().detect_fraud(file_id, df, cross_file_aadhaar=aadhaar_index_store.claimed_elsewhere(file_id))
+
+    full_cases = {case.id: case for case in full.flagged.cases()}
+
+    summary = incremental["summary"]
+    assert summary["total_records"] == len(df)
+    assert summary["flagged_count"] == full.summary.flagged_count
+    assert summary["total_leakage_amount"] == pytest.approx(full.summary.total_leakage_amount)
+    assert summary["top_risk_state"] == full.summary.top_risk_state
+    assert {name: stats["hits"] for name, stats in incremental["rule_stats"].items()} == {name: stats["hits"] for name, stats in full.rule_stats.items()}
+    assert {case["id"]: sorted(case["fraud_reasons"]) for case in incremental_cases} == \
+        {case_id: sorted(case.fraud_reasons) for case_id, case in full_cases.items()}
+
+    # The last batch was scored against the statistics of the whole dataset
+    last_batch = len(df) - len(batches[-1])
+    last_scores = {case["id"]: case["risk_score"] for case in incremental_cases if int(case["id"]) >= last_batch}
+    assert last_scores and last_scores == {case_id: full_cases[case_id].risk_score for case_id in last_scores}
+
+    # Earlier rows keep the score of the statistics they were scored with, within the documented bound
+    prefix_lengths = [len(base) + sum(len(batch) for batch in batches[:count]) for count in range(len(batches))]
+    bound = _stale_score_bound(df, prefix_lengths)
+    assert max(abs(case["risk_score"] - full_cases[case["id"]].risk_score) for case in incremental_cases) <= bound
+    assert abs(summary["average_risk_score"] - full.summary.average_risk_score) <= bound
@@ -0,0 +1,36 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip("sklearn")
+
+from services import ml_engine
+from services.ml_engine import IsolationForestEngine
+
+@pytest.fixture(scope="module")
+def sample(large_csv: str) -> pd.DataFrame:
+    return pd.read_csv(large_csv)
+
+def test_scores_are_ranks_against_the_training_sample(sample):
+    engine = IsolationForestEngine(contamination=0.08, n_jobs=1)
+    flags, scores = engine.score(sample, engine.fit(sample))
+    # Raw forest scores sit near 0.5 for everyone; ranks use the whole 0-1 range
+    assert np.percentile(scores, 10) < 0.2 and np.percentile(scores, 90) > 0.8
+    # The contamination cut-off falls at the matching rank
+    assert scores[flags].min() >= 0.9
+
+def test_disk_cache_evicts_least_recently_used(sample, tmp_path, monkeypatch):
+    monkeypatch.setattr(ml_engine, "MODEL_DIR", str(tmp_path))
+    monkeypatch.setattr(ml_engine, "MODEL_DISK_CACHE_SIZE", 2)
+    engine = IsolationForestEngine(contamination=0.08, n_estimators=10, n_jobs=1)
+    def path(key: str) -> str:
+        return os.path.join(str(tmp_path), f"{engine.cache_key(key)}.joblib")
+
+    engine.model_for(sample, "a")
+    engine.model_for(sample, "b")
+    os.utime(path("a"), (1, 1)) # Used long ago
+    engine.model_for(sample, "c")
+    assert not os.path.exists(path("a"))
+    assert os.path.exists(path("b")) and os.path.exists(path("c"))
@@ -0,0 +1,60 @@
+import numpy as np
+import pandas as pd
+
+from services.robust_stats import RobustBaseline, StreamingBaseline
+
+def _frame() -> pd.DataFrame:
+    # PMAY claims are ~10x the other scheme's; PMAY/Goa alone is too small for a stratum
+    rng = np.random.default_rng(0)
+    parts = [
+        ("PMAY", "Kerala", 200, 100_000.0),
+        ("PMAY", "Goa", 5, 100_000.0),
+        ("LPG", "Kerala", 200, 10_000.0),
+        ("LPG", "Goa", 200, 10_000.0),
+    ]
+    return pd.DataFrame({
+        "subsidy_type": np.concatenate([[scheme] * rows for scheme, _, rows, _ in parts]),
+        "state": np.concatenate([[state] * rows for _, state, rows, _ in parts]),
+        "amount": np.concatenate([rng.normal(mean, mean / 10, rows) for _, _, rows, mean in parts])
+    })
+
+def test_small_strata_fall_back_to_their_scheme():
+    df = _frame()
+    baseline = RobustBaseline.from_frame(df, ["amount"], min_rows=30)
+    assert [by for by, _ in baseline.levels] == [["subsidy_type"], ["subsidy_type", "state"]]
+
+    # A typical PMAY claim in Goa is judged against PMAY, not the (mostly LPG) dataset
+    claim = pd.DataFrame({"subsidy_type": ["PMAY"], "state": ["Goa"], "amount": [100_000.0]})
+    flags, _ = baseline.score(claim, threshold=3.5, cap=10.0)
+    assert not flags[0]
+
+    # Schemes without any stratum use the dataset-wide values
+    unseen = pd.DataFrame({"subsidy_type": ["MGNREGA"], "state": ["Goa"], "amount": [100_000.0]})
+    flags, _ = baseline.score(unseen, threshold=3.5, cap=10.0)
+    assert flags[0]
+
+def test_round_trips_through_dict():
+    df = _frame()
+    baseline = RobustBaseline.from_frame(df, ["amount"])
+    restored = RobustBaseline.from_dict(baseline.to_dict())
+    for expected, actual in zip(baseline.score(df, 3.5, 10.0), restored.score(df, 3.5, 10.0)):
+        np.testing.assert_array_equal(expected, actual)
+
+def test_reads_baselines_saved_without_levels():
+    df = _frame()
+    data = RobustBaseline.from_frame(df, ["amount"]).to_dict()
+    finest = data.pop("levels")[-1]
+    data["strata"] = finest["strata"]
+    restored = RobustBaseline.from_dict(data)
+    assert [by for by, _ in restored.levels] == [["subsidy_type", "state"]]
+
+def test_streaming_matches_from_frame(tmp_path):
+    df = _frame()
+    # Negative values, a missing state and a constant feature exercise the sortable keys
+    df["amount"] = df["amount"] - 50_000.0
+    df.loc[::17, "state"] = None
+    df["income"] = 1.0
+    streaming = StreamingBaseline(str(tmp_path / "baseline.arrow"), ["amount", "income"])
+    for start in range(0, len(df), 37):
+        streaming.add(df.iloc[start:start + 37])
+    assert streaming.baseline().to_dict() == RobustBaseline.from_frame(df, ["amount", "income"]).to_dict()
@@ -0,0 +1,59 @@
+import asyncio
+import hashlib
+import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlmodel import func, select
+
+from api.database import async_session_factory
+from main import app
+from models.schemas import UploadChunk, UploadedFile
+from services.data_storage import data_storage
+
+CONCURRENT_UPLOADS = 4
+
+def _content() -> bytes:
+    # Unique per test, so no other test's upload has the same hash
+    lines = [b"aadhaar,amount,income,scheme"] + [
+        f"{100000000000 + row},{1000 + row},{50000 + row},{uuid.uuid4().hex}".encode() for row in range(2_000)
+    ]
+    return b"\n".join(lines) + b"\n"
+
+async def _stored(content_hash: str):
+    async with async_session_factory() as session:
+        uploads = (await session.exec(select(UploadedFile).where(UploadedFile.content_hash == content_hash))).all()
+        chunks = (await session.exec(select(func.count()).select_from(UploadChunk).where(
+            UploadChunk.file_id.in_([upload.id for upload in uploads])
+        ))).one()
+        return uploads, chunks
+
+@pytest.mark.parametrize("backend", ["arrow", "json"])
+def test_concurrent_identical_uploads_are_stored_once(backend, monkeypatch):
+    monkeypatch.setattr(data_storage, "backend", backend)
+    content = _content()
+    data_files = set(os.listdir(os.environ["SUBSIGUARD_DATA_DIR"])) if os.path.isdir(os.environ["SUBSIGUARD_DATA_DIR"]) else set()
+
+    with TestClient(app) as client:
+        def upload(_):
+            response = client.post("/upload", files={"file": ("claims.csv", content, "text/csv")})
+            assert response.status_code == 200, response.text
+            return response.json()
+
+        with ThreadPoolExecutor(CONCURRENT_UPLOADS) as pool:
+            responses = list(pool.map(upload, range(CONCURRENT_UPLOADS)))
+
+    assert len({response["file_id"] for response in responses}) == 1
+    assert all(response["total_rows"] == 2_000 for response in responses)
+
+    # Hashed while parsing: the digest is that of the whole file
+    uploads, chunks = asyncio.run(_stored(hashlib.sha256(content).hexdigest()))
+    assert [upload.id for upload in uploads] == [responses[0]["file_id"]]
+    if backend == "json":
+        assert chunks > 0
+    else:
+        # The dropped copies left no data files behind
+        added = set(os.listdir(os.environ["SUBSIGUARD_DATA_DIR"])) - data_files
+        assert [name for name in added if name.endswith(".arrow")] == [f"{uploads[0].id}.arrow"]
@@ -41,7 +41,7 @@ import {
 import { useRouter } from "next/navigation";
 import Link from "next/link";
 import { useAnalyze } from "@/hooks/useAnalyze";
-import { api } from "@/lib/api";
+import { api, FraudCase, ReportBreakdown } from "@/lib/api";
 import { useLanguage } from "@/contexts/LanguageContext";
 import { toast } from "sonner";
 
@@ -123,29 +123,54 @@ function DashboardContent({ activeTab, setActiveTab, t, router }: any) {
 
 
 
+    // result.cases is only the first page: the chart uses the file's per-scheme
+    // totals, and the table loads further pages on demand
+    const [byScheme, setByScheme] = React.useState<ReportBreakdown[] | null>(null);
+    const [cases, setCases] = React.useState<FraudCase[]>([]);
+    const [nextCursor, setNextCursor] = React.useState<string | undefined>();
+    const [loadingCases, setLoadingCases] = React.useState(false);
+
+    React.useEffect(() => {
+        setByScheme(null);
+        setCases(result ? result.cases : []);
+        setNextCursor(result?.next_cursor);
+        if (!result) return;
+
+        let cancelled = false;
+        api.getBreakdown(result.file_id)
+            .then(breakdown => { if (!cancelled) setByScheme(breakdown.by_scheme); })
+            .catch(error => console.error("Breakdown error:", error));
+        return () => { cancelled = true; };
+    }, [result]);
+
+    const handleLoadMoreCases = async () => {
+        if (!result || !nextCursor) return;
+        setLoadingCases(true);
+        try {
+            const page = await api.getCases(result.file_id, { cursor: nextCursor });
+            setCases(previous => [...previous, ...page.cases]);
+            setNextCursor(page.next_cursor);
+        } catch (error) {
+            console.error("Cases error:", error);
+            toast.error("Could not load more cases", {
+                description: "Please try again."
+            });
+        } finally {
+            setLoadingCases(false);
+        }
+    };
+
     // Transform API result for charts
     const chartData = React.useMemo(() => {
-        if (!result) return data;
-
-        const schemeCounts: Record<string, { total: number, fraud: number }> = {};
-
-        result.cases.forEach(c => {
-            if (!schemeCounts[c.scheme]) {
-                schemeCounts[c.scheme] = { total: 0, fraud: 0 };
-            }
-            schemeCounts[c.scheme].total += 1;
-            if (c.risk_score > 50) {
-                schemeCounts[c.scheme].fraud += 1;
-            }
-        });
-
-        return Object.keys(schemeCounts).map(scheme => ({
-            name: scheme,
-            value: schemeCounts[scheme].total * 10, // Mocking total relative to fraud
-            fraud: schemeCounts[scheme].fraud
+        if (!result || !byScheme) return data;
+
+        return byScheme.map(row => ({
+            name: row.value,
+            value: row.leakage_amount,
+            fraud: row.flagged_count
         }));
 
-    }, [result]);
+    }, [result, byScheme]);
 
 
 
@@ -583,7 +608,9 @@ function DashboardContent({ activeTab, setActiveTab, t, router }: any) {
                                             <FileText className="w-5 h-5 text-blue-600" />
                                             Detailed Analysis Report
                                         </h2>
-                                        <span className="text-sm text-slate-500">Showing top 10 high-risk cases</span>
+                                        <span className="text-sm text-slate-500">
+                                            Showing {cases.length.toLocaleString()} of {result.summary.flagged_count.toLocaleString()} flagged cases, highest risk first
+                                        </span>
                                     </div>
 
                                     <GlassCard className="overflow-hidden p-0 border-slate-200">
@@ -599,7 +626,7 @@ function DashboardContent({ activeTab, setActiveTab, t, router }: any) {
                                                 </TableRow>
                                             </TableHeader>
                                             <TableBody>
-                                                {result.cases.map((fraudCase) => (
+                                                {cases.map((fraudCase) => (
                                                     <TableRow key={fraudCase.id} className="group hover:bg-slate-50">
                                                         <TableCell className="font-medium text-slate-900">{fraudCase.id}</TableCell>
                                                         <TableCell>{fraudCase.beneficiary_name}</TableCell>
@@ -638,6 +665,19 @@ function DashboardContent({ activeTab, setActiveTab, t, router }: any) {
                                             </TableBody>
                                         </Table>
                                     </GlassCard>
+
+                                    {nextCursor && (
+                                        <div className="flex justify-center">
+                                            <button
+                                                onClick={handleLoadMoreCases}
+                                                disabled={loadingCases}
+                                                className="flex items-center gap-2 px-4 py-2 bg-white border border-slate-200 rounded-full text-sm font-medium text-slate-600 hover:bg-slate-50 hover:border-slate-300 transition-all shadow-sm disabled:opacity-60"
+                                            >
+                                                {loadingCases && <Loader2 className="w-4 h-4 animate-spin" />}
+                                                Load more cases
+                                            </button>
+                                        </div>
+                                    )}
                                 </div>
                             )}
                         </>
@@ -1,12 +1,21 @@
 
 // --- Types ---
 
+export interface BadRow {
+    row: number | null;
+    column: string | null;
+    value: string | null;
+    error: string;
+}
+
 export interface UploadResponse {
     file_id: string;
     filename: string;
     total_rows: number;
     preview_rows: Record<string, unknown>[];
     message: string;
+    bad_rows?: number;
+    bad_row_samples?: BadRow[];
 }
 
 export interface FraudCase {
@@ -16,6 +25,7 @@ export interface FraudCase {
     amount: number;
     risk_score: number;
     fraud_reasons: string[];
+    state?: string;
 }
 
 export interface AnalysisSummary {
@@ -36,8 +46,57 @@ export interface AnalysisReportDetails {
 export interface AnalysisResult {
     file_id: string;
     summary: AnalysisSummary;
-    cases: FraudCase[];
+    cases: FraudCase[]; // First page, highest risk first
     report_details?: AnalysisReportDetails;
+    next_cursor?: string;
+    rule_stats?: Record<string, { hits: number; seconds: number }>;
+}
+
+export interface FraudCasePage {
+    cases: FraudCase[];
+    next_cursor?: string;
+}
+
+export interface CaseQuery {
+    cursor?: string;
+    limit?: number;
+    sort?: "risk" | "row";
+    reason?: string;
+    state?: string;
+    scheme?: string;
+}
+
+export interface ReportBreakdown {
+    value: string;
+    flagged_count: number;
+    leakage_amount: number;
+}
+
+export interface ResultBreakdown {
+    by_state: ReportBreakdown[];
+    by_scheme: ReportBreakdown[];
+}
+
+export interface ReportsSummary {
+    total_audits: number;
+    critical_issues: number;
+    resolved_cases: number;
+    total_leakage: number;
+    by_state: ReportBreakdown[];
+    by_scheme: ReportBreakdown[];
+}
+
+export interface AnalysisJob {
+    job_id: string;
+    file_id: string;
+    status: "queued" | "running" | "completed" | "failed";
+    stage?: string;
+    progress: number;
+    error?: string;
+    stage_timings: Record<string, number>;
+    created_at: string;
+    started_at?: string;
+    finished_at?: string;
 }
 
 export interface SyntheticDataResponse {
@@ -67,6 +126,9 @@ const API_BASE_URL = "/api";
 // Logic: If on Localhost -> Real Backend. If on Vercel -> Demo Mode (to avoid SQLite issues).
 const USE_DEMO_MODE = process.env.NEXT_PUBLIC_USE_DEMO_MODE === 'true';
 
+// Give up polling an analysis job after this long (the backend fails jobs whose worker died)
+const JOB_TIMEOUT_MS = 30 * 60 * 1000;
+
 const mockDelay = (ms: number) => new Promise((resolve) => setTimeout(resolve, ms));
 
 export const api = {
@@ -193,7 +255,34 @@ export const api = {
             throw new Error(errorData.detail || `Analysis failed: ${response.statusText}`);
         }
 
-        return response.json();
+        // Analysis runs as a background job: wait for it, then fetch the results
+        const job: AnalysisJob = await response.json();
+        await this.waitForJob(job.job_id);
+        return this.getResults(fileId);
+    },
+
+    async waitForJob(jobId: string, intervalMs = 1000, timeoutMs = JOB_TIMEOUT_MS): Promise<AnalysisJob> {
+        const deadline = Date.now() + timeoutMs;
+        while (true) {
+            const response = await fetch(`${API_BASE_URL}/jobs/${jobId}`);
+
+            if (!response.ok) {
+                const errorData = await response.json().catch(() => ({ detail: "Unknown job error" }));
+                throw new Error(errorData.detail || `Fetching job status failed: ${response.statusText}`);
+            }
+
+            const job: AnalysisJob = await response.json();
+            if (job.status === "completed") {
+                return job;
+            }
+            if (job.status === "failed") {
+                throw new Error(job.error || "Analysis failed");
+            }
+            if (Date.now() >= deadline) {
+                throw new Error(`Analysis did not finish within ${Math.round(timeoutMs / 60000)} minutes (last stage: ${job.stage || job.status})`);
+            }
+            await new Promise((resolve) => setTimeout(resolve, intervalMs));
+        }
     },
 
     async getResults(fileId: string): Promise<AnalysisResult> {
@@ -212,6 +301,56 @@ export const api = {
         return response.json();
     },
 
+    async getCases(fileId: string, query: CaseQuery = {}): Promise<FraudCasePage> {
+        if (USE_DEMO_MODE) {
+            const result = await this.getResults(fileId);
+            return { cases: result.cases };
+        }
+
+        const params = new URLSearchParams();
+        Object.entries(query).forEach(([key, value]) => {
+            if (value !== undefined) params.set(key, String(value));
+        });
+
+        const response = await fetch(`${API_BASE_URL}/results/${fileId}/cases?${params.toString()}`);
+
+        if (!response.ok) {
+            const errorData = await response.json().catch(() => ({ detail: "Unknown fetch error" }));
+            throw new Error(errorData.detail || `Fetching cases failed: ${response.statusText}`);
+        }
+
+        return response.json();
+    },
+
+    async getBreakdown(fileId: string): Promise<ResultBreakdown> {
+        if (USE_DEMO_MODE) {
+            // The demo result holds all of its cases: tally them here
+            const result = await this.getResults(fileId);
+            const tally = (key: (c: FraudCase) => string | undefined): ReportBreakdown[] => {
+                const rows: Record<string, ReportBreakdown> = {};
+                result.cases.forEach(c => {
+                    const value = key(c) ?? "Unknown";
+                    if (!rows[value]) {
+                        rows[value] = { value, flagged_count: 0, leakage_amount: 0 };
+                    }
+                    rows[value].flagged_count += 1;
+                    rows[value].leakage_amount += c.amount;
+                });
+                return Object.values(rows).sort((a, b) => b.leakage_amount - a.leakage_amount);
+            };
+            return { by_state: tally(c => c.state), by_scheme: tally(c => c.scheme) };
+        }
+
+        const response = await fetch(`${API_BASE_URL}/results/${fileId}/breakdown`);
+
+        if (!response.ok) {
+            const errorData = await response.json().catch(() => ({ detail: "Unknown fetch error" }));
+            throw new Error(errorData.detail || `Fetching breakdown failed: ${response.statusText}`);
+        }
+
+        return response.json();
+    },
+
     async downloadReport(fileId: string): Promise<void> {
         if (USE_DEMO_MODE) {
             await mockDelay(1000);
@@ -249,14 +388,16 @@ export const api = {
         link.remove();
     },
 
-    async getReportsSummary(): Promise<{ total_audits: number; critical_issues: number; resolved_cases: number; total_leakage: number }> {
+    async getReportsSummary(): Promise<ReportsSummary> {
         if (USE_DEMO_MODE) {
             await mockDelay(1000);
             return {
                 total_audits: 15420,
                 critical_issues: 342,
                 resolved_cases: 15078,
-                total_leakage: 14500000
+                total_leakage: 14500000,
+                by_state: [],
+                by_scheme: []
             };
         }
 